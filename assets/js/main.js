@@ -1,15 +0,0 @@
-/*
- * Main Javascript file for nexus-challenge-webapp.
- *
- * This file bundles all of your javascript together using webpack.
- */
-
-// JavaScript modules
-require('jquery');
-require('font-awesome-webpack');
-require('popper.js');
-require('bootstrap');
-
-// Your own code
-require('./plugins.js');
-require('./script.js');
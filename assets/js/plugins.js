@@ -1 +0,0 @@
-// place any jQuery/helper plugins in here, instead of separate, slower script files.
@@ -1 +0,0 @@
-// App initialization code goes here
@@ -5,7 +5,7 @@
 mkdir -p "$HOME"/bin
 mkdir -p "$HOME"/etc
 mkdir -p "$HOME"/htdocs
-mkdir -p "$HOME"/var/{db,log,run,backup}
+mkdir -p "$HOME"/var/{db,log,run,backup,cache}
 install -m 640 deployment/nexus-challenge-webapp-prod.env "$HOME"/etc
 install -m 755 deployment/start-nexus-challenge-webapp.sh "$HOME"/bin/start-nexus-challenge-webapp.sh
 sudo install -m 644 deployment/nexus-challenge-webapp-nginx.conf /etc/nginx/nexus-challenge-webapp.conf
@@ -10,6 +10,14 @@ else
     exit 1
 fi
 
+if [ -n "$METRICS_DIR" ]; then
+    # metrics of the workers of the previous run
+    mkdir -p "$METRICS_DIR"
+    rm -f "$METRICS_DIR"/metrics-*.json
+    # only the workers write metrics files, not CLI commands using the same environment
+    export METRICS_WRITE_FILES=1
+fi
+
 if [ -n "$VENV" -a -d "$VENV_ROOT" ]; then
     exec "$VENV_ROOT/bin/gunicorn" \
         -b 127.0.0.1:8089 \
@@ -5,8 +5,9 @@
 from flask import Flask, render_template
 
 from . import commands, competition, public, user
-from .extensions import (bcrypt, cache, csrf_protect, db, debug_toolbar, login_manager, mail,
-                         migrate, misaka, pagedown)
+from .extensions import (assets, bcrypt, cache, csrf_protect, db, debug_toolbar, jobs,
+                         login_manager, mail, metrics, migrate, misaka, pagedown,
+                         password_hasher, query_stats)
 from .utils import inject_site_info
 
 
@@ -52,16 +53,23 @@ def create_app(config_object='nexus_challenge.settings'):
 
 def register_extensions(app):
     """Register Flask extensions."""
+    assets.init_app(app)
     bcrypt.init_app(app)
     cache.init_app(app)
     db.init_app(app)
+    jobs.init_app(app)
     csrf_protect.init_app(app)
     login_manager.init_app(app)
     mail.init_app(app)
     misaka.init_app(app)
     migrate.init_app(app, db)
     pagedown.init_app(app)
+    password_hasher.init_app(app)
+    query_stats.init_app(app)
+    metrics.init_app(app)
     debug_toolbar.init_app(app)
+    user.email.mail_worker.init_app(app)
+    user.loader.user_cache.init_app(app)
 
 
 def register_blueprints(app):
@@ -79,7 +87,7 @@ def register_errorhandlers(app):
         error_code = getattr(error, 'code', 500)
         return render_template('{0}.html'.format(error_code)), error_code
 
-    for errcode in [401, 404, 500]:
+    for errcode in [401, 404, 500, 503]:
         app.errorhandler(errcode)(render_error)
 
 
@@ -98,11 +106,14 @@ def register_shellcontext(app):
 
 def register_commands(app):
     """Register Click commands."""
+    app.cli.add_command(commands.assets_group)
+    app.cli.add_command(commands.bench)
     app.cli.add_command(commands.clean)
     app.cli.add_command(commands.compo_group)
     app.cli.add_command(commands.create_admin)
     app.cli.add_command(commands.email_group)
     app.cli.add_command(commands.lint)
+    app.cli.add_command(commands.replay_log)
     app.cli.add_command(commands.test)
     app.cli.add_command(commands.urls)
 
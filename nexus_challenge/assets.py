@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""Bundled, minified and fingerprinted static assets.
+
+``flask assets build`` concatenates the source files of each bundle in ``BUNDLES``, minifies
+the result and writes it to ``ASSETS_OUTPUT_DIR`` (``static/dist`` by default) under a name
+containing a hash of its content, e.g. ``dist/app.3f2a9c1b.js``, together with a gzip
+(``.gz``) and, if the optional ``brotli`` package is installed, a brotli (``.br``) compressed
+copy, which nginx can send as is (``gzip_static`` / ``brotli_static``). ``manifest.json`` in
+the same directory maps the logical bundle names to the built files.
+
+Since a built file never changes, it can be served with far-future cache headers (see
+``deployment/nexus-challenge-webapp-nginx.conf``). A changed bundle gets a new name, which
+templates pick up via the ``asset_url`` / ``asset_urls`` template globals.
+
+If ``ASSETS_DEBUG`` is true (by default in debug mode) or no manifest has been built, the
+source files of a bundle are referenced individually instead, so changes to them are visible
+without rebuilding.
+
+"""
+
+# Standard library modules
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+# Third-party modules
+from flask import current_app, url_for
+
+
+#: source files of each bundle, relative to the static folder
+BUNDLES = {
+    'app.js': ('js/jquery.min.js', 'js/plugins.js', 'js/script.js', 'js/player.js'),
+    'styles.css': ('css/styles.css',),
+    'trend.js': ('js/trend.js',),
+}
+
+MANIFEST_NAME = 'manifest.json'
+#: number of hex digits of the content hash in file names
+HASH_LENGTH = 8
+
+# string literals and comments in CSS
+CSS_TOKENS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/''', re.S)
+CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+# source map references, which would apply to the whole bundle
+SOURCE_MAP_COMMENT = re.compile(r'^[ \t]*(?://[#@][ \t]*sourceMappingURL=.*|'
+                                r'/\*[#@][ \t]*sourceMappingURL=.*?\*/)[ \t]*$', re.M)
+# characters after which a '/' starts a regular expression literal rather than a division
+JS_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^') | {''}
+
+
+def minify_css(source):
+    """Remove comments and redundant whitespace from CSS source (strings are kept)."""
+    chunks = ['']
+
+    for part in CSS_TOKENS.split(source):
+        if part is None:
+            # a comment
+            chunks[-1] += ' '
+        elif part.startswith(('"', "'")):
+            chunks.extend([part, ''])
+        else:
+            chunks[-1] += part
+
+    # every other chunk is a string literal
+    return ''.join(chunk if i % 2 else CSS_PUNCTUATION.sub(r'\1', re.sub(r'\s+', ' ', chunk))
+                   for i, chunk in enumerate(chunks)).replace(';}', '}').strip()
+
+
+def minify_js(source):
+    """Remove comments, indentation and blank lines from JavaScript source.
+
+    This is a deliberately conservative minifier: line breaks are kept (so automatic semicolon
+    insertion is unaffected) and identifiers are not renamed. String, template and regular
+    expression literals are copied verbatim (multi-line template literals are not supported).
+
+    """
+    out = []
+    i = 0
+    length = len(source)
+    last = ''  # last non-whitespace character written
+
+    while i < length:
+        char = source[i]
+        ahead = source[i:i + 2]
+
+        if ahead == '//':
+            end = source.find('\n', i)
+            i = length if end == -1 else end
+        elif ahead == '/*':
+            end = source.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+            out.append(' ')
+        elif char in '"\'`' or (char == '/' and last in JS_REGEX_PRECEDERS):
+            # copy literal up to the unescaped closing delimiter
+            start = i
+            i += 1
+            in_class = False
+
+            while i < length:
+                if source[i] == '\\':
+                    i += 2
+                    continue
+
+                if char == '/':
+                    if source[i] == '[':
+                        in_class = True
+                    elif source[i] == ']':
+                        in_class = False
+                    elif source[i] == '/' and not in_class:
+                        break
+                    elif source[i] == '\n':
+                        break
+                elif source[i] == char:
+                    break
+
+                i += 1
+
+            i += 1
+            out.append(source[start:i])
+            last = char
+        else:
+            out.append(char)
+            i += 1
+
+            if not char.isspace():
+                last = char
+
+    lines = (line.strip() for line in ''.join(out).splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def available_compressors():
+    """Return dict mapping file name suffixes to functions compressing bytes."""
+    compressors = {'.gz': lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        compressors['.br'] = lambda data: brotli.compress(data, mode=brotli.MODE_TEXT)
+
+    return compressors
+
+
+def write_file(filename, data):
+    """Write bytes to file atomically."""
+    fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(filename), prefix='.tmp-')
+
+    with os.fdopen(fd, 'wb') as fp:
+        fp.write(data)
+
+    os.chmod(tmpname, 0o644)
+    os.replace(tmpname, filename)
+
+
+def read_bundle(static_folder, sources):
+    """Return the concatenated and minified content of the given source files.
+
+    Source map references are removed, since the maps don't match the bundle.
+
+    """
+    contents = []
+
+    for source in sources:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as fp:
+            text = SOURCE_MAP_COMMENT.sub('', fp.read())
+
+        if '.min.' in os.path.basename(source):
+            contents.append(text.strip())
+        elif source.endswith('.css'):
+            contents.append(minify_css(text))
+        else:
+            contents.append(minify_js(text))
+
+    if sources and sources[0].endswith('.js'):
+        # guard against files not ending with a semicolon
+        return ';\n'.join(content for content in contents if content) + '\n'
+
+    return '\n'.join(content for content in contents if content) + '\n'
+
+
+def build(static_folder, output_dir, bundles=None, compressors=None, clean=False):
+    """Build all bundles into the output directory and write the manifest.
+
+    Returns the manifest, a dict mapping bundle names to the paths of the built files relative
+    to the static folder. With ``clean``, files of earlier builds are removed from the output
+    directory, otherwise they are kept for pages cached before the build.
+
+    """
+    bundles = BUNDLES if bundles is None else bundles
+    compressors = available_compressors() if compressors is None else compressors
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {}
+    written = {MANIFEST_NAME}
+
+    for name, sources in sorted(bundles.items()):
+        data = read_bundle(static_folder, sources).encode('utf-8')
+        base, ext = os.path.splitext(name)
+        filename = '{}.{}{}'.format(base, hashlib.sha256(data).hexdigest()[:HASH_LENGTH], ext)
+        path = os.path.join(output_dir, filename)
+        # built files are immutable, so an existing one has the same content
+        if not os.path.exists(path):
+            write_file(path, data)
+
+        written.add(filename)
+
+        for suffix, compress in compressors.items():
+            if not os.path.exists(path + suffix):
+                write_file(path + suffix, compress(data))
+
+            written.add(filename + suffix)
+
+        manifest[name] = os.path.relpath(path, static_folder).replace(os.sep, '/')
+
+    write_file(os.path.join(output_dir, MANIFEST_NAME),
+               json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+
+    if clean:
+        for filename in os.listdir(output_dir):
+            if filename not in written and os.path.isfile(os.path.join(output_dir, filename)):
+                os.remove(os.path.join(output_dir, filename))
+
+    return manifest
+
+
+class Assets:
+    """Resolve logical asset names to URLs of built files through the manifest."""
+
+    def __init__(self, app=None):
+        self._manifests = {}
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Set config defaults and register the ``asset_url(s)`` template globals."""
+        app.config.setdefault('ASSETS_DEBUG', app.debug)
+        app.config.setdefault('ASSETS_OUTPUT_DIR', os.path.join(app.static_folder, 'dist'))
+        app.extensions['assets'] = self
+        self._manifests.pop(app.config['ASSETS_OUTPUT_DIR'], None)
+        app.add_template_global(self.url, 'asset_url')
+        app.add_template_global(self.urls, 'asset_urls')
+
+    @property
+    def manifest(self):
+        """Manifest of the current app, read once, or an empty dict, if not built."""
+        config = current_app.config
+
+        if config['ASSETS_DEBUG']:
+            return {}
+
+        output_dir = config['ASSETS_OUTPUT_DIR']
+        manifest = self._manifests.get(output_dir)
+
+        if manifest is None:
+            try:
+                with open(os.path.join(output_dir, MANIFEST_NAME)) as fp:
+                    manifest = json.load(fp)
+            except FileNotFoundError:
+                current_app.logger.warning("No asset manifest in %s, run 'flask assets build'.",
+                                           output_dir)
+                manifest = {}
+
+            self._manifests[output_dir] = manifest
+
+        return manifest
+
+    def build(self, clean=False):
+        """Build the bundles of the current app and use the new manifest."""
+        output_dir = current_app.config['ASSETS_OUTPUT_DIR']
+        manifest = build(current_app.static_folder, output_dir, clean=clean)
+        self._manifests[output_dir] = manifest
+        return manifest
+
+    def urls(self, name):
+        """Return list of URLs to include for the asset with the given logical name.
+
+        That is the URL of the built file, if the asset is in the manifest, otherwise the URLs
+        of the source files of the bundle. Names which are no bundle are static file names.
+
+        """
+        filename = self.manifest.get(name)
+
+        if filename is not None:
+            return [url_for('static', filename=filename)]
+
+        return [url_for('static', filename=source) for source in BUNDLES.get(name, (name,))]
+
+    def url(self, name):
+        """Return URL of the asset with the given logical name (see ``urls``).
+
+        Raises ``ValueError`` for a bundle of several files, which has not been built.
+
+        """
+        urls = self.urls(name)
+
+        if len(urls) != 1:
+            raise ValueError("Asset {!r} has not been built.".format(name))
+
+        return urls[0]
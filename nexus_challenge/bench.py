@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""Request-level performance benchmark.
+
+``seed`` fills an empty database with users, approved competition entries and a ballot per
+voter using bulk inserts. ``run_benchmark`` then requests the main pages through the Flask test
+client (logged in as seeded users where needed) and returns a report with the latency
+percentiles, the number of SQL queries and the memory allocated (as measured by
+``tracemalloc``, in a separate, shorter pass) per request for each route.
+
+``flask bench`` does both against a separate database (by default a temporary SQLite file) and
+writes the report to a JSON file, so results of different releases can be compared.
+
+"""
+
+# Standard library modules
+import datetime as dt
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+# Third-party modules
+from werkzeug.utils import import_string
+
+# Application specific modules
+from .competition.counters import reconcile
+from .competition.forms import VotingForm
+from .competition.models import CompetitionEntry, Vote, VoteEvent
+from .database import db
+from .extensions import bcrypt
+from .querystats import max_queries
+from .user.models import User
+from .utils import render_markdown
+
+
+BENCH_PASSWORD = 'bench-password'
+SEED_BATCH_SIZE = 1000
+
+Route = namedtuple('Route', 'name method expected_status login')
+Route.__doc__ = """\
+A benchmarked route.
+
+``login`` tells whether the request needs a logged in client.
+
+"""
+
+ROUTES = (
+    Route('login', 'POST', 302, False),
+    Route('list', 'GET', 200, False),
+    Route('vote', 'GET', 200, True),
+    Route('view', 'GET', 200, False),
+    Route('submit_vote_form', 'GET', 200, True),
+    Route('submit_vote', 'POST', 302, True),
+)
+
+
+class BenchError(Exception):
+    """Raised when the benchmark can't be run, e.g. because the database is not empty."""
+
+
+def bulk_insert(model, rows):
+    for i in range(0, len(rows), SEED_BATCH_SIZE):
+        db.session.bulk_insert_mappings(model, rows[i:i + SEED_BATCH_SIZE])
+
+
+def seed(users=1000, entries=100, voters=None, rng=None, password=BENCH_PASSWORD):
+    """Bulk insert users, approved entries and ballots into an empty database.
+
+    The first ``entries`` users each own one entry and the first ``voters`` users (default: all)
+    each vote for five random entries other than their own. All users have the same password.
+    Returns a dict with the number of users, entries and votes created.
+
+    """
+    rng = rng or random.Random(0)
+    voters = users if voters is None else min(voters, users)
+
+    if entries > users:
+        raise BenchError("Need at least as many users as entries.")
+
+    if entries < len(VotingForm.points_to_fields) + 1:
+        raise BenchError("Need at least {} entries.".format(len(VotingForm.points_to_fields) + 1))
+
+    if db.session.query(User.id).first() is not None:
+        raise BenchError("The benchmark database must be empty.")
+
+    now = dt.datetime.utcnow()
+    # hashing is deliberately slow, so all users share one hash
+    hashed_password = bcrypt.generate_password_hash(password)
+    bulk_insert(User, [
+        dict(username='bench{}'.format(i), email='bench{}@example.com'.format(i),
+             hashed_password=hashed_password, is_active=True, is_confirmed=True,
+             confirmed_on=now, created_on=now)
+        for i in range(users)
+    ])
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).order_by(User.id)]
+
+    description = "A track created for the *benchmark*."
+    bulk_insert(CompetitionEntry, [
+        dict(title='Bench Track {}'.format(i), artist='Bench Artist {}'.format(i),
+             url='https://archive.org/details/bench-track-{}'.format(i),
+             description=description, description_html=render_markdown(description),
+             is_published=True, is_approved=True, created_on=now, last_modified_on=now,
+             published_on=now, user_id=user_id)
+        for i, user_id in enumerate(user_ids[:entries])
+    ])
+    entry_owners = dict(db.session.query(CompetitionEntry.id, CompetitionEntry.user_id))
+    entry_ids = sorted(entry_owners)
+
+    votes = []
+    points = sorted(VotingForm.points_to_fields, reverse=True)
+
+    for user_id in user_ids[:voters]:
+        choices = rng.sample([id_ for id_ in entry_ids if entry_owners[id_] != user_id],
+                             len(points))
+        created_on = now - dt.timedelta(seconds=rng.randrange(7 * 24 * 3600))
+        votes.extend(dict(user_id=user_id, entry_id=entry_id, points=points_,
+                          created_on=created_on)
+                     for points_, entry_id in zip(points, choices))
+
+    bulk_insert(Vote, votes)
+    bulk_insert(VoteEvent, [dict(vote, delta=1) for vote in votes])
+    db.session.commit()
+    # initialize the vote counters
+    reconcile(repair=True)
+    return dict(users=len(user_ids), entries=len(entry_ids), votes=len(votes))
+
+
+def percentile(values, percent):
+    """Return nearest-rank percentile of list of values."""
+    if not values:
+        return None
+
+    values = sorted(values)
+    return values[max(0, math.ceil(percent / 100.0 * len(values)) - 1)]
+
+
+class BenchClients:
+    """Test clients and request data for the benchmarked routes."""
+
+    def __init__(self, app, clients, rng, password):
+        self.app = app
+        self.rng = rng
+        self.password = password
+
+        with app.app_context():
+            self.usernames = dict(db.session.query(User.id, User.username))
+            self.entry_owners = dict(db.session.query(CompetitionEntry.id,
+                                                      CompetitionEntry.user_id))
+
+        self.user_ids = sorted(self.usernames)
+        self.entry_ids = sorted(self.entry_owners)
+        self.clients = []
+
+        for i in range(clients):
+            client = app.test_client()
+            client.user_id = rng.choice(self.user_ids)
+            response = self.login(client, client.user_id)
+
+            if response.status_code != 302:
+                raise BenchError("Login as {} failed.".format(self.usernames[client.user_id]))
+
+            self.clients.append(client)
+
+    def login(self, client, user_id):
+        return client.post('/users/login', data={'username': self.usernames[user_id],
+                                                 'password': self.password})
+
+    def request(self, route):
+        """Make request to route and return response."""
+        if route.name == 'login':
+            return self.login(self.app.test_client(), self.rng.choice(self.user_ids))
+
+        client = self.rng.choice(self.clients) if route.login else self.app.test_client()
+
+        if route.name == 'list':
+            return client.get('/list/')
+        elif route.name == 'vote':
+            return client.get('/vote/')
+        elif route.name == 'view':
+            return client.get('/view/{}'.format(self.rng.choice(self.entry_ids)))
+        elif route.name == 'submit_vote_form':
+            return client.get('/submit_vote')
+        elif route.name == 'submit_vote':
+            choices = self.rng.sample([id_ for id_ in self.entry_ids
+                                       if self.entry_owners[id_] != client.user_id],
+                                      len(VotingForm.points_to_fields))
+            fields = [VotingForm.points_to_fields[points]
+                      for points in sorted(VotingForm.points_to_fields, reverse=True)]
+            return client.post('/submit_vote', data=dict(zip(fields, choices)))
+
+        raise ValueError("Unknown route: {}".format(route.name))
+
+
+def rounded(value, digits=3):
+    return None if value is None else round(value, digits)
+
+
+def summarize(samples, alloc_samples):
+    latencies = [sample[0] * 1000.0 for sample in samples]
+    queries = [sample[1] for sample in samples]
+    allocs = [size / 1024.0 for size in alloc_samples]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if not sample[2]),
+        'latency_ms': {
+            'p50': rounded(percentile(latencies, 50)),
+            'p95': rounded(percentile(latencies, 95)),
+            'p99': rounded(percentile(latencies, 99)),
+            'mean': rounded(sum(latencies) / len(latencies) if latencies else None),
+            'max': rounded(max(latencies, default=None)),
+        },
+        'queries': {
+            'mean': rounded(sum(queries) / len(queries) if queries else None),
+            'max': max(queries, default=None),
+        },
+        'alloc_kib': {
+            'p50': rounded(percentile(allocs, 50), 1),
+            'p95': rounded(percentile(allocs, 95), 1),
+            'max': rounded(max(allocs, default=None), 1),
+        },
+    }
+
+
+def run_benchmark(app, requests=100, clients=10, alloc_requests=20, routes=ROUTES, rng=None,
+                  password=BENCH_PASSWORD, echo=None):
+    """Request each route ``requests`` times and return the report as a dict.
+
+    The routes are requested in turn, so caches are warmed up as they would be by a mix of
+    visitors. Allocations are measured in a second pass of ``alloc_requests`` requests per route,
+    since tracing them slows down all requests.
+
+    """
+    rng = rng or random.Random(0)
+    bench = BenchClients(app, clients, rng, password)
+    samples = defaultdict(list)
+    alloc_samples = defaultdict(list)
+
+    with app.app_context():
+        engine = db.engine
+
+    for i in range(requests):
+        for route in routes:
+            with max_queries(None) as queries:
+                started = time.perf_counter()
+                response = bench.request(route)
+                elapsed = time.perf_counter() - started
+
+            samples[route.name].append((elapsed, queries.count,
+                                        response.status_code == route.expected_status))
+
+        if echo and (i + 1) % 10 == 0:
+            echo("{} of {} rounds done.".format(i + 1, requests))
+
+    tracemalloc.start()
+    try:
+        for i in range(alloc_requests):
+            for route in routes:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                bench.request(route)
+                alloc_samples[route.name].append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'created_on': dt.datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'revision': git_revision(),
+        'database': engine.dialect.name,
+        'clients': clients,
+        'requests': requests,
+        'alloc_requests': alloc_requests,
+        'routes': {route.name: summarize(samples[route.name], alloc_samples[route.name])
+                   for route in routes},
+    }
+
+
+def git_revision():
+    """Return git revision of the working directory or None."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(__file__)).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextmanager
+def bench_app(database_url=None, config_object='nexus_challenge.settings', **config):
+    """Create app using given (empty) database, by default a temporary SQLite database.
+
+    The configuration is taken from ``config_object`` and updated with ``config``. The voting
+    period is set to have begun a day ago and CSRF protection is disabled, so that the test
+    clients can post forms. The cache is process-local and metrics are not written, so a run on
+    a production host does not leak bench pages or requests into the caches and metrics of the
+    live site, and passwords are hashed in the request thread.
+
+    """
+    # import here, because the app module imports the commands
+    from .app import create_app
+
+    settings = import_string(config_object) if isinstance(config_object, str) else config_object
+
+    tmpdir = None
+
+    if database_url is None:
+        tmpdir = tempfile.mkdtemp(prefix='nexus-bench-')
+        database_url = 'sqlite:///' + os.path.join(tmpdir, 'bench.db')
+
+    now = dt.datetime.utcnow()
+    options = {name: getattr(settings, name) for name in dir(settings) if name.isupper()}
+    options.update(
+        SQLALCHEMY_DATABASE_URI=database_url,
+        WTF_CSRF_ENABLED=False,
+        DEBUG_TB_ENABLED=False,
+        MAIL_WORKER_THREADS=0,
+        PASSWORD_POOL_WORKERS=0,
+        CACHE_TYPE='simple',
+        METRICS_DIR=None,
+        SUBMISSION_PERIOD_START=now - dt.timedelta(days=14),
+        SUBMISSION_PERIOD_END=now - dt.timedelta(days=1),
+        VOTING_PERIOD_START=now - dt.timedelta(days=1),
+        VOTING_PERIOD_END=now + dt.timedelta(days=6),
+    )
+    options.update(config)
+    app = create_app(SimpleNamespace(**options))
+
+    try:
+        with app.app_context():
+            db.create_all()
+
+        yield app
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
@@ -3,25 +3,40 @@
 
 # Standard library modules
 import datetime
+import json
 import os
+import random
 import time
 from email.utils import formataddr
 from glob import glob as fglob
-from operator import itemgetter
-from os.path import abspath, exists, join
+from os.path import abspath, join
 from subprocess import call
+from types import SimpleNamespace
 
 # Third-party modules
 import click
 from flask import current_app, render_template
 from flask.cli import AppGroup, with_appcontext
-from flask_mail import Message
-from internetarchive import download as ia_download, get_item as ia_get_item
+from sqlalchemy.orm import joinedload, load_only
 from werkzeug.exceptions import MethodNotAllowed, NotFound
 
-from .competition.models import CompetitionEntry
+from .assets import available_compressors
+from .bench import BenchError, bench_app, run_benchmark, seed
+from .competition.archiveorg import get_item_metadata
+from .competition.counters import reconcile
+from .competition.downloader import download_files, local_status, select_files
+from .competition.export import DATASETS, FORMATS, ExportError, export
+from .competition.fragments import cache_is_shared
+from .competition.freeze import FreezeError, freeze
+from .competition.models import CompetitionEntry, Vote
+from .competition.scoreboard import get_scoreboard
+from .competition.stats import refresh_stats
 from .database import db
-from .extensions import mail
+from .extensions import assets, mail
+from .replay import ClientTarget, HTTPTarget, parse_log, plan_replay, replay, summarize
+from .smtpsink import use_smtp_sink
+from .user.campaign import CampaignEmail, run_campaign
+from .user.email import SMTPSender, drain_outbox, make_message
 from .user.models import User
 from .utils import canonify_track_url
 
@@ -141,6 +156,145 @@ def urls(url, order):
         click.echo(str_template.format(*row[:column_length]))
 
 
+@click.command()
+@click.option('--users', '-u', default=1000, show_default=True, help='Number of users to create')
+@click.option('--entries', '-e', default=100, show_default=True,
+              help='Number of competition entries to create')
+@click.option('--voters', type=int, help='Number of users who voted (default: all)')
+@click.option('--requests', '-n', default=100, show_default=True,
+              help='Number of requests per route')
+@click.option('--clients', '-c', default=10, show_default=True,
+              help='Number of logged in users making requests')
+@click.option('--alloc-requests', default=20, show_default=True,
+              help='Number of requests per route to measure memory allocations')
+@click.option('--database-url', '-d',
+              help='URL of an empty database to use (default: temporary SQLite database)')
+@click.option('--bcrypt-rounds', type=int, help='Password hashing rounds (default: as configured)')
+@click.option('--seed', 'random_seed', default=0, show_default=True,
+              help='Seed of the random data and request choices')
+@click.option('--output', '-o', default='bench.json', show_default=True,
+              help='File to write the JSON report to')
+@with_appcontext
+def bench(users, entries, voters, requests, clients, alloc_requests, database_url, bcrypt_rounds,
+          random_seed, output):
+    """Benchmark the main pages with a large seeded dataset."""
+    if database_url and database_url == current_app.config['SQLALCHEMY_DATABASE_URI']:
+        raise click.ClickException("Refusing to seed the application database.")
+
+    config = {}
+
+    if bcrypt_rounds:
+        config['BCRYPT_LOG_ROUNDS'] = bcrypt_rounds
+
+    rng = random.Random(random_seed)
+
+    with bench_app(database_url, **config) as app:
+        click.echo("Seeding {} users, {} entries...".format(users, entries))
+        started = time.monotonic()
+
+        try:
+            with app.app_context():
+                dataset = seed(users, entries, voters, rng=rng)
+
+            click.echo("Seeded {votes} votes in {:.1f} s.".format(
+                time.monotonic() - started, **dataset))
+
+            if not requests:
+                # only seed, e.g. a database for replaying an access log with 'flask replay'
+                return
+
+            report = run_benchmark(app, requests, clients, alloc_requests, rng=rng,
+                                   echo=click.echo)
+        except BenchError as exc:
+            raise click.ClickException(str(exc))
+
+    report['dataset'] = dataset
+    click.echo("\n{:<18} {:>9} {:>9} {:>9} {:>8} {:>10} {:>7}".format(
+        "Route", "p50 ms", "p95 ms", "p99 ms", "queries", "alloc KiB", "errors"))
+
+    for name, stats in report['routes'].items():
+        click.echo("{:<18} {:9.2f} {:9.2f} {:9.2f} {:8.1f} {:10.1f} {:7d}".format(
+            name, stats['latency_ms']['p50'], stats['latency_ms']['p95'],
+            stats['latency_ms']['p99'], stats['queries']['mean'],
+            stats['alloc_kib']['p50'] or 0, stats['errors']))
+
+    with open(output, 'w') as fp:
+        json.dump(report, fp, indent=2)
+
+    click.echo("\nReport written to {}.".format(output))
+
+
+@click.command('replay')
+@click.option('--speed', '-s', default=1.0, show_default=True,
+              help='Speed-up factor of the original timing, 0 for no delays')
+@click.option('--target', '-t', default='client', show_default=True,
+              help="'client' for the Flask test client or base URL of a running instance")
+@click.option('--workers', '-w', type=int,
+              help='Number of concurrent requests (default: 1 for client, 8 for HTTP)')
+@click.option('--sessions', default=10, show_default=True,
+              help='Number of logged in seeded users')
+@click.option('--users', '-u', default=1000, show_default=True,
+              help='Number of users to seed (client target)')
+@click.option('--entries', '-e', default=100, show_default=True,
+              help='Number of competition entries to seed (client target)')
+@click.option('--database-url', '-d',
+              help='URL of an empty database to seed (client target, default: temporary SQLite '
+                   'database)')
+@click.option('--bcrypt-rounds', type=int,
+              help='Password hashing rounds (client target, default: as configured)')
+@click.option('--limit', '-n', type=int, help='Replay only the first N requests')
+@click.option('--output', '-o', help='File to write the JSON report to')
+@click.argument('logfile', type=click.File('r'))
+@with_appcontext
+def replay_log(logfile, speed, target, workers, sessions, users, entries, database_url,
+               bcrypt_rounds, limit, output):
+    """Replay requests from a gunicorn access log and report latencies per endpoint."""
+    records, invalid = parse_log(logfile)
+    records = records[:limit] if limit else records
+
+    if invalid:
+        click.echo("Ignored {} unparsable lines.".format(invalid))
+
+    planned, skipped = plan_replay(current_app, records, speed)
+    click.echo("Replaying {} of {} requests...".format(len(planned), len(records)))
+    rng = random.Random(0)
+    started = time.monotonic()
+
+    try:
+        if target == 'client':
+            config = {'BCRYPT_LOG_ROUNDS': bcrypt_rounds} if bcrypt_rounds else {}
+
+            with bench_app(database_url, **config) as app:
+                with app.app_context():
+                    seed(users, entries, rng=rng)
+
+                samples, lags = replay(ClientTarget(app, sessions, rng), planned, workers or 1,
+                                       echo=click.echo)
+        else:
+            samples, lags = replay(HTTPTarget(target, sessions, rng), planned, workers or 8,
+                                   echo=click.echo)
+    except BenchError as exc:
+        raise click.ClickException(str(exc))
+
+    report = summarize(samples, lags, skipped, time.monotonic() - started)
+    click.echo("\n{:<32} {:>8} {:>9} {:>9} {:>9} {:>7}".format(
+        "Endpoint", "requests", "p50 ms", "p95 ms", "p99 ms", "errors"))
+
+    for name, stats in report['endpoints'].items():
+        click.echo("{:<32} {:8d} {:9.2f} {:9.2f} {:9.2f} {:7d}".format(
+            name, stats['requests'], stats['latency_ms']['p50'], stats['latency_ms']['p95'],
+            stats['latency_ms']['p99'], stats['errors']))
+
+    click.echo("\nStart delay p95: {} ms, skipped: {}".format(
+        report['lag_ms']['p95'], sum(skipped.values())))
+
+    if output:
+        with open(output, 'w') as fp:
+            json.dump(report, fp, indent=2)
+
+        click.echo("Report written to {}.".format(output))
+
+
 @click.command()
 @with_appcontext
 def create_db():
@@ -181,97 +335,213 @@ def create_admin(name, password):
         click.echo("User '{}' created.".format(name))
 
 
+# Commands to build the static assets
+assets_group = AppGroup('assets')
+
+
+@click.option('--clean', default=False, is_flag=True,
+              help='Remove files of earlier builds from the output directory')
+@assets_group.command()
+def build(clean=False):
+    """Bundle, minify, fingerprint and compress the static assets."""
+    if '.br' not in available_compressors():
+        click.echo("The 'brotli' package is not installed, skipping .br files.", err=True)
+
+    manifest = assets.build(clean=clean)
+    output_dir = current_app.config['ASSETS_OUTPUT_DIR']
+
+    for name, filename in sorted(manifest.items()):
+        path = join(current_app.static_folder, filename)
+        sizes = ['{:,} bytes'.format(os.path.getsize(path))]
+        sizes.extend('{} {:,}'.format(suffix, os.path.getsize(path + suffix))
+                     for suffix in ('.gz', '.br') if os.path.exists(path + suffix))
+        click.echo("{} -> {} ({})".format(name, filename, ', '.join(sizes)))
+
+    click.echo("Manifest written to {}.".format(join(output_dir, 'manifest.json')))
+
+
 # Commands to handle send notification and reminder emails
 email_group = AppGroup('email')
 
 
 @email_group.command()
-@click.option('--dry-run', '-n', default=False, is_flag=True,
-              help='Do not sent actual email, just print it')
-def publish_reminder(dry_run):
-    """Send an email to users with unpublished competition entries."""
-    entries = CompetitionEntry.query.filter_by(is_published=False)
-    click.echo("Sending entry publication reminder to {} users.".format(entries.count()))
-
-    with mail.record_messages() as outbox, current_app.test_request_context():
-        for entry in entries:
-            try:
-                entry_url = "{}/submit/".format(current_app.config['SITE_URL'].rstrip('/'))
-                body = render_template(
-                    'competition/reminder_publish.html',
-                    entry_url=entry_url,
-                    entry=entry,
-                    user=entry.user,
-                    deadline=current_app.config['SUBMISSION_PERIOD_END']
-                )
-                subject = 'Reminder: your Nexus Challenge competition entry is still unpublished!'
-                recipient = formataddr((entry.user.username, entry.user.email))
-                msg = Message(
-                    subject,
-                    recipients=[recipient],
-                    html=body,
-                    sender=current_app.config.get('MAIL_DEFAULT_SENDER', 'noreply@example.com')
-                )
-
-                if dry_run:
-                    click.echo("\nTo: {}\nSubject: {}\n\n{}\n".format(recipient, subject, body))
-                else:
-                    mail.send(msg)
-            except Exception:
-                current_app.logger.exception("Error sending entry publication reminder.")
-                click.echo("Could not send entry publication reminder '{}'. "
-                           "See log for details".format(recipient))
+@click.option('--batch-size', '-b', default=50, show_default=True,
+              help='Maximum number of emails to send per batch')
+@click.option('--interval', '-i', default=5.0, show_default=True,
+              help='Seconds to wait before checking the outbox again, when it is empty')
+@click.option('--once', default=False, is_flag=True,
+              help='Exit when there are no more emails due to be sent')
+def worker(batch_size, interval, once):
+    """Send emails from the outbox."""
+    sender = SMTPSender()
+
+    try:
+        while True:
+            sent, failed = drain_outbox(sender, batch_size)
+
+            if sent or failed:
+                click.echo("{} emails sent, {} failed.".format(sent, failed))
             else:
-                click.echo("Entry publication reminder sent to '{}'.".format(recipient))
+                sender.close()
+
+                if once:
+                    break
+
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        click.echo("Aborted.")
+    finally:
+        sender.close()
+
+
+def campaign_options(func):
+    """Add common options of reminder email campaign commands to command function."""
+    func = click.option('--dry-run', '-n', default=False, is_flag=True,
+                        help='Do not sent actual email, just print it')(func)
+    func = click.option('--campaign', '-c',
+                        help='Name of campaign in send log, which is used to skip recipients '
+                             'who were already sent the email, e.g. to resume an interrupted '
+                             'run on a later day (default: derived from the reminder type, the '
+                             'deadline and the current date)')(func)
+    func = click.option('--rate', '-r', type=float,
+                        help='Maximum number of emails to send per second, 0 for no limit '
+                             '(default: config MAIL_CAMPAIGN_RATE)')(func)
+    return func
 
-    click.echo("\nAll done. {} emails sent.".format(len(outbox)))
+
+def default_campaign(kind, deadline, today=None):
+    """Return default campaign name of reminder of given kind for deadline sent today.
+
+    Runs on the same day share the name, so an interrupted run is resumed, while a further
+    reminder on a later day is sent to all recipients again.
+
+    """
+    today = today or datetime.date.today()
+    return '{}-{:%Y%m%d}-{:%Y%m%d}'.format(kind, deadline, today)
+
+
+def send_reminders(campaign, entries, subject, template, dry_run=False, rate=None, **context):
+    """Send reminder email rendered from template to users who submitted given entries.
+
+    Entries without a user (e.g. of deleted users) are skipped.
+
+    """
+    entries = (
+        entries
+        .filter(CompetitionEntry.user_id != None)  # noqa:E711
+        .options(joinedload(CompetitionEntry.user))
+        .all()
+    )
+    # detach entries and users, so they can be safely used for rendering in other threads
+    db.session.expunge_all()
+    emails = [
+        CampaignEmail(
+            key=entry.user.email,
+            recipient=formataddr((entry.user.username, entry.user.email)),
+            subject=subject,
+            template=template,
+            context=dict(context, entry=entry, user=entry.user)
+        )
+        for entry in entries
+    ]
+    click.echo("Sending reminder '{}' to {} users.".format(campaign, len(emails)))
+
+    result = run_campaign(campaign, emails, rate=rate, dry_run=dry_run, echo=click.echo)
+
+    click.echo("\nAll done. {r.sent} emails sent, {r.failed} failed, {r.skipped} skipped "
+               "(already sent) in {r.elapsed:.1f} seconds.".format(r=result))
 
 
 @email_group.command()
-@click.option('--dry-run', '-n', default=False, is_flag=True,
-              help='Do not sent actual email, just print it')
+@campaign_options
+def publish_reminder(dry_run, campaign, rate):
+    """Send an email to users with unpublished competition entries."""
+    deadline = current_app.config['SUBMISSION_PERIOD_END']
+    send_reminders(
+        campaign or default_campaign('publish-reminder', deadline),
+        CompetitionEntry.query.filter_by(is_published=False),
+        'Reminder: your Nexus Challenge competition entry is still unpublished!',
+        'competition/reminder_publish.html',
+        dry_run=dry_run,
+        rate=rate,
+        entry_url="{}/submit/".format(current_app.config['SITE_URL'].rstrip('/')),
+        deadline=deadline
+    )
+
+
+@email_group.command()
+@campaign_options
 @click.option('--entry-id', '-e', type=int,
               help='Send reminder only to user who submitted entry with given id')
-def voting_reminder(dry_run=False, entry_id=None):
+def voting_reminder(dry_run=False, campaign=None, rate=None, entry_id=None):
     """Send an email to users who published a competition entry, reminding them to vote."""
     if entry_id:
         entries = CompetitionEntry.query.filter_by(id=entry_id)
     else:
         entries = CompetitionEntry.query.filter_by(is_approved=True)
 
-    click.echo("Sending entry voting reminder to {} users.".format(entries.count()))
-
-    with mail.record_messages() as outbox, current_app.test_request_context():
-        for entry in entries:
-            try:
-                entry_url = "{}/vote/".format(current_app.config['SITE_URL'].rstrip('/'))
-                body = render_template(
-                    'competition/reminder_voting.html',
-                    entry_url=entry_url,
-                    entry=entry,
-                    user=entry.user,
-                )
-                subject = 'Reminder: your vote is needed in the Nexus Challenge!'
-                recipient = formataddr((entry.user.username, entry.user.email))
-                msg = Message(
-                    subject,
-                    recipients=[recipient],
-                    html=body,
-                    sender=current_app.config.get('MAIL_DEFAULT_SENDER', 'noreply@example.com')
-                )
-
-                if dry_run:
-                    click.echo("\nTo: {}\nSubject: {}\n\n{}\n".format(recipient, subject, body))
-                else:
-                    mail.send(msg)
-            except Exception:
-                current_app.logger.exception("Error sending voting reminder.")
-                click.echo("Could not send voting reminder '{}'. "
-                           "See log for details".format(recipient))
-            else:
-                click.echo("Entry voting reminder sent to '{}'.".format(recipient))
+    voting_end = current_app.config['VOTING_PERIOD_END']
+    send_reminders(
+        campaign or default_campaign('voting-reminder', voting_end),
+        entries,
+        'Reminder: your vote is needed in the Nexus Challenge!',
+        'competition/reminder_voting.html',
+        dry_run=dry_run,
+        rate=rate,
+        entry_url="{}/vote/".format(current_app.config['SITE_URL'].rstrip('/')),
+        voting_start=current_app.config['VOTING_PERIOD_START'],
+        voting_end=voting_end
+    )
+
+
+@email_group.command()
+@click.option('--count', '-n', default=200, show_default=True,
+              help='Number of emails to send in each run')
+@click.option('--latency', '-l', default=0.005, show_default=True,
+              help='Seconds the SMTP stand-in waits before each reply')
+@click.option('--rate', '-r', default=0.0, show_default=True,
+              help='Maximum number of emails to send per second in campaign run, 0 for no limit')
+def benchmark(count, latency, rate):
+    """Compare email throughput of per-message connections vs. a campaign run.
+
+    Emails are sent to a local SMTP stand-in, which discards them.
+
+    """
+    app = current_app._get_current_object()
+    context = dict(
+        entry_url="{}/submit/".format(app.config['SITE_URL'].rstrip('/')),
+        deadline=app.config['SUBMISSION_PERIOD_END'],
+        entry=SimpleNamespace(title='Benchmark', artist='Benchmark',
+                              url='https://archive.org/details/benchmark',
+                              created_on=datetime.datetime.utcnow())
+    )
+    emails = [
+        CampaignEmail(
+            key=None,
+            recipient='user{}@example.com'.format(i),
+            subject='Benchmark',
+            template='competition/reminder_publish.html',
+            context=dict(context, user=SimpleNamespace(username='user{}'.format(i)))
+        )
+        for i in range(count)
+    ]
+
+    def report(label, sink, elapsed):
+        click.echo("{:<30} {:5d} emails, {:5d} connections, {:7.2f} s, {:8.1f} emails/s".format(
+            label, sink.messages, sink.connections, elapsed, sink.messages / elapsed))
+
+    with use_smtp_sink(app, latency=latency) as sink:
+        started = time.monotonic()
+
+        with app.test_request_context():
+            for email in emails:
+                body = render_template(email.template, **email.context)
+                mail.send(make_message(app, email.recipient, email.subject, body))
 
-    click.echo("\nAll done. {} emails sent.".format(len(outbox)))
+        report("Connection per message:", sink, time.monotonic() - started)
+        sink.reset()
+        result = run_campaign(None, emails, rate=rate)
+        report("Campaign:", sink, result.elapsed)
 
 
 # Commands to handle competition maintenance tasks
@@ -281,29 +551,136 @@ compo_group = AppGroup('compo')
 @compo_group.command()
 def check_votes():
     """Display list of competition entries and whether the user, who submitted it, has voted."""
-    for entry in CompetitionEntry.query.filter_by(is_approved=True).order_by('title'):
+    voters = {user_id for (user_id,) in db.session.query(Vote.user_id).distinct()}
+    entries = (
+        CompetitionEntry.query
+        .filter_by(is_approved=True)
+        .options(load_only(CompetitionEntry.title, CompetitionEntry.artist,
+                           CompetitionEntry.user_id),
+                 joinedload(CompetitionEntry.user).load_only(User.username))
+        .order_by(CompetitionEntry.title)
+    )
+
+    for entry in entries:
         click.echo("{e.artist} - {e.title}".format(e=entry))
         click.echo("User: {}".format(entry.user.username))
-        click.echo("Voted: {}".format("yes" if bool(entry.user.votes) else "no"))
+        click.echo("Voted: {}".format("yes" if entry.user_id in voters else "no"))
         click.echo('')
 
 
+@click.option('--all', '-a', 'render_all', default=False, is_flag=True,
+              help='Re-render all entries, not only those without pre-rendered HTML')
+@compo_group.command()
+def render_markdown(render_all=False):
+    """Pre-render the HTML of the Markdown fields of competition entries."""
+    entries = CompetitionEntry.query
+    if not render_all:
+        entries = entries.filter(db.or_(
+            *[getattr(CompetitionEntry, field + '_html') == None  # noqa:E711
+              for field in CompetitionEntry.markdown_fields]))
+
+    count = 0
+    for entry in entries:
+        entry.render_html()
+        count += 1
+
+    db.session.commit()
+    click.echo("Rendered Markdown fields of {} competition entries.".format(count))
+
+
+@click.option('--dry-run', '-n', default=False, is_flag=True,
+              help='Only report differences, do not repair the counters')
+@compo_group.command()
+def reconcile_counters(dry_run=False):
+    """Check the vote counters against a full recount of the votes and repair them."""
+    problems = reconcile(repair=not dry_run)
+
+    for problem in problems:
+        click.echo(problem)
+
+    if not problems:
+        click.echo("All vote counters are correct.")
+    elif dry_run:
+        click.echo("\n{} problems found.".format(len(problems)))
+    else:
+        click.echo("\n{} problems found and repaired.".format(len(problems)))
+
+
+@click.option('--quiet', '-q', default=False, is_flag=True,
+              help='Do not print the statistics')
+@compo_group.command('refresh-stats')
+def refresh_statistics(quiet=False):
+    """Recompute the cached competition statistics."""
+    if not cache_is_shared():
+        raise click.ClickException("The cache is local to this process, so the application "
+                                   "would not see the statistics. Set CACHE_TYPE to a shared "
+                                   "cache, e.g. 'filesystem' with CACHE_DIR.")
+
+    stats = refresh_stats()
+
+    if not quiet:
+        click.echo("Users: {s.registered} registered, {s.confirmed} confirmed, "
+                   "{s.voters} voted".format(s=stats))
+        click.echo("Entries: {s.drafts} drafts, {s.published} awaiting approval, "
+                   "{s.approved} approved".format(s=stats))
+        click.echo("Entrants: {s.entrants}, voted: {s.entrants_voted}".format(s=stats))
+
+        for row in stats.votes_per_day:
+            click.echo("{r.day}: {r.votes} votes by {r.voters} users".format(r=row))
+
+
+@click.option('--format', '-f', 'fmt', type=click.Choice(sorted(FORMATS)), default='csv',
+              show_default=True, help='Output format (parquet needs pyarrow)')
+@click.option('--output', '-o', type=click.File('wb'), default='-',
+              help='Output file (default: standard output)')
+@click.argument('dataset', type=click.Choice(sorted(DATASETS)))
+@compo_group.command('export')
+def export_data(dataset, fmt='csv', output=None):
+    """Export entries, anonymized ballots or the scoreboard for analysis."""
+    try:
+        for chunk in export(dataset, fmt):
+            output.write(chunk)
+    except ExportError as exc:
+        raise click.ClickException(str(exc))
+
+
+@click.option('--workers', '-w', default=4, show_default=True,
+              help='Number of pages to render concurrently')
+@click.option('--force', '-f', default=False, is_flag=True,
+              help='Freeze pages even if the voting period is not over')
+@click.argument('output_dir')
+@compo_group.command('freeze')
+def freeze_pages(output_dir, workers=4, force=False):
+    """Render the public competition pages to static files in OUTPUT_DIR.
+
+    Run this again after changing entries, e.g. approving one.
+
+    """
+    end_date = current_app.config.get('VOTING_PERIOD_END')
+
+    if not force and end_date and datetime.datetime.utcnow() < end_date:
+        raise click.ClickException("The voting period is not over yet, use --force to freeze "
+                                   "the pages anyway.")
+
+    try:
+        pages = freeze(output_dir, workers)
+    except FreezeError as exc:
+        raise click.ClickException(str(exc))
+
+    click.echo("{} pages ({:,} bytes) written to {}.".format(
+        len(pages), sum(page.size for page in pages), abspath(output_dir)))
+
+
 @click.option('--anonymize', '-a', default=False, is_flag=True,
               help='Do not reveal artist or song name, just fake names')
 @compo_group.command()
 def print_scoreboard(anonymize=False):
     """Print list of entries with total score."""
-    results = []
-
-    for entry in CompetitionEntry.query.filter_by(is_approved=True):
-        points = sum(vote.points for vote in entry.votes)
-        results.append((points, entry))
-
-    for i, (points, entry) in enumerate(sorted(results, key=itemgetter(0), reverse=True)):
+    for i, row in enumerate(get_scoreboard()):
         if anonymize:
-            click.echo("artist #{i} - <hidden title>: {p}".format(i=i, p=points))
+            click.echo("artist #{i} - <hidden title>: {p}".format(i=i, p=row.points))
         else:
-            click.echo("{e.artist} - {e.title}: {p}".format(e=entry, p=points))
+            click.echo("{r.artist} - {r.title}: {r.points}".format(r=row))
 
 
 @click.option('--dry-run', '-n', default=False, is_flag=True,
@@ -312,52 +689,61 @@ def print_scoreboard(anonymize=False):
               help='Download only file of entry with given id')
 @click.option('--glob', '-g',
               help='Restrict downloaded files to those matching given glob pattern')
+@click.option('--workers', '-w', default=4, show_default=True,
+              help='Number of files to download concurrently')
+@click.option('--per-host', default=2, show_default=True,
+              help='Maximum number of concurrent downloads from the same host')
 @click.argument('output_dir')
 @compo_group.command()
-def download_entries(output_dir, dry_run=False, entry_id=None, glob=None):
-    """Download all files of all or competition entries or of one entry."""
+def download_entries(output_dir, dry_run=False, entry_id=None, glob=None, workers=4, per_host=2):
+    """Download all files of all or competition entries or of one entry.
+
+    Files which were already downloaded completely are skipped, partial downloads are resumed.
+
+    """
     if entry_id:
         entries = CompetitionEntry.query.filter_by(id=entry_id)
     else:
         entries = CompetitionEntry.query.filter_by(is_approved=True)
 
-    try:
-        if not exists(output_dir):
-            os.makedirs(output_dir)
-        os.chdir(output_dir)
-
-        for entry in entries:
-            url, track_id = canonify_track_url(entry.url)
-
-            destdir = abspath(join(output_dir, track_id))
-            click.echo("Downloading files for item '{}' to directory '{}'...".format(
-                       track_id, destdir))
-
-            if dry_run:
-                try:
-                    item = ia_get_item(track_id, request_kwargs={'timeout': 30})
-                    metadata = item.item_metadata.get('metadata')
-                    if not metadata:
-                        raise ValueError("'%s' not found." % track_id)
-                except Exception as exc:
-                    click.echo("Could not get meta data for item '{}' from Archive.org: {}".format(
-                               track_id, exc))
-                else:
-                        for file in item.files:
-                            click.echo("'{}' size: {:3.2f} kB...".format(
-                                       file['name'], int(file.get('size', 0)) / 1024))
-            else:
-                try:
-                    ia_download(track_id, glob_pattern=glob, verbose=True,
-                                formats=['FLAC', 'Metadata'])
-                except Exception as exc:
-                    click.echo("Error downloading item '{}' from Archive.org: {}".format(
-                               track_id, exc))
-                # be nice (server drops connection frequently otherwise)
-                time.sleep(1.0)
+    output_dir = abspath(output_dir)
+    tasks = []
+
+    for entry in entries:
+        url, track_id = canonify_track_url(entry.url)
+
+        try:
+            item = get_item_metadata(track_id)
+        except Exception as exc:
+            click.echo("Could not get meta data for item '{}' from Archive.org: {}".format(
+                       track_id, exc))
+            continue
+
+        files = select_files(track_id, item.files, output_dir, glob=glob)
+
+        if dry_run:
+            click.echo("Files for item '{}' in directory '{}':".format(
+                       track_id, join(output_dir, track_id)))
 
+            for task in files:
+                click.echo("'{}' size: {:3.2f} kB ({})".format(
+                           task.name, (task.size or 0) / 1024, local_status(task)))
+
+        tasks.extend(files)
+
+    if dry_run or not tasks:
+        return
+
+    click.echo("Downloading {} files with {} workers to '{}'...".format(
+               len(tasks), workers, output_dir))
+
+    try:
+        progress = download_files(tasks, workers=workers, max_per_host=per_host,
+                                  echo=click.echo)
     except KeyboardInterrupt:
         click.echo("Aborted.")
+    else:
+        click.echo("\nAll done. " + progress.summary())
 
 
 def label_barh(ax, fmt="{}", spacing=5, align='left', is_inside=False, **kwargs):
@@ -423,20 +809,18 @@ def scoregraph(output, toolkit):
     import seaborn as sns
     import pandas as pd
 
-    # Accumulate data
+    # Accumulate data, lowest rank first, since the bar graph is drawn bottom-up
     entries = []
-    for entry in CompetitionEntry.query.filter_by(is_approved=True):
+    for row in reversed(get_scoreboard()):
         data = {
-            'title': "{title}\nby {artist}".format(artist=ellip(entry.artist),
-                                                   title=ellip(entry.title)),
-            'Total score': sum(vote.points for vote in entry.votes),
-            '# of 5 point votes': sum(1 for vote in entry.votes if vote.points == 5),
-            '# of 4 point votes': sum(1 for vote in entry.votes if vote.points == 4),
+            'title': "{title}\nby {artist}".format(artist=ellip(row.artist),
+                                                   title=ellip(row.title)),
+            'Total score': row.points,
+            '# of 5 point votes': row.counts[5],
+            '# of 4 point votes': row.counts[4],
         }
         entries.append(data)
 
-    entries.sort(key=itemgetter('Total score', '# of 5 point votes', '# of 5 point votes'),
-                 reverse=False)
     entries_df = pd.DataFrame(entries)
 
     # build graph
@@ -476,10 +860,13 @@ def raffle(exclude):
         exclude = set()
 
     # collect elegible users
-    usernames = []
-    for user in User.query.filter_by(is_confirmed=True):
-        if user.votes and user.username not in exclude:
-            usernames.append(user.username)
+    voters = (
+        db.session.query(User.username)
+        .filter(User.is_confirmed == True,  # noqa:E712
+                User.id.in_(db.session.query(Vote.user_id)))
+        .order_by(User.username)
+    )
+    usernames = [username for (username,) in voters if username not in exclude]
 
     click.echo("Selecting raffle winner from {:d} elegible voters...\n".format(len(usernames)))
 
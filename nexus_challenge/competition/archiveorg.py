@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""Archive.org item meta data retrieval and caching.
+
+Item meta data is stored in the ``archiveorg_items`` table and only fetched again from
+Archive.org, when the cached copy is older than ``ARCHIVEORG_CACHE_TTL`` seconds. Re-fetching
+is done with a conditional request using the ETag of the cached copy, if the server sent one.
+
+Requests to Archive.org are guarded by a per-host circuit breaker, so that when the site is
+down, callers fail fast instead of each waiting for the full request timeout.
+
+Checking the meta data of a competition entry is done by a background job (see
+``queue_entry_check``), which records its outcome in the ``check_*`` columns of the entry.
+
+"""
+
+# Standard library modules
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+# Third-party modules
+from flask import current_app
+from internetarchive import get_session
+
+# Application specific modules
+from nexus_challenge.database import db
+from nexus_challenge.extensions import jobs, metrics
+from nexus_challenge.jobs import CircuitBreaker
+from nexus_challenge.metrics import ARCHIVEORG_REQUEST_DURATION
+from nexus_challenge.utils import canonify_track_url, format_duration
+
+from .models import ArchiveItem, CompetitionEntry
+
+
+METADATA_URL = 'https://archive.org/metadata/{}'
+FILE_FIELDS = ('name', 'format', 'size', 'md5', 'length')
+
+breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60.0)
+
+
+def _get(url, **kwargs):
+    started = time.perf_counter()
+
+    try:
+        resp = get_session().get(url, **kwargs)
+    except Exception:
+        metrics.observe(ARCHIVEORG_REQUEST_DURATION, time.perf_counter() - started,
+                        status='error')
+        raise
+
+    metrics.observe(ARCHIVEORG_REQUEST_DURATION, time.perf_counter() - started,
+                    status=resp.status_code)
+    # count server errors as failures of the host, but not e.g. 404s
+    if resp.status_code >= 500:
+        resp.raise_for_status()
+    return resp
+
+
+def fetch_item_metadata(track_id, etag=None, timeout=30):
+    """Fetch meta data of item with given id from Archive.org.
+
+    Returns a ``(metadata, etag)`` tuple, where ``metadata`` is ``None``, if the server
+    responded that the item has not been modified since the given ``etag``.
+
+    Raises ``ValueError``, if the item does not exist, and
+    ``nexus_challenge.jobs.CircuitOpenError``, if Archive.org failed repeatedly just before.
+
+    """
+    url = METADATA_URL.format(track_id)
+    headers = {'If-None-Match': etag} if etag else {}
+    resp = breaker.call(urlparse(url).netloc, _get, url, headers=headers, timeout=timeout)
+
+    if resp.status_code == 304:
+        return None, etag
+
+    resp.raise_for_status()
+    metadata = resp.json()
+
+    if not metadata.get('metadata'):
+        raise ValueError("'%s' not found." % track_id)
+
+    return metadata, resp.headers.get('ETag')
+
+
+def update_item(item, metadata):
+    """Update cached ``ArchiveItem`` from Archive.org item meta data dict."""
+    info = metadata['metadata']
+    item.title = info.get('title', '').strip()
+    item.creator = info.get('creator', '').strip()
+    item.files = [{key: file.get(key) for key in FILE_FIELDS if key in file}
+                  for file in metadata.get('files', [])]
+    item.flac_name = item.flac_length = None
+
+    for file in item.files:
+        if file.get('format') == 'Flac':
+            item.flac_name = file['name']
+            try:
+                item.flac_length = float(file.get('length', 0))
+            except (TypeError, ValueError):
+                item.flac_length = 0
+            break
+
+
+def get_item_metadata(track_id, max_age=None, refresh=False):
+    """Return cached ``ArchiveItem`` for given track id.
+
+    The meta data is (re-)fetched from Archive.org first, if it is not in the cache yet, the
+    cached copy is older than ``max_age`` seconds (default: config ``ARCHIVEORG_CACHE_TTL``) or
+    ``refresh`` is true. If fetching fails, but a cached copy exists, it is returned anyway.
+
+    """
+    if max_age is None:
+        max_age = current_app.config.get('ARCHIVEORG_CACHE_TTL', 3600)
+
+    item = ArchiveItem.query.filter_by(track_id=track_id).first()
+
+    if item and not refresh and not item.is_stale(max_age):
+        return item
+
+    try:
+        metadata, etag = fetch_item_metadata(
+            track_id,
+            etag=item.etag if item else None,
+            timeout=current_app.config.get('ARCHIVEORG_TIMEOUT', 30))
+    except Exception as exc:
+        if not item:
+            raise
+
+        current_app.logger.warning("Could not refresh meta data for Archive.org item '%s', "
+                                   "using cached copy: %s", track_id, exc)
+        return item
+
+    if item is None:
+        item = ArchiveItem(track_id=track_id)
+
+    if metadata is not None:
+        update_item(item, metadata)
+
+    item.etag = etag
+    item.last_fetched_on = datetime.utcnow()
+    item.save()
+    return item
+
+
+def check_item(item, title, artist):
+    """Check cached Archive.org item meta data against competition entry data.
+
+    Returns a list of error messages, which is empty if all checks passed.
+
+    """
+    errors = []
+
+    if (item.title or '').lower() != title.strip().lower():
+        errors.append("Title does not match title in Archive.org meta data.")
+
+    if (item.creator or '').lower() != artist.strip().lower():
+        errors.append("Artist does not match creator / author in Archive.org meta data.")
+
+    if item.has_flac:
+        min_length = current_app.config.get('MIN_TRACK_LENGTH', 60.0)
+        max_length = current_app.config.get('MAX_TRACK_LENGTH', 300.0)
+
+        if item.flac_length < min_length:
+            errors.append("Track does not have minimum required duration (%s min.)."
+                          % format_duration(min_length))
+        elif item.flac_length > max_length:
+            errors.append("Track exceeds maximum allowed duration (%s min.)." %
+                          format_duration(max_length))
+    else:
+        errors.append("Track not available in FLAC format.")
+
+    return errors
+
+
+def validate_item(track_id, title, artist):
+    """Check Archive.org item meta data against competition entry data.
+
+    Uses the cached meta data, if possible, but re-fetches it, if the checks fail against the
+    cached copy, since the user may have just fixed the item on Archive.org.
+
+    Returns a list of error messages, which is empty if all checks passed.
+
+    """
+    started = datetime.utcnow()
+    item = get_item_metadata(track_id)
+    errors = check_item(item, title, artist)
+
+    if errors and item.last_fetched_on < started:
+        item = get_item_metadata(track_id, refresh=True)
+        errors = check_item(item, title, artist)
+
+    return errors
+
+
+def check_entry(entry_id):
+    """Check Archive.org meta data of competition entry and record the result.
+
+    This is run as a background job.
+
+    """
+    entry = CompetitionEntry.get_by_id(entry_id)
+
+    if entry is None:
+        return
+
+    _, track_id = canonify_track_url(entry.url)
+
+    try:
+        errors = validate_item(track_id, entry.title, entry.artist)
+    except Exception as exc:
+        db.session.rollback()
+        entry.update(check_status=CompetitionEntry.CHECK_ERROR,
+                     check_errors="Could not get meta data from Archive.org: %s" % exc,
+                     checked_on=datetime.utcnow())
+    else:
+        entry.update(
+            check_status=CompetitionEntry.CHECK_FAILED if errors else CompetitionEntry.CHECK_PASSED,
+            check_errors='\n'.join(errors) or None,
+            checked_on=datetime.utcnow())
+
+
+def queue_entry_check(entry):
+    """Mark entry as pending the Archive.org meta data check and queue a job for it.
+
+    If the cached meta data is fresh and passes the checks, the entry is marked as passed
+    right away, without queueing a job.
+
+    """
+    _, track_id = canonify_track_url(entry.url)
+    max_age = current_app.config.get('ARCHIVEORG_CACHE_TTL', 3600)
+    item = ArchiveItem.query.filter_by(track_id=track_id).first()
+
+    if item and not item.is_stale(max_age) and not check_item(item, entry.title, entry.artist):
+        entry.update(check_status=CompetitionEntry.CHECK_PASSED, check_errors=None,
+                     checked_on=datetime.utcnow())
+        return
+
+    entry.update(check_status=CompetitionEntry.CHECK_PENDING, check_errors=None)
+
+    if not jobs.submit(check_entry, entry.id):
+        entry.update(check_status=CompetitionEntry.CHECK_ERROR,
+                     check_errors="Too many checks pending. Please save your entry again "
+                                  "in a few minutes.")
+
+
+def prefetch_item(url):
+    """Refresh the cached meta data for the Archive.org item with given URL.
+
+    Errors are logged, but otherwise ignored.
+
+    """
+    _, track_id = canonify_track_url(url)
+
+    try:
+        return get_item_metadata(track_id, refresh=True)
+    except Exception as exc:
+        db.session.rollback()
+        current_app.logger.warning("Could not fetch meta data for Archive.org item '%s': %s",
+                                   track_id, exc)
+
+
+def queue_prefetch(url):
+    """Queue a job refreshing the cached meta data for the Archive.org item with given URL.
+
+    This only warms up the cache, so the job is dropped if too many jobs are pending.
+
+    """
+    jobs.submit(prefetch_item, url)
+
+
+def get_track_lengths(urls):
+    """Return dict mapping track URLs to the length of their FLAC file in seconds.
+
+    Only the cached meta data is used, tracks without it or without FLAC file are left out.
+
+    """
+    track_ids = {canonify_track_url(url)[1]: url for url in urls}
+
+    if not track_ids:
+        return {}
+
+    rows = (db.session.query(ArchiveItem.track_id, ArchiveItem.flac_length)
+            .filter(ArchiveItem.track_id.in_(list(track_ids)),
+                    ArchiveItem.flac_length > 0))
+    return {track_ids[track_id]: length for track_id, length in rows}
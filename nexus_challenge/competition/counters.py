@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""Denormalized vote counters.
+
+The total points and the number of votes per points of each entry are kept in the
+``competition_entry_scores`` table and the number of users who voted in the
+``competition_counters`` table. The counters are changed by delta (``SET x = x + n``) within the
+transaction, which changes the votes, so they are never out of sync with committed votes and
+concurrent ballots do not overwrite each other's changes.
+
+``reconcile`` compares the counters with a full recount of the votes and optionally repairs them,
+e.g. after votes were changed in the database directly.
+
+"""
+
+# Standard library modules
+from collections import defaultdict, namedtuple
+
+# Third-party modules
+from sqlalchemy import distinct, func
+
+# Application specific modules
+from nexus_challenge.database import db
+
+from .models import Counter, EntryScore, Vote
+from .scoreboard import VOTE_POINTS
+
+
+VOTERS = 'voters'
+
+Score = namedtuple('Score', 'total counts')
+
+
+def count_column(points):
+    """Return column of ``EntryScore`` counting the votes with given points."""
+    return getattr(EntryScore, 'count_{}'.format(points))
+
+
+def get_counter(name):
+    """Return value of global counter with given name (0 if it does not exist yet)."""
+    return db.session.query(Counter.value).filter_by(name=name).scalar() or 0
+
+
+def increment_counter(name, delta=1):
+    """Add delta to global counter with given name, creating it if necessary (no commit)."""
+    updated = (
+        Counter.query
+        .filter_by(name=name)
+        .update({Counter.value: Counter.value + delta}, synchronize_session=False)
+    )
+
+    if not updated:
+        db.session.add(Counter(name=name, value=delta))
+        db.session.flush()
+
+
+def ensure_scores(entry_ids):
+    """Create missing ``EntryScore`` rows for entries with given ids (no commit)."""
+    existing = {entry_id for (entry_id,) in
+                db.session.query(EntryScore.entry_id).filter(EntryScore.entry_id.in_(entry_ids))}
+
+    for entry_id in set(entry_ids) - existing:
+        db.session.add(EntryScore(entry_id=entry_id, total_points=0,
+                                  **{'count_{}'.format(points): 0 for points in VOTE_POINTS}))
+
+    db.session.flush()
+
+
+def apply_vote_deltas(deltas, new_voters=0):
+    """Apply changes of the number of votes per entry and points to the counters (no commit).
+
+    ``deltas`` maps entry ids to dicts mapping points to the change of the number of votes with
+    these points for the entry (e.g. ``{3: {5: -1}, 7: {5: 1}}`` when a user moves their five
+    point vote from entry 3 to 7). ``new_voters`` is added to the voter count.
+
+    """
+    deltas = {entry_id: counts for entry_id, counts in deltas.items()
+              if entry_id is not None and any(counts.values())}
+
+    if deltas:
+        ensure_scores(list(deltas))
+
+    for entry_id, counts in deltas.items():
+        total = sum(points * count for points, count in counts.items())
+        values = {EntryScore.total_points: EntryScore.total_points + total}
+
+        for points, count in counts.items():
+            column = count_column(points)
+            values[column] = column + count
+
+        EntryScore.query.filter_by(entry_id=entry_id).update(values, synchronize_session=False)
+
+    if new_voters:
+        increment_counter(VOTERS, new_voters)
+
+
+def recount():
+    """Count scores from the votes.
+
+    Returns a ``(scores, voters)`` tuple, where ``scores`` maps entry ids to ``Score`` tuples.
+
+    """
+    scores = defaultdict(lambda: Score(0, {points: 0 for points in VOTE_POINTS}))
+    query = (
+        db.session.query(Vote.entry_id, Vote.points, func.count(Vote.id))
+        .filter(Vote.entry_id != None)  # noqa:E711
+        .group_by(Vote.entry_id, Vote.points)
+    )
+
+    for entry_id, points, count in query:
+        score = scores[entry_id]
+        score.counts[points] = count
+        scores[entry_id] = score._replace(total=score.total + points * count)
+
+    voters = db.session.query(func.count(distinct(Vote.user_id))).scalar()
+    return dict(scores), voters
+
+
+def reconcile(repair=False):
+    """Compare the counters with a full recount of the votes.
+
+    Returns a list of messages describing the differences found. If ``repair`` is true, the
+    counters are set to the recounted values and the changes are committed.
+
+    """
+    scores, voters = recount()
+    empty = Score(0, {points: 0 for points in VOTE_POINTS})
+    problems = []
+
+    for row in EntryScore.query:
+        counted = scores.pop(row.entry_id, empty)
+        stored = Score(row.total_points,
+                       {points: getattr(row, 'count_{}'.format(points)) for points in VOTE_POINTS})
+
+        if stored != counted:
+            problems.append("Entry {}: counters {} do not match recount {}.".format(
+                            row.entry_id, stored, counted))
+
+            if repair:
+                row.total_points = counted.total
+                for points, count in counted.counts.items():
+                    setattr(row, 'count_{}'.format(points), count)
+
+    for entry_id, counted in scores.items():
+        problems.append("Entry {}: counters missing, recount {}.".format(entry_id, counted))
+
+        if repair:
+            db.session.add(EntryScore(entry_id=entry_id, total_points=counted.total,
+                                      **{'count_{}'.format(points): count
+                                         for points, count in counted.counts.items()}))
+
+    stored_voters = get_counter(VOTERS)
+
+    if stored_voters != voters:
+        problems.append("Voter count {} does not match recount {}.".format(stored_voters, voters))
+
+        if repair:
+            increment_counter(VOTERS, voters - stored_voters)
+
+    if repair:
+        db.session.commit()
+
+    return problems
@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""Concurrent, resumable download of Archive.org item files.
+
+Files are downloaded in a bounded thread pool. At most ``max_per_host`` downloads run against
+the same host at once, and a host which fails or throttles requests (HTTP 429 or 5xx) is backed
+off from adaptively instead of pausing after every item.
+
+Files are downloaded to ``<name>.part`` first and only renamed to their final name, after their
+size and MD5 checksum were verified against the item's file meta data. Existing files, which
+already match, are skipped, and partial downloads are resumed with a HTTP range request.
+
+"""
+
+# Standard library modules
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from fnmatch import fnmatch
+from os.path import dirname, exists, getsize, join
+from urllib.parse import quote, urlparse
+
+# Third-party modules
+from internetarchive import get_session
+from requests import RequestException
+
+
+DOWNLOAD_URL = 'https://archive.org/download/{}/{}'
+DEFAULT_FORMATS = ('Flac', 'Metadata')
+CHUNK_SIZE = 64 * 1024
+
+FileTask = namedtuple('FileTask', 'track_id name url dest size md5')
+FileTask.__doc__ = """\
+A file of an Archive.org item to download to ``dest``.
+
+``size`` and ``md5`` are taken from the item meta data and may be ``None`` if unknown.
+
+"""
+
+
+class DownloadError(Exception):
+    """Raised when a file could not be downloaded (and retrying won't help)."""
+
+
+class HostThrottle:
+    """Limit concurrent requests per host and back off from hosts after failures.
+
+    After a failure, requests to the host are delayed by ``min_delay`` seconds (or the delay
+    requested by the server via a ``Retry-After`` header), doubling with each further failure
+    up to ``max_delay``. Each success halves the delay again.
+
+    """
+
+    def __init__(self, max_per_host=2, min_delay=1.0, max_delay=60.0):
+        self.max_per_host = max_per_host
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _get_host(self, host):
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = dict(semaphore=threading.BoundedSemaphore(self.max_per_host),
+                                         delay=0.0, not_before=0.0)
+            return self._hosts[host]
+
+    def delay(self, host):
+        """Return current backoff delay for given host in seconds."""
+        return self._get_host(host)['delay']
+
+    @contextmanager
+    def slot(self, host):
+        """Wait until a request to given host may be made and hold a slot for it in context."""
+        state = self._get_host(host)
+
+        with state['semaphore']:
+            wait = state['not_before'] - time.monotonic()
+
+            while wait > 0:
+                time.sleep(wait)
+                wait = state['not_before'] - time.monotonic()
+
+            yield
+
+    def success(self, host):
+        """Record successful request to given host."""
+        state = self._get_host(host)
+
+        with self._lock:
+            state['delay'] = state['delay'] / 2 if state['delay'] > self.min_delay else 0.0
+
+    def failure(self, host, retry_after=None):
+        """Record failed request to given host and back off from it."""
+        state = self._get_host(host)
+
+        with self._lock:
+            state['delay'] = min(self.max_delay, max(self.min_delay, state['delay'] * 2))
+            delay = max(state['delay'], retry_after or 0)
+            state['not_before'] = max(state['not_before'], time.monotonic() + delay)
+
+
+class DownloadProgress:
+    """Thread-safe download statistics, which reports progress via an ``echo`` function."""
+
+    def __init__(self, total, echo=None):
+        self.total = total
+        self.echo = echo or (lambda msg: None)
+        self.downloaded = self.skipped = self.failed = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self):
+        """Seconds since the download was started."""
+        return time.monotonic() - self.started
+
+    @property
+    def throughput(self):
+        """Aggregate download throughput in bytes per second."""
+        return self.bytes / max(self.elapsed, 1e-6)
+
+    def add_bytes(self, count):
+        """Count bytes received."""
+        with self._lock:
+            self.bytes += count
+
+    def _report(self, counter, task, msg):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            done = self.downloaded + self.skipped + self.failed
+            self.echo("[{}/{}] {}/{}: {} ({:.2f} MB/s overall)".format(
+                      done, self.total, task.track_id, task.name, msg,
+                      self.throughput / 1024 ** 2))
+
+    def file_downloaded(self, task):
+        """Report file as downloaded."""
+        self._report('downloaded', task, "downloaded")
+
+    def file_skipped(self, task):
+        """Report file as skipped, since it was already complete."""
+        self._report('skipped', task, "up to date, skipped")
+
+    def file_failed(self, task, error):
+        """Report file as failed."""
+        self._report('failed', task, "failed: {}".format(error))
+
+    def summary(self):
+        """Return summary of the download as a string."""
+        return ("{s.downloaded} files downloaded, {s.skipped} skipped, {s.failed} failed. "
+                "{mb:.1f} MB in {s.elapsed:.1f} seconds ({rate:.2f} MB/s).".format(
+                    s=self, mb=self.bytes / 1024 ** 2, rate=self.throughput / 1024 ** 2))
+
+
+def select_files(track_id, files, output_dir, formats=DEFAULT_FORMATS, glob=None):
+    """Return list of ``FileTask`` instances for item files with given formats.
+
+    ``files`` is the list of file meta data dicts of the item. If ``glob`` is given, only files
+    with names matching this pattern are selected. Formats are matched case-insensitively.
+
+    """
+    formats = {fmt.lower() for fmt in formats or ()}
+    tasks = []
+
+    for file in files:
+        name = file['name']
+
+        if formats and (file.get('format') or '').lower() not in formats:
+            continue
+
+        if glob and not fnmatch(name, glob):
+            continue
+
+        size = file.get('size')
+        tasks.append(FileTask(
+            track_id=track_id,
+            name=name,
+            url=DOWNLOAD_URL.format(track_id, quote(name)),
+            dest=join(output_dir, track_id, name),
+            size=int(size) if size not in (None, '') else None,
+            md5=file.get('md5')))
+
+    return tasks
+
+
+def file_md5(path):
+    """Return hex MD5 digest of file at given path."""
+    md5 = hashlib.md5()
+
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(CHUNK_SIZE), b''):
+            md5.update(chunk)
+
+    return md5.hexdigest()
+
+
+def is_complete(task, path=None):
+    """Return whether file for task at path (default: its destination) matches its meta data.
+
+    A file of unknown size (e.g. ``<item>_files.xml``) is complete, if it exists under its final
+    name and is not empty, since it is only renamed after it has been downloaded completely.
+
+    """
+    path = path or task.dest
+
+    if not exists(path):
+        return False
+
+    if task.size is None:
+        if path != task.dest or getsize(path) == 0:
+            return False
+    elif getsize(path) != task.size:
+        return False
+
+    return task.md5 is None or file_md5(path) == task.md5
+
+
+def local_status(task):
+    """Return 'complete', 'partial' or 'missing' for the local copy of the file for task."""
+    if is_complete(task):
+        return 'complete'
+
+    return 'partial' if exists(task.dest + '.part') else 'missing'
+
+
+def _retry_after(resp):
+    try:
+        return float(resp.headers.get('Retry-After', ''))
+    except ValueError:
+        return None
+
+
+def download_file(task, throttle, progress, retries=3, timeout=60, stop=None):
+    """Download file for task, resuming a partial download, and verify it.
+
+    Returns whether the file is complete afterwards.
+
+    """
+    if is_complete(task):
+        progress.file_skipped(task)
+        return True
+
+    part = task.dest + '.part'
+    host = urlparse(task.url).netloc
+    os.makedirs(dirname(task.dest), exist_ok=True)
+    error = None
+
+    for attempt in range(retries):
+        if stop is not None and stop.is_set():
+            error = "aborted"
+            break
+
+        offset = getsize(part) if exists(part) else 0
+
+        if task.size is not None and offset > task.size:
+            os.remove(part)
+            offset = 0
+
+        headers = {'Range': 'bytes={}-'.format(offset)} if offset else {}
+
+        try:
+            with throttle.slot(host):
+                resp = get_session().get(task.url, headers=headers, stream=True, timeout=timeout)
+
+                with closing(resp):
+                    if resp.status_code == 429 or resp.status_code >= 500:
+                        throttle.failure(host, _retry_after(resp))
+                        error = "HTTP error {}".format(resp.status_code)
+                        continue
+
+                    # 416: requested range starts at end of file, i.e. the part is complete
+                    if resp.status_code != 416:
+                        if resp.status_code >= 400:
+                            raise DownloadError("HTTP error {}".format(resp.status_code))
+
+                        with open(part, 'ab' if resp.status_code == 206 else 'wb') as fp:
+                            for chunk in resp.iter_content(CHUNK_SIZE):
+                                if stop is not None and stop.is_set():
+                                    raise DownloadError("aborted")
+
+                                fp.write(chunk)
+                                progress.add_bytes(len(chunk))
+        except DownloadError as exc:
+            error = str(exc)
+            break
+        except (RequestException, OSError) as exc:
+            throttle.failure(host)
+            error = str(exc) or exc.__class__.__name__
+            continue
+
+        throttle.success(host)
+
+        if task.size is None or is_complete(task, part):
+            os.replace(part, task.dest)
+            progress.file_downloaded(task)
+            return True
+
+        os.remove(part)
+        error = "size or checksum mismatch"
+
+    progress.file_failed(task, error)
+    return False
+
+
+def download_files(tasks, workers=4, max_per_host=2, retries=3, echo=None, throttle=None):
+    """Download files for list of ``FileTask`` instances concurrently.
+
+    Returns a ``DownloadProgress`` instance with the statistics of the download.
+
+    """
+    progress = DownloadProgress(len(tasks), echo)
+    throttle = throttle or HostThrottle(max_per_host)
+    stop = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='download')
+
+    try:
+        futures = [pool.submit(download_file, task, throttle, progress, retries, stop=stop)
+                   for task in tasks]
+
+        for future in futures:
+            future.result()
+    except BaseException:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+        raise
+    else:
+        pool.shutdown()
+
+    return progress
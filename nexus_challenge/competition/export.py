@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""Streaming export of competition data for analysis.
+
+Three datasets can be exported: ``entries``, ``ballots`` (with the voters replaced by a
+pseudonym) and ``scoreboard``, each in one of the formats ``csv``, ``jsonl`` (JSON Lines) and
+``parquet``. The latter needs the optional ``pyarrow`` package.
+
+Rows are read in batches with ``yield_per`` (and a server-side cursor where the database driver
+supports it) and the output is produced as an iterator of byte chunks, so memory use does not
+grow with the size of the export, whether it is written to a file (``flask compo export``) or
+streamed as an HTTP response.
+
+"""
+
+# Standard library modules
+import csv
+import datetime as dt
+import hashlib
+import hmac
+import io
+import json
+from collections import namedtuple
+
+# Third-party modules
+from flask import current_app
+from sqlalchemy.orm import aliased
+
+# Application specific modules
+from nexus_challenge.database import db
+from nexus_challenge.user.models import User
+
+from .models import CompetitionEntry, Vote
+from .scoreboard import VOTE_POINTS, get_scoreboard
+
+
+BATCH_SIZE = 1000
+
+#: column types: 'int', 'str', 'bool' or 'datetime'
+ExportColumn = namedtuple('ExportColumn', 'name type')
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+class ExportError(Exception):
+    """Raised when an export is not possible, e.g. because a dependency is missing."""
+
+
+def stream_query(query):
+    """Return iterator over rows of query, fetched in batches from a server-side cursor."""
+    return query.execution_options(stream_results=True).yield_per(BATCH_SIZE)
+
+
+def export_entries():
+    """Return columns and rows of all competition entries."""
+    columns = [ExportColumn('id', 'int'), ExportColumn('title', 'str'),
+               ExportColumn('artist', 'str'), ExportColumn('url', 'str'),
+               ExportColumn('username', 'str'), ExportColumn('is_published', 'bool'),
+               ExportColumn('is_approved', 'bool'), ExportColumn('created_on', 'datetime'),
+               ExportColumn('published_on', 'datetime')]
+    query = (
+        db.session.query(CompetitionEntry.id, CompetitionEntry.title, CompetitionEntry.artist,
+                         CompetitionEntry.url, User.username, CompetitionEntry.is_published,
+                         CompetitionEntry.is_approved, CompetitionEntry.created_on,
+                         CompetitionEntry.published_on)
+        .outerjoin(User, User.id == CompetitionEntry.user_id)
+        .order_by(CompetitionEntry.id)
+    )
+    return columns, stream_query(query)
+
+
+def voter_pseudonym(user_id):
+    """Return a stable pseudonym for user id, which can't be reversed without the secret key."""
+    if user_id is None:
+        return None
+
+    key = current_app.config['SECRET_KEY'].encode('utf-8')
+    return hmac.new(key, b'voter:%i' % user_id, hashlib.sha256).hexdigest()[:16]
+
+
+def export_ballots():
+    """Return columns and rows of all votes, with the voters replaced by pseudonyms."""
+    columns = [ExportColumn('voter', 'str'), ExportColumn('voter_is_entrant', 'bool'),
+               ExportColumn('entry_id', 'int'), ExportColumn('points', 'int'),
+               ExportColumn('created_on', 'datetime')]
+    entry = aliased(CompetitionEntry)
+    query = (
+        db.session.query(Vote.user_id, entry.id != None, Vote.entry_id,  # noqa:E711
+                         Vote.points, Vote.created_on)
+        .outerjoin(entry, db.and_(entry.user_id == Vote.user_id,
+                                  entry.is_approved == True))  # noqa:E712
+        .order_by(Vote.user_id, Vote.points.desc())
+    )
+    rows = ((voter_pseudonym(user_id), bool(is_entrant), entry_id, points, created_on)
+            for user_id, is_entrant, entry_id, points, created_on in stream_query(query))
+    return columns, rows
+
+
+def export_scoreboard():
+    """Return columns and rows of the scoreboard."""
+    columns = [ExportColumn('rank', 'int'), ExportColumn('entry_id', 'int'),
+               ExportColumn('title', 'str'), ExportColumn('artist', 'str'),
+               ExportColumn('username', 'str'), ExportColumn('points', 'int'),
+               *[ExportColumn('votes_{}'.format(points), 'int') for points in VOTE_POINTS]]
+    # one (already aggregated) row per entry
+    rows = ((row.rank, row.entry_id, row.title, row.artist, row.username, row.points,
+             *[row.counts[points] for points in VOTE_POINTS])
+            for row in get_scoreboard())
+    return columns, rows
+
+
+DATASETS = {
+    'entries': export_entries,
+    'ballots': export_ballots,
+    'scoreboard': export_scoreboard,
+}
+
+
+def batches(rows, size=None):
+    """Split iterable of rows into lists of at most ``size`` rows (default: ``BATCH_SIZE``)."""
+    size = size or BATCH_SIZE
+    batch = []
+
+    for row in rows:
+        batch.append(row)
+
+        if len(batch) >= size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def json_value(value):
+    return value.isoformat() if isinstance(value, (dt.date, dt.datetime)) else value
+
+
+def write_csv(columns, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([column.name for column in columns])
+
+    for batch in batches(rows):
+        writer.writerows(batch)
+        yield buf.getvalue().encode('utf-8')
+        buf.seek(0)
+        buf.truncate()
+
+    if buf.tell():
+        yield buf.getvalue().encode('utf-8')
+
+
+def write_jsonl(columns, rows):
+    names = [column.name for column in columns]
+
+    for batch in batches(rows):
+        lines = (json.dumps(dict(zip(names, map(json_value, row))), ensure_ascii=False)
+                 for row in batch)
+        yield ''.join(line + '\n' for line in lines).encode('utf-8')
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file object collecting the written bytes until they are taken."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def write_parquet(columns, rows):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError("Parquet export needs the 'pyarrow' package.")
+
+    types = {'int': pa.int64(), 'str': pa.string(), 'bool': pa.bool_(),
+             'datetime': pa.timestamp('us')}
+    schema = pa.schema([(column.name, types[column.type]) for column in columns])
+    sink = ChunkSink()
+
+    # one row group per batch
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in batches(rows):
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)],
+                schema=schema))
+            yield sink.take()
+
+    yield sink.take()
+
+
+WRITERS = {
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+    'parquet': write_parquet,
+}
+
+
+def export(dataset, fmt):
+    """Return iterator of byte chunks of dataset in given format.
+
+    Raises ``ExportError`` for an unknown dataset or format and, before the first chunk is
+    produced, when the format can't be written.
+
+    """
+    if dataset not in DATASETS:
+        raise ExportError("Unknown dataset: {}".format(dataset))
+
+    if fmt not in WRITERS:
+        raise ExportError("Unknown export format: {}".format(fmt))
+
+    chunks = WRITERS[fmt](*DATASETS[dataset]())
+    first = next(chunks, b'')
+
+    def generate():
+        yield first
+        yield from chunks
+
+    return generate()
+
+
+def export_filename(dataset, fmt):
+    """Return file name for download of dataset in given format."""
+    return 'nexus-challenge-{}.{}'.format(dataset, FORMATS[fmt][1])
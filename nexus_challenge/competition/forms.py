@@ -2,17 +2,13 @@
 """Competition blueprint forms."""
 
 # Third-party modules
-from flask import current_app
 from flask_login import current_user
 from flask_pagedown.fields import PageDownField
 from flask_wtf import FlaskForm
-from internetarchive import get_item
 from wtforms import SelectField, StringField
 from wtforms.validators import AnyOf, InputRequired, Length
 
 # Application specific modules
-from nexus_challenge.utils import canonify_track_url, format_duration
-
 from .models import CompetitionEntry
 
 
@@ -49,57 +45,6 @@ class SubmitCompetitionEntryForm(FlaskForm):
     def add_form_error(self, msg):
         self.errors.setdefault('form', []).append(msg)
 
-    def validate(self):
-        """Validate the form."""
-        initial_validation = super().validate()
-        if not initial_validation:
-            return False
-
-        url, track_id = canonify_track_url(self.url.data)
-
-        try:
-            item = get_item(track_id, request_kwargs={'timeout': 30})
-            metadata = item.item_metadata.get('metadata')
-            if not metadata:
-                raise ValueError("'%s' not found." % track_id)
-        except Exception as exc:
-            self.add_form_error("Could not get meta data from Archive.org: %s" % exc)
-        else:
-            if metadata.get('title', '').strip().lower() != self.title.data.strip().lower():
-                self.add_form_error("Title does not match title in Archive.org meta data.")
-
-            if metadata.get('creator', '').strip().lower() != self.artist.data.strip().lower():
-                self.add_form_error("Artist does not match creator / author "
-                                    "in Archive.org meta data.")
-
-            flac = None
-            for file in getattr(item, 'files', []):
-                if file.get('format') == 'Flac':
-                    flac = file
-                    break
-            else:
-                self.add_form_error("Track not available in FLAC format.")
-
-            if flac:
-                try:
-                    length = float(flac.get('length', 0))
-                except (TypeError, ValueError):
-                    length = 0
-
-                min_length = current_app.config.get('MIN_TRACK_LENGTH', 60.0)
-                max_length = current_app.config.get('MAX_TRACK_LENGTH', 300.0)
-
-                if length < min_length:
-                    self.add_form_error("Track does not have minimum required duration (%s min.)."
-                                        % format_duration(min_length))
-                elif length > max_length:
-                    self.add_form_error("Track exceeds maximum allowed duration (%s min.)." %
-                                        format_duration(max_length))
-            else:
-                self.add_form_error("Missing meta data for FLAC download of track.")
-
-        return not self.errors.get('form')
-
 
 vote_validators = [InputRequired(), AnyOf([-1], message="You must select an entry.")]
 
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""Cached page fragments for the public competition entry lists.
+
+The list of approved entries (with the data needed to sort it) and the rendered HTML block of
+each entry are kept in the Flask-Caching cache, so that the entry list pages do not need to
+query and render every entry for every visitor. Views which change entries must call
+``invalidate_entry``.
+
+When a cached value is missing, only one caller (per cache backend) rebuilds it, while others
+wait briefly for the result (see ``get_or_build``), so a cold cache under load does not cause a
+burst of identical queries.
+
+With more than one worker process, a cache backend shared by all processes (e.g. 'redis' or
+'filesystem') must be configured, so that invalidation reaches all of them.
+
+"""
+
+# Standard library modules
+import time
+from collections import namedtuple
+
+# Third-party modules
+from flask import current_app, render_template
+from flask_caching.backends import NullCache, SimpleCache
+
+# Application specific modules
+from nexus_challenge.database import db
+from nexus_challenge.extensions import cache, metrics
+from nexus_challenge.metrics import CACHE_REQUESTS
+from nexus_challenge.utils import archiveorg_player
+
+from .archiveorg import get_track_lengths
+from .models import CompetitionEntry
+
+
+APPROVED_ENTRIES_KEY = 'competition/approved_entries'
+ENTRY_BLOCK_KEY = 'competition/entry_block/{}'
+VOTE_CHOICES_KEY = 'competition/vote_choices'
+
+EntrySortKey = namedtuple('EntrySortKey', 'id title artist published_on')
+
+
+def get_timeout():
+    return current_app.config.get('FRAGMENT_CACHE_TIMEOUT', 3600)
+
+
+def cache_is_shared():
+    """Return whether the cache backend can be shared with other processes."""
+    return not isinstance(cache.cache, (NullCache, SimpleCache))
+
+
+def get_or_build(key, build, timeout=None, lock_timeout=30, wait=5.0):
+    """Return value for key from the cache, calling build to create and cache it, if missing.
+
+    While one caller builds the value, other callers wait up to ``wait`` seconds for it to
+    appear in the cache, before building it themselves.
+
+    """
+    value = cache.get(key)
+    metrics.inc(CACHE_REQUESTS, key=key, result='miss' if value is None else 'hit')
+
+    if value is not None:
+        return value
+
+    lock_key = key + '/lock'
+
+    if cache.add(lock_key, True, timeout=lock_timeout):
+        try:
+            value = build()
+            cache.set(key, value, timeout=timeout or get_timeout())
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + wait
+
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        value = cache.get(key)
+
+        if value is not None:
+            return value
+
+    return build()
+
+
+def get_approved_entries():
+    """Return list of ``EntrySortKey`` tuples for all approved entries."""
+    def build():
+        query = (
+            db.session.query(CompetitionEntry.id, CompetitionEntry.title,
+                             CompetitionEntry.artist, CompetitionEntry.published_on)
+            .filter(CompetitionEntry.is_approved == True)  # noqa:E712
+            .order_by(CompetitionEntry.id)
+        )
+        return [EntrySortKey(*row) for row in query]
+
+    return get_or_build(APPROVED_ENTRIES_KEY, build)
+
+
+def render_entry_blocks(entries):
+    """Render HTML block of each entry in list of entries."""
+    entries = list(entries)
+    # shown by the placeholders of the players
+    lengths = get_track_lengths([entry.url for entry in entries])
+    return [render_template('competition/entry_block.html', entry=entry,
+                            archiveorg_player=archiveorg_player,
+                            track_length=lengths.get(entry.url))
+            for entry in entries]
+
+
+def get_entry_blocks(entry_ids, load_entries, lock_timeout=30, wait=5.0):
+    """Return list of rendered HTML blocks for entries with given ids, using cached blocks.
+
+    ``load_entries`` is called with the list of the ids of the entries, whose blocks are not
+    cached, and must return an iterable of these entries.
+
+    Missing blocks are locked per entry, so concurrent requests (which show different pages and
+    orders) render the blocks no other request is rendering right away, and only wait up to
+    ``wait`` seconds for the others.
+
+    """
+    keys = [ENTRY_BLOCK_KEY.format(entry_id) for entry_id in entry_ids]
+    blocks = dict(zip(entry_ids, cache.get_many(*keys))) if keys else {}
+    missing = [entry_id for entry_id, block in blocks.items() if block is None]
+    metrics.inc(CACHE_REQUESTS, len(blocks) - len(missing), key=ENTRY_BLOCK_KEY.format('*'),
+                result='hit')
+    metrics.inc(CACHE_REQUESTS, len(missing), key=ENTRY_BLOCK_KEY.format('*'), result='miss')
+
+    if not missing:
+        return [blocks[entry_id] for entry_id in entry_ids]
+
+    def render(ids):
+        entries = list(load_entries(ids))
+        rendered = dict(zip([entry.id for entry in entries], render_entry_blocks(entries)))
+        cache.set_many({ENTRY_BLOCK_KEY.format(id_): block for id_, block in rendered.items()},
+                       timeout=get_timeout())
+        blocks.update(rendered)
+
+    lock_keys = {id_: ENTRY_BLOCK_KEY.format(id_) + '/lock' for id_ in missing}
+    claimed = [id_ for id_ in missing if cache.add(lock_keys[id_], True, timeout=lock_timeout)]
+
+    try:
+        if claimed:
+            render(claimed)
+    finally:
+        cache.delete_many(*[lock_keys[id_] for id_ in claimed])
+
+    # blocks being rendered by other requests: give them a moment to finish
+    claimed = set(claimed)
+    pending = [id_ for id_ in missing if id_ not in claimed]
+    deadline = time.monotonic() + wait
+
+    while pending and time.monotonic() < deadline:
+        time.sleep(0.05)
+        cached = cache.get_many(*[ENTRY_BLOCK_KEY.format(id_) for id_ in pending])
+        blocks.update((id_, block) for id_, block in zip(pending, cached) if block is not None)
+        pending = [id_ for id_ in pending if blocks[id_] is None]
+
+    if pending:
+        render(pending)
+
+    return [blocks[entry_id] for entry_id in entry_ids if blocks.get(entry_id) is not None]
+
+
+def invalidate_entry(entry_id):
+    """Remove cached fragments, which depend on the entry with given id."""
+    cache.delete_many(APPROVED_ENTRIES_KEY, VOTE_CHOICES_KEY, ENTRY_BLOCK_KEY.format(entry_id))
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""Static copies of the public competition pages.
+
+After the voting period, the entry list, voting and entry pages, the results and the
+statistics no longer change. ``freeze`` renders them (as seen by an anonymous visitor,
+archive.org players included) in a thread pool into a directory, from which nginx serves them
+without involving the application (see ``deployment/nexus-challenge-webapp-nginx.conf``).
+
+A page is written to ``<path>/index.html`` or, for the sorted variants and further pages of the
+entry lists, to ``<path>/index-<query string>.html``, e.g.
+``list/index-order=title&desc=0.html``, other
+resources (the voting trend data) to their path. The pages are rendered into a new directory
+next to the output directory, which replaces it only when all pages were rendered
+successfully.
+
+Pages with forms (e.g. the login form on the home page) are not frozen, since their CSRF tokens
+would be shared by all visitors.
+
+"""
+
+# Standard library modules
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+# Third-party modules
+from flask import current_app, url_for
+
+# Application specific modules
+from .fragments import get_approved_entries
+from .listing import ORDERS, SHUFFLE_SEED_KEY, iter_page_cursors, listing_url
+
+
+#: seed of the random order of the frozen entry lists, which all visitors see
+SHUFFLE_SEED = 0
+
+FrozenPage = namedtuple('FrozenPage', 'url filename size')
+
+
+class FreezeError(Exception):
+    """Raised when public pages could not be frozen."""
+
+
+def public_urls():
+    """Return URLs of all public competition pages (needs a request context)."""
+    urls = [url_for('competition.results'), url_for('competition.stats')]
+    end_date = current_app.config.get('VOTING_PERIOD_END')
+
+    if end_date is None or datetime.utcnow() >= end_date:
+        # published after the voting period
+        urls.append(url_for('competition.results_trend'))
+
+    for endpoint in ('competition.list_entries', 'competition.vote'):
+        # all pages in random order and the orders of the sort links
+        for order, desc in [(None, False)] + [(order, desc) for order in ORDERS
+                                              for desc in (False, True)]:
+            urls.extend(listing_url(endpoint, order, desc, cursor)
+                        for cursor in iter_page_cursors(order, desc, SHUFFLE_SEED))
+
+    urls.extend(url_for('competition.view_entry', entry=entry.id)
+                for entry in get_approved_entries())
+    return urls
+
+
+def frozen_filename(url):
+    """Return file name relative to the output directory for page with given URL."""
+    parts = urlsplit(url)
+    path = parts.path.strip('/')
+
+    if os.path.splitext(path)[1]:
+        return path
+
+    return os.path.join(path, 'index{}.html'.format('-' + parts.query if parts.query else ''))
+
+
+def render_page(client, url, output_dir):
+    """Request page with given URL and write it to its file in the output directory."""
+    response = client.get(url)
+
+    if response.status_code != 200:
+        raise FreezeError("{} returned status {}.".format(url, response.status_code))
+
+    filename = frozen_filename(url)
+    path = os.path.join(output_dir, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = response.get_data()
+
+    with open(path, 'wb') as fp:
+        fp.write(data)
+
+    return FrozenPage(url, filename, len(data))
+
+
+def freeze(output_dir, workers=4):
+    """Render all public competition pages into the output directory.
+
+    Returns a list of ``FrozenPage`` tuples. Raises ``FreezeError``, if a page could not be
+    rendered, leaving the output directory unchanged.
+
+    """
+    app = current_app._get_current_object()
+
+    with app.test_request_context():
+        urls = public_urls()
+
+    output_dir = os.path.abspath(output_dir)
+    parent = os.path.dirname(output_dir)
+    os.makedirs(parent, exist_ok=True)
+    new_dir = tempfile.mkdtemp(dir=parent, prefix='.freeze-')
+    # the session only has the seed of the random order, so all pages are rendered for an
+    # anonymous visitor
+    client = app.test_client()
+
+    with client.session_transaction() as session:
+        session[SHUFFLE_SEED_KEY] = SHUFFLE_SEED
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pages = list(pool.map(lambda url: render_page(client, url, new_dir), urls))
+
+        os.chmod(new_dir, 0o755)
+
+        if os.path.exists(output_dir):
+            old_dir = tempfile.mkdtemp(dir=parent, prefix='.frozen-')
+            os.rename(output_dir, os.path.join(old_dir, 'pages'))
+            os.rename(new_dir, output_dir)
+            shutil.rmtree(old_dir)
+        else:
+            os.rename(new_dir, output_dir)
+    finally:
+        shutil.rmtree(new_dir, ignore_errors=True)
+
+    return pages
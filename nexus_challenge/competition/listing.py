@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""Paginated competition entry lists.
+
+The entry lists (``/list/`` and ``/vote/``) show ``ENTRIES_PER_PAGE`` entries per page, sorted
+by title, artist or publication date or, by default, in random order. All orders are applied
+by the database and pages are selected with keyset pagination: the ``after`` cursor of a page
+encodes the sort key and id of the last entry of the page before it, so a page is found with an
+index lookup instead of reading and skipping all entries before it.
+
+The random order is a permutation of the entry ids, which is seeded from a number stored in the
+visitor's session, so each visitor sees a different order, which stays the same from page to
+page (and for entries added later, only these are inserted into it).
+
+"""
+
+# Standard library modules
+import base64
+import json
+import random
+from collections import namedtuple
+from datetime import datetime
+
+# Third-party modules
+from flask import current_app, session, url_for
+from sqlalchemy import BigInteger, and_, func, literal, or_
+
+# Application specific modules
+from nexus_challenge.database import db
+
+from .models import CompetitionEntry
+
+
+#: sort orders besides the default random order
+ORDERS = ('artist', 'published_on', 'title')
+#: session key of the seed of the random order
+SHUFFLE_SEED_KEY = 'entry_order_seed'
+# prime modulus of the random order permutation, larger than any entry id
+SHUFFLE_MODULUS = 2147483647
+
+EntryPage = namedtuple('EntryPage', 'entry_ids order desc has_prev prev_cursor next_cursor')
+EntryPage.__doc__ = """\
+The ids of the entries of a page of an entry list.
+
+``prev_cursor`` is the ``after`` cursor of the previous page, which is ``None`` for the first
+page (see ``has_prev``), ``next_cursor`` the one of the next page or ``None`` for the last page.
+
+"""
+
+
+class InvalidCursor(ValueError):
+    """Raised when a page cursor can't be decoded."""
+
+
+def get_shuffle_seed():
+    """Return the seed of the random entry order of the visitor, creating it on first use."""
+    seed = session.get(SHUFFLE_SEED_KEY)
+
+    if not isinstance(seed, int):
+        seed = session[SHUFFLE_SEED_KEY] = random.randrange(SHUFFLE_MODULUS)
+
+    return seed
+
+
+def sort_key(order, seed=0):
+    """Return SQL expression by which (and then by id) entries are sorted in given order."""
+    if order == 'published_on':
+        # entries published before publication dates were recorded come first
+        return func.coalesce(CompetitionEntry.published_on, datetime(1970, 1, 1))
+    elif order in ORDERS:
+        return getattr(CompetitionEntry, order)
+
+    # a permutation of the ids: id * a + b modulo a prime
+    rng = random.Random(seed)
+    factor = rng.randrange(1, SHUFFLE_MODULUS)
+    offset = rng.randrange(SHUFFLE_MODULUS)
+    return (CompetitionEntry.id * literal(factor, BigInteger) + offset) % SHUFFLE_MODULUS
+
+
+def encode_cursor(key, entry_id):
+    """Return URL-safe cursor for the position after entry with given sort key and id."""
+    if isinstance(key, datetime):
+        key = key.isoformat()
+
+    data = json.dumps([key, entry_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, order):
+    """Return sort key and entry id encoded in cursor for given order."""
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key, entry_id = json.loads(data.decode('utf-8'))
+
+        if order == 'published_on':
+            key = datetime.fromisoformat(key)
+        elif order in ORDERS:
+            key = str(key)
+        else:
+            key = int(key)
+
+        return key, int(entry_id)
+    except (TypeError, ValueError) as exc:
+        raise InvalidCursor("Invalid page cursor: {!r}".format(cursor)) from exc
+
+
+def keyset_query(key, desc=False, after=None, approved_only=True):
+    """Return query of ``(sort key, id)`` rows of the entries in order, starting after cursor.
+
+    ``after`` is a decoded cursor. With ``desc``, the order (including that of the ids of
+    entries with the same sort key) is reversed.
+
+    """
+    query = db.session.query(key.label('sort_key'), CompetitionEntry.id)
+
+    if approved_only:
+        query = query.filter(CompetitionEntry.is_approved == True)  # noqa:E712
+
+    if after is not None:
+        after_key, after_id = after
+
+        if desc:
+            query = query.filter(or_(key < after_key,
+                                     and_(key == after_key, CompetitionEntry.id < after_id)))
+        else:
+            query = query.filter(or_(key > after_key,
+                                     and_(key == after_key, CompetitionEntry.id > after_id)))
+
+    if desc:
+        return query.order_by(key.desc(), CompetitionEntry.id.desc())
+
+    return query.order_by(key, CompetitionEntry.id)
+
+
+def get_entry_page(order=None, desc=False, after=None, per_page=None, approved_only=True):
+    """Return ``EntryPage`` of the entry list in given order after the given cursor.
+
+    Orders other than those in ``ORDERS`` are the random order of the visitor. Raises
+    ``InvalidCursor``, if the cursor is invalid.
+
+    """
+    per_page = per_page or current_app.config.get('ENTRIES_PER_PAGE', 20)
+    order = order if order in ORDERS else None
+    desc = bool(desc and order)
+    key = sort_key(order, None if order else get_shuffle_seed())
+    start = decode_cursor(after, order) if after else None
+    rows = keyset_query(key, desc, start, approved_only).limit(per_page + 1).all()
+    next_cursor = encode_cursor(*rows[per_page - 1]) if len(rows) > per_page else None
+    prev_cursor = None
+
+    if start is not None:
+        # the cursor is the last entry of the previous page, the entry before the other
+        # entries of the previous page is the cursor of that page
+        before = keyset_query(key, not desc, start, approved_only).limit(per_page).all()
+
+        if len(before) == per_page:
+            prev_cursor = encode_cursor(*before[-1])
+
+    return EntryPage([row.id for row in rows[:per_page]], order, desc,
+                     start is not None, prev_cursor, next_cursor)
+
+
+def iter_page_cursors(order=None, desc=False, seed=0, per_page=None):
+    """Yield the ``after`` cursors of all pages of the approved entry list in given order.
+
+    The first page has no cursor (``None``). The random order uses the given seed.
+
+    """
+    per_page = per_page or current_app.config.get('ENTRIES_PER_PAGE', 20)
+    order = order if order in ORDERS else None
+    rows = keyset_query(sort_key(order, seed), bool(desc and order)).all()
+    yield None
+
+    for index in range(per_page, len(rows), per_page):
+        yield encode_cursor(*rows[index - 1])
+
+
+def listing_url(endpoint, order=None, desc=False, after=None):
+    """Return URL of page of entry list view with given order, starting after cursor."""
+    if order not in ORDERS:
+        return url_for(endpoint, after=after)
+
+    return url_for(endpoint, order=order, desc=1 if desc else 0, after=after)
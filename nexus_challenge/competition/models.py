@@ -3,30 +3,73 @@
 
 # Standard library modules
 import datetime as dt
+import json
+
+# Third-party modules
+from sqlalchemy.orm import validates
 
 # Application specific modules
 from nexus_challenge.database import Column, Model, SurrogatePK, db, reference_col, relationship
+from nexus_challenge.utils import render_markdown
 
 
 class CompetitionEntry(SurrogatePK, Model):
     """An entry submitted into the competition."""
 
     __tablename__ = 'competition_entries'
-    title = Column(db.String(100), nullable=False)
-    artist = Column(db.String(100), nullable=False)
+    # indexed for the sorted entry lists
+    title = Column(db.String(100), nullable=False, index=True)
+    artist = Column(db.String(100), nullable=False, index=True)
     url = Column(db.String(255), nullable=False)
     description = Column(db.String(1000))
+    description_html = Column(db.Text)
     production_details = Column(db.String(1000))
+    production_details_html = Column(db.Text)
 
     is_published = db.Column(db.Boolean, nullable=False, default=False)
-    is_approved = db.Column(db.Boolean, nullable=False, default=False)
+    is_approved = db.Column(db.Boolean, nullable=False, default=False, index=True)
     created_on = Column(db.DateTime, nullable=False, default=dt.datetime.utcnow)
     last_modified_on = Column(db.DateTime, nullable=False)
-    published_on = Column(db.DateTime)
+    published_on = Column(db.DateTime, index=True)
+
+    # result of Archive.org meta data check (NULL for entries created before checks were async)
+    check_status = Column(db.String(20))
+    check_errors = Column(db.Text)
+    checked_on = Column(db.DateTime)
 
-    user_id = reference_col('users', nullable=True)
+    user_id = reference_col('users', nullable=True, index=True)
     user = relationship('User', backref='competition_entries')
 
+    CHECK_PENDING = 'pending'
+    CHECK_PASSED = 'passed'
+    CHECK_FAILED = 'failed'
+    CHECK_ERROR = 'error'
+
+    #: Markdown text fields, which have a pre-rendered HTML column named '<field>_html'
+    markdown_fields = ('description', 'production_details')
+
+    @validates(*markdown_fields)
+    def _validate_markdown_field(self, key, value):
+        """Re-render the HTML of a Markdown text field when its text changes."""
+        if value != getattr(self, key) or getattr(self, key + '_html') is None:
+            setattr(self, key + '_html', render_markdown(value))
+        return value
+
+    @property
+    def check_passed(self):
+        """Whether the Archive.org meta data check passed (or predates async checks)."""
+        return self.check_status in (None, self.CHECK_PASSED)
+
+    @property
+    def check_error_list(self):
+        """Error messages of the Archive.org meta data check as a list."""
+        return self.check_errors.splitlines() if self.check_errors else []
+
+    def render_html(self):
+        """Re-render the HTML of all Markdown text fields unconditionally."""
+        for field in self.markdown_fields:
+            setattr(self, field + '_html', render_markdown(getattr(self, field)))
+
     def __repr__(self):
         """Represent instance as a unique string."""
         return '<CompetitionEntry({artist} - {title})>'.format(artist=self.artist, title=self.title)
@@ -36,11 +79,16 @@ class Vote(SurrogatePK, Model):
     """A vote for an entry submitted into the competition."""
 
     __tablename__ = 'competition_votes'
-    entry_id = reference_col('competition_entries', nullable=True)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'points', name='uq_competition_votes_user_id_points'),
+        {'extend_existing': True},
+    )
+    entry_id = reference_col('competition_entries', nullable=True, index=True)
     entry = relationship('CompetitionEntry', backref='votes')
     points = Column(db.Integer, nullable=False, default=0)
+    # updated when the vote is changed to another entry
     created_on = Column(db.DateTime, nullable=False, default=dt.datetime.utcnow)
-    user_id = reference_col('users', nullable=True)
+    user_id = reference_col('users', nullable=True, index=True)
     user = relationship('User', backref='votes')
 
     def __repr__(self):
@@ -51,3 +99,128 @@ class Vote(SurrogatePK, Model):
             title=self.entry.title,
             points=self.points
         )
+
+
+class EntryScore(SurrogatePK, Model):
+    """Running vote totals of a competition entry.
+
+    These are updated by delta together with each ballot change (see ``counters`` module) and
+    can be checked against the votes with ``flask compo reconcile-counters``.
+
+    """
+
+    __tablename__ = 'competition_entry_scores'
+    entry_id = reference_col('competition_entries', unique=True)
+    total_points = Column(db.Integer, nullable=False, default=0)
+    count_5 = Column(db.Integer, nullable=False, default=0)
+    count_4 = Column(db.Integer, nullable=False, default=0)
+    count_3 = Column(db.Integer, nullable=False, default=0)
+    count_2 = Column(db.Integer, nullable=False, default=0)
+    count_1 = Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        """Represent instance as a unique string."""
+        return '<EntryScore({entry_id}: {points})>'.format(entry_id=self.entry_id,
+                                                          points=self.total_points)
+
+
+class Counter(SurrogatePK, Model):
+    """A named global counter, e.g. the number of users who voted."""
+
+    __tablename__ = 'competition_counters'
+    name = Column(db.String(50), unique=True, nullable=False)
+    value = Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        """Represent instance as a unique string."""
+        return '<Counter({name}: {value})>'.format(name=self.name, value=self.value)
+
+
+class VoteEvent(SurrogatePK, Model):
+    """A change of a ballot: a vote with given points added to (+1) or removed from (-1) an entry.
+
+    Events are only ever appended (in the same transaction as the ballot change, see ``voting``
+    module) and replayed to get the standings at any point in time (see ``trend`` module).
+
+    """
+
+    __tablename__ = 'competition_vote_events'
+    entry_id = Column(db.Integer, nullable=False)
+    user_id = Column(db.Integer, nullable=True)
+    points = Column(db.Integer, nullable=False)
+    delta = Column(db.Integer, nullable=False)
+    created_on = Column(db.DateTime, nullable=False, default=dt.datetime.utcnow, index=True)
+
+    def __repr__(self):
+        """Represent instance as a unique string."""
+        return '<VoteEvent(user: {user}, entry: {entry}, points: {points:+d})>'.format(
+            user=self.user_id, entry=self.entry_id, points=self.points * self.delta)
+
+
+class StandingsSnapshot(SurrogatePK, Model):
+    """Total points of all entries at the end of a time bucket of the voting trend.
+
+    ``totals_json`` holds the replayed totals of all vote events created before ``bucket_end``.
+
+    """
+
+    __tablename__ = 'competition_standings_snapshots'
+    __table_args__ = (
+        db.UniqueConstraint('bucket_seconds', 'bucket_end',
+                            name='uq_competition_standings_snapshots_bucket'),
+        {'extend_existing': True},
+    )
+    bucket_seconds = Column(db.Integer, nullable=False)
+    bucket_end = Column(db.DateTime, nullable=False)
+    totals_json = Column(db.Text, nullable=False)
+
+    @property
+    def totals(self):
+        """Dict mapping entry ids to total points."""
+        return {int(entry_id): points for entry_id, points in json.loads(self.totals_json).items()}
+
+    @totals.setter
+    def totals(self, value):
+        self.totals_json = json.dumps(value, sort_keys=True)
+
+    def __repr__(self):
+        """Represent instance as a unique string."""
+        return '<StandingsSnapshot({end} / {seconds}s)>'.format(end=self.bucket_end,
+                                                               seconds=self.bucket_seconds)
+
+
+class ArchiveItem(SurrogatePK, Model):
+    """Cached meta data of an Archive.org item."""
+
+    __tablename__ = 'archiveorg_items'
+    track_id = Column(db.String(255), unique=True, nullable=False)
+    title = Column(db.String(255))
+    creator = Column(db.String(255))
+    flac_name = Column(db.String(255))
+    flac_length = Column(db.Float)
+    files_json = Column(db.Text)
+    etag = Column(db.String(255))
+    last_fetched_on = Column(db.DateTime, nullable=False, default=dt.datetime.utcnow)
+
+    @property
+    def files(self):
+        """List of file meta data dicts (name, format, size, md5, length) of this item."""
+        return json.loads(self.files_json) if self.files_json else []
+
+    @files.setter
+    def files(self, value):
+        self.files_json = json.dumps(value)
+
+    @property
+    def has_flac(self):
+        """Whether this item has a file in FLAC format."""
+        return self.flac_name is not None
+
+    def is_stale(self, max_age, now=None):
+        """Whether the cached meta data is older than max_age seconds."""
+        now = now or dt.datetime.utcnow()
+        return (now - self.last_fetched_on).total_seconds() > max_age
+
+    def __repr__(self):
+        """Represent instance as a unique string."""
+        return '<ArchiveItem({track_id})>'.format(track_id=self.track_id)
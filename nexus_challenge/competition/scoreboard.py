@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Competition scoreboard calculation.
+
+The scoreboard is computed by the database in a single grouped query over the approved
+competition entries and their votes, instead of loading every vote as an ORM object.
+
+Entries are ranked by their total points. Ties are broken according to rule D.2: the entry
+with more five point votes ranks higher, then the one with more four point votes, and so on.
+Entries which are still tied after that share the same rank.
+
+Live standings during the voting period are read from the running vote counters instead (see
+``get_standings``), which costs one row per entry instead of aggregating all votes.
+
+"""
+
+# Standard library modules
+from collections import namedtuple
+
+# Third-party modules
+from sqlalchemy import case, func
+
+# Application specific modules
+from nexus_challenge.database import db
+from nexus_challenge.user.models import User
+
+from .forms import VotingForm
+from .models import CompetitionEntry, EntryScore, Vote
+
+
+#: Possible points of a single vote, highest first
+VOTE_POINTS = tuple(sorted(VotingForm.points_to_fields, reverse=True))
+
+ScoreboardRow = namedtuple('ScoreboardRow',
+                           'rank entry_id title artist username points counts')
+ScoreboardRow.__doc__ = """\
+One line of the scoreboard.
+
+``counts`` maps each value in ``VOTE_POINTS`` to the number of votes with that many points
+the entry received.
+
+"""
+
+
+def scoreboard_query():
+    """Return query yielding one row of aggregated scores per approved competition entry.
+
+    Each row has the columns ``id``, ``title``, ``artist``, ``username``, ``points`` and one
+    ``points_<n>`` column per possible vote value. Rows are ordered by rank.
+
+    """
+    total = func.coalesce(func.sum(Vote.points), 0).label('points')
+    buckets = [
+        func.sum(case([(Vote.points == points, 1)], else_=0)).label('points_%i' % points)
+        for points in VOTE_POINTS
+    ]
+    query = (
+        db.session.query(CompetitionEntry.id, CompetitionEntry.title, CompetitionEntry.artist,
+                         User.username, total, *buckets)
+        .outerjoin(User, User.id == CompetitionEntry.user_id)
+        .outerjoin(Vote, Vote.entry_id == CompetitionEntry.id)
+        .filter(CompetitionEntry.is_approved == True)  # noqa:E712
+        .group_by(CompetitionEntry.id, CompetitionEntry.title, CompetitionEntry.artist,
+                  User.username)
+    )
+    return query.order_by(total.desc(), *[bucket.desc() for bucket in buckets],
+                          CompetitionEntry.title)
+
+
+def standings_query():
+    """Return query like ``scoreboard_query``, but reading the running vote counters."""
+    total = func.coalesce(EntryScore.total_points, 0).label('points')
+    buckets = [
+        func.coalesce(getattr(EntryScore, 'count_%i' % points), 0).label('points_%i' % points)
+        for points in VOTE_POINTS
+    ]
+    query = (
+        db.session.query(CompetitionEntry.id, CompetitionEntry.title, CompetitionEntry.artist,
+                         User.username, total, *buckets)
+        .outerjoin(User, User.id == CompetitionEntry.user_id)
+        .outerjoin(EntryScore, EntryScore.entry_id == CompetitionEntry.id)
+        .filter(CompetitionEntry.is_approved == True)  # noqa:E712
+    )
+    return query.order_by(total.desc(), *[bucket.desc() for bucket in buckets],
+                          CompetitionEntry.title)
+
+
+def get_scoreboard():
+    """Return list of ``ScoreboardRow`` instances for all approved entries, ordered by rank."""
+    return list(rank_rows(scoreboard_query()))
+
+
+def get_standings():
+    """Return current standings from the vote counters as a list of ``ScoreboardRow``."""
+    return list(rank_rows(standings_query()))
+
+
+def rank_rows(rows):
+    """Assign ranks to aggregated scoreboard rows, which must already be ordered by rank."""
+    rank = 0
+    last_key = None
+
+    for pos, row in enumerate(rows, 1):
+        counts = {points: int(getattr(row, 'points_%i' % points) or 0) for points in VOTE_POINTS}
+        key = (int(row.points),) + tuple(counts[points] for points in VOTE_POINTS)
+
+        if key != last_key:
+            rank = pos
+            last_key = key
+
+        yield ScoreboardRow(rank, row.id, row.title, row.artist, row.username, key[0], counts)
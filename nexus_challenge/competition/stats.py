@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Competition statistics.
+
+The statistics are computed by a fixed set of four aggregate queries (users, entries, votes per
+day and voters), independent of the number of rows in the tables, and cached for
+``STATS_CACHE_TIMEOUT`` seconds. ``flask compo refresh-stats`` recomputes them, e.g. from a cron
+job running more often than the timeout, so visitors never wait for the queries. This needs a
+cache backend shared with the web application (see ``CACHE_TYPE``), so the command refuses to
+run with a process-local cache, which the deployment does not use (see
+``deployment/nexus-challenge-webapp-prod.env``).
+
+"""
+
+# Standard library modules
+import datetime as dt
+from collections import namedtuple
+
+# Third-party modules
+from flask import current_app
+from sqlalchemy import and_, case, distinct, func
+
+# Application specific modules
+from nexus_challenge.database import db
+from nexus_challenge.extensions import cache
+from nexus_challenge.user.models import User
+
+from .fragments import get_or_build
+from .models import CompetitionEntry, Vote
+
+
+STATS_KEY = 'competition/stats'
+
+FunnelStep = namedtuple('FunnelStep', 'label count percent')
+DayVotes = namedtuple('DayVotes', 'day votes voters')
+
+
+class Statistics(namedtuple('Statistics', 'registered confirmed drafts published approved '
+                                          'entrants voters entrants_voted votes_per_day '
+                                          'updated_on')):
+    """Competition statistics.
+
+    ``published`` counts published entries, which are not approved yet. ``entrants`` is the
+    number of users with an approved entry, ``entrants_voted`` the number of those who voted.
+    ``votes_per_day`` is a list of ``DayVotes`` tuples. It reflects the current ballots, not the
+    voting activity: ``save_ballot`` moves ``Vote.created_on`` forward when a vote is changed,
+    so a changed vote is counted on the day of its last change only (``VoteEvent`` keeps the
+    full history).
+
+    """
+
+    __slots__ = ()
+
+    @property
+    def funnel(self):
+        """List of ``FunnelStep`` tuples from registration to voting."""
+        steps = [("Registered", self.registered), ("Confirmed", self.confirmed),
+                 ("Voted", self.voters)]
+        return [FunnelStep(label, count, 100.0 * count / self.registered if self.registered else 0)
+                for label, count in steps]
+
+
+def count_if(condition, value=1):
+    return func.sum(case([(condition, value)], else_=0))
+
+
+def compute_stats():
+    """Query the competition statistics and return them as a ``Statistics`` tuple."""
+    registered, confirmed = db.session.query(
+        func.count(User.id), count_if(User.is_confirmed == True)  # noqa:E712
+    ).one()
+
+    drafts, published, approved, entrants = db.session.query(
+        count_if(CompetitionEntry.is_published == False),  # noqa:E712
+        count_if(and_(CompetitionEntry.is_published == True,  # noqa:E712
+                      CompetitionEntry.is_approved == False)),  # noqa:E712
+        count_if(CompetitionEntry.is_approved == True),  # noqa:E712
+        func.count(distinct(case([(CompetitionEntry.is_approved == True,  # noqa:E712
+                                   CompetitionEntry.user_id)])))
+    ).one()
+
+    # current votes by the day they were cast or last changed, see Statistics
+    day = func.date(Vote.created_on)
+    votes_per_day = [
+        # SQLite returns the dates as strings
+        DayVotes(value if isinstance(value, dt.date) else dt.date.fromisoformat(value),
+                 votes, voters)
+        for value, votes, voters in
+        db.session.query(day, func.count(Vote.id), func.count(distinct(Vote.user_id)))
+        .group_by(day)
+        .order_by(day)
+    ]
+
+    voters, entrants_voted = (
+        db.session.query(
+            func.count(distinct(Vote.user_id)),
+            func.count(distinct(case([(CompetitionEntry.id != None, Vote.user_id)])))  # noqa:E711
+        )
+        .outerjoin(CompetitionEntry, and_(CompetitionEntry.user_id == Vote.user_id,
+                                          CompetitionEntry.is_approved == True))  # noqa:E712
+        .one()
+    )
+
+    return Statistics(registered, confirmed or 0, drafts or 0, published or 0, approved or 0,
+                      entrants, voters, entrants_voted, votes_per_day, dt.datetime.utcnow())
+
+
+def get_timeout():
+    return current_app.config.get('STATS_CACHE_TIMEOUT', 300)
+
+
+def get_stats():
+    """Return cached competition statistics, computing them if necessary."""
+    return get_or_build(STATS_KEY, compute_stats, timeout=get_timeout())
+
+
+def refresh_stats():
+    """Recompute the competition statistics, update the cache and return them."""
+    stats = compute_stats()
+    cache.set(STATS_KEY, stats, timeout=get_timeout())
+    return stats
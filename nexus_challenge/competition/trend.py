@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""Voting trend: the standings of all entries over time, replayed from the vote event log.
+
+Every ballot change appends ``VoteEvent`` rows (see ``voting.save_ballot``). The trend is
+computed in fixed time buckets: the total points of each entry at the end of every bucket are
+stored as a ``StandingsSnapshot`` the first time they are computed, so later calls only replay
+the events created after the latest snapshot instead of the whole log.
+
+Only buckets, which ended at least ``SNAPSHOT_GRACE`` ago are snapshotted, so that events of
+transactions which were still in progress at the end of a bucket are not missed.
+
+"""
+
+# Standard library modules
+from datetime import datetime, timedelta
+
+# Third-party modules
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+# Application specific modules
+from nexus_challenge.database import db
+
+from .fragments import get_approved_entries, get_or_build
+from .models import StandingsSnapshot, VoteEvent
+
+
+TREND_KEY = 'competition/trend/{}'
+SNAPSHOT_GRACE = timedelta(seconds=60)
+EPOCH = datetime(1970, 1, 1)
+
+
+def get_bucket_seconds():
+    return current_app.config.get('VOTE_TREND_BUCKET_SECONDS', 3600)
+
+
+def bucket_floor(when, seconds):
+    """Return start of bucket of given length (in seconds), which contains datetime ``when``."""
+    return when - timedelta(seconds=(when - EPOCH).total_seconds() % seconds)
+
+
+def event_rows(start=None, end=None):
+    """Return query yielding ``(entry_id, points, delta, created_on)`` of events in time order.
+
+    Only events created at or after ``start`` and before ``end`` are included, if given.
+
+    """
+    query = db.session.query(VoteEvent.entry_id, VoteEvent.points, VoteEvent.delta,
+                             VoteEvent.created_on)
+
+    if start is not None:
+        query = query.filter(VoteEvent.created_on >= start)
+
+    if end is not None:
+        query = query.filter(VoteEvent.created_on < end)
+
+    return query.order_by(VoteEvent.created_on, VoteEvent.id).yield_per(1000)
+
+
+def replay(totals, events):
+    """Apply ``(entry_id, points, delta, ...)`` events to dict of totals and return it."""
+    for entry_id, points, delta, *rest in events:
+        totals[entry_id] = totals.get(entry_id, 0) + points * delta
+
+    return totals
+
+
+def latest_snapshot(bucket_seconds):
+    return (
+        StandingsSnapshot.query
+        .filter_by(bucket_seconds=bucket_seconds)
+        .order_by(StandingsSnapshot.bucket_end.desc())
+        .first()
+    )
+
+
+def update_snapshots(bucket_seconds=None, now=None):
+    """Snapshot the totals at the end of all complete buckets after the latest snapshot.
+
+    Returns the number of snapshots created.
+
+    """
+    bucket_seconds = bucket_seconds or get_bucket_seconds()
+    step = timedelta(seconds=bucket_seconds)
+    now = now or datetime.utcnow()
+    voting_end = current_app.config.get('VOTING_PERIOD_END')
+
+    if voting_end is not None and now - SNAPSHOT_GRACE >= voting_end:
+        # no more votes: stop with the bucket containing the end of the voting period
+        until = bucket_floor(voting_end, bucket_seconds) + step
+    else:
+        # the end of the last bucket, which can be snapshotted now
+        until = bucket_floor(now - SNAPSHOT_GRACE, bucket_seconds)
+
+    last = latest_snapshot(bucket_seconds)
+
+    if last is not None:
+        totals = last.totals
+        start = last.bucket_end
+    else:
+        first = db.session.query(db.func.min(VoteEvent.created_on)).scalar()
+
+        if first is None:
+            return 0
+
+        totals = {}
+        start = bucket_floor(first, bucket_seconds)
+
+    bucket_end = start + step
+    created = 0
+
+    def add_snapshot():
+        db.session.add(StandingsSnapshot(bucket_seconds=bucket_seconds, bucket_end=bucket_end,
+                                         totals=totals))
+
+    if bucket_end > until:
+        return 0
+
+    for event in event_rows(start, until):
+        while event.created_on >= bucket_end:
+            add_snapshot()
+            bucket_end += step
+            created += 1
+
+        replay(totals, [event])
+
+    while bucket_end <= until:
+        add_snapshot()
+        bucket_end += step
+        created += 1
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # snapshots were created concurrently by another process
+        db.session.rollback()
+        return 0
+
+    current_app.logger.debug("Created %i voting trend snapshots.", created)
+    return created
+
+
+def get_trend(bucket_seconds=None, now=None):
+    """Return voting trend as a JSON-serializable dict.
+
+    The dict has the keys ``bucket_seconds``, ``times``, a list of ISO 8601 timestamps (UTC; the
+    start of the bucket of the first vote and the ends of all buckets since, followed by ``now`` or
+    the end of the voting period, whichever is earlier), and ``entries``, a list of dicts with the
+    ``id``, ``title``, ``artist`` and ``points`` (one total per timestamp) of each approved entry.
+
+    """
+    bucket_seconds = bucket_seconds or get_bucket_seconds()
+    now = now or datetime.utcnow()
+    update_snapshots(bucket_seconds, now)
+    voting_end = current_app.config.get('VOTING_PERIOD_END')
+
+    if voting_end is not None:
+        now = min(now, voting_end)
+
+    query = (
+        db.session.query(StandingsSnapshot.bucket_end, StandingsSnapshot.totals_json)
+        .filter_by(bucket_seconds=bucket_seconds)
+        .order_by(StandingsSnapshot.bucket_end)
+    )
+    points = [(bucket_end, StandingsSnapshot(totals_json=totals_json).totals)
+              for bucket_end, totals_json in query if bucket_end < now]
+
+    # current totals: replay events since the last snapshot
+    start = points[-1][0] if points else None
+    totals = replay(dict(points[-1][1]) if points else {}, event_rows(start))
+    points.append((now, totals))
+
+    # the trend starts with no points at the beginning of the bucket of the first vote
+    first = db.session.query(db.func.min(VoteEvent.created_on)).scalar()
+
+    if first is not None:
+        points.insert(0, (bucket_floor(first, bucket_seconds), {}))
+
+    return {
+        'bucket_seconds': bucket_seconds,
+        'times': [when.isoformat() + 'Z' for when, values in points],
+        'entries': [
+            {
+                'id': entry.id,
+                'title': entry.title,
+                'artist': entry.artist,
+                'points': [values.get(entry.id, 0) for when, values in points]
+            }
+            for entry in get_approved_entries()
+        ]
+    }
+
+
+def get_cached_trend():
+    """Return voting trend (see ``get_trend``) from the cache, computing it if necessary.
+
+    The trend is cached for ``VOTE_TREND_CACHE_TIMEOUT`` seconds.
+
+    """
+    bucket_seconds = get_bucket_seconds()
+    return get_or_build(TREND_KEY.format(bucket_seconds), lambda: get_trend(bucket_seconds),
+                        timeout=current_app.config.get('VOTE_TREND_CACHE_TIMEOUT', 60))
@@ -2,35 +2,63 @@
 """Public blueprint views."""
 
 # Standard library modules
-import random
 from datetime import datetime
-from operator import attrgetter, itemgetter
 
 # Third-party modules
-from flask import Blueprint, current_app, flash, redirect, render_template, request, url_for
+from flask import (Blueprint, Response, abort, current_app, flash, jsonify, redirect,
+                   render_template, request, stream_with_context, url_for)
 from flask_login import current_user, login_required
+from sqlalchemy.orm import joinedload, load_only
 
 # Application specific modules
+from nexus_challenge.querystats import query_budget
 from nexus_challenge.user.decorators import check_confirmed, check_is_admin
 from nexus_challenge.user.email import start_send_email_task
+from nexus_challenge.user.models import User
 from nexus_challenge.utils import (archiveorg_player, canonify_track_url, in_submission_period,
                                    in_voting_period, to_bool)
 
+from .archiveorg import queue_entry_check, queue_prefetch
+from .counters import VOTERS, get_counter
+from .export import DATASETS, FORMATS, ExportError, export, export_filename
+from .fragments import (get_approved_entries, get_entry_blocks, invalidate_entry,
+                        render_entry_blocks)
 from .forms import SubmitCompetitionEntryForm, VotingForm
+from .listing import InvalidCursor, get_entry_page, listing_url
 from .models import CompetitionEntry, Vote
+from .scoreboard import VOTE_POINTS, get_scoreboard, get_standings
+from .stats import get_stats
+from .trend import get_cached_trend
+from .voting import get_vote_choices, load_ballot, save_ballot
 
 
 blueprint = Blueprint('competition', __name__, static_folder='../static')
 
 
 # utility functions for this module
-def get_user_votes(user):
-    votes = {}
-    for vote in Vote.query.filter(Vote.user_id == user.id, Vote.points > 0):
-        key = VotingForm.points_to_fields.get(vote.points)
-        if key:
-            votes[key] = vote.entry_id
-    return votes
+def listing_options(query):
+    """Restrict entry query to columns shown in entry lists and load the users with it."""
+    return query.options(
+        load_only(CompetitionEntry.title, CompetitionEntry.artist, CompetitionEntry.url,
+                  CompetitionEntry.is_published, CompetitionEntry.is_approved,
+                  CompetitionEntry.created_on, CompetitionEntry.published_on,
+                  CompetitionEntry.user_id),
+        joinedload(CompetitionEntry.user).load_only(User.username)
+    )
+
+
+def load_listed_entries(entry_ids):
+    """Load entries with given ids for rendering their entry list blocks."""
+    return listing_options(CompetitionEntry.query.filter(CompetitionEntry.id.in_(entry_ids)))
+
+
+def get_requested_page(approved_only=True):
+    """Return ``EntryPage`` of the entry list with the order and cursor given in the request."""
+    try:
+        return get_entry_page(request.args.get('order'), to_bool(request.args.get('desc')),
+                              request.args.get('after'), approved_only=approved_only)
+    except InvalidCursor:
+        abort(404)
 
 
 # template context processsors
@@ -38,47 +66,48 @@ def get_user_votes(user):
 def inject_player():
     return dict(
         archiveorg_player=archiveorg_player,
+        listing_url=listing_url,
     )
 
 
 # request handlers
 @blueprint.route('/vote/')
+@query_budget(6)
 def vote():
     now = datetime.utcnow()
-    entries = CompetitionEntry.query.filter_by(is_approved=True)
-    order = request.args.get('order')
-    desc = to_bool(request.args.get('desc'))
-
-    if order in ('artist', 'title', 'published_on'):
-        num_entries = entries.count()
-        entries = sorted(entries, key=attrgetter(order), reverse=desc)
-    else:
-        entries = list(entries)
-        num_entries = len(entries)
-        random.shuffle(entries)
+    page = get_requested_page()
 
     if current_user.is_authenticated:
-        user_votes = Vote.query.filter_by(user_id=current_user.id)
-        user_votes = user_votes.order_by(Vote.points.desc()).limit(5)
+        user_votes = (
+            Vote.query
+            .filter_by(user_id=current_user.id)
+            .options(joinedload(Vote.entry).load_only(CompetitionEntry.title,
+                                                      CompetitionEntry.artist))
+            .order_by(Vote.points.desc())
+            .limit(5)
+            .all()
+        )
     else:
         user_votes = None
 
     return render_template(
         'competition/vote.html',
-        desc=desc,
-        entries=entries,
+        desc=page.desc,
+        entry_blocks=get_entry_blocks(page.entry_ids, load_listed_entries),
         in_submission_period=in_submission_period(now),
         in_voting_period=in_voting_period(now),
         now=now,
-        num_entries=num_entries,
-        num_votes=Vote.query.group_by(Vote.user_id).count(),
-        order=order,
+        num_entries=len(get_approved_entries()),
+        num_votes=get_counter(VOTERS),
+        order=page.order,
+        page=page,
         user_votes=user_votes,
-        user_has_voted=user_votes and user_votes.count()
+        user_has_voted=bool(user_votes)
     )
 
 
 @blueprint.route('/submit_vote', methods=['GET', 'POST'])
+@query_budget(30)
 @login_required
 @check_confirmed
 def submit_vote():
@@ -97,15 +126,14 @@ def submit_vote():
               "Votes cannot be submitted anymore.", 'danger')
         return redirect(url_for('competition.vote'))
 
-    entries = CompetitionEntry.query.filter(
-        CompetitionEntry.is_approved == True,  # noqa:E712
-        CompetitionEntry.user_id != current_user.id
-    )
-    entries = [(entry.id, '“{}” by {}'.format(entry.title, entry.artist)) for entry in entries]
+    entries = [(entry_id, label) for entry_id, label, user_id in get_vote_choices()
+               if user_id != current_user.id]
     entry_ids = [entry[0] for entry in entries]
-    entries.sort(key=itemgetter(1))
 
-    current_votes = get_user_votes(current_user)
+    ballot = load_ballot(current_user.id)
+    current_votes = {VotingForm.points_to_fields[points]: vote.entry_id
+                     for points, vote in ballot.items()
+                     if points in VotingForm.points_to_fields}
 
     if current_votes:
         form = VotingForm(request.form, **current_votes)
@@ -127,20 +155,9 @@ def submit_vote():
     form.fifth.choices = entries
 
     if form.validate_on_submit():
-        for points, field in VotingForm.points_to_fields.items():
-            vote = Vote.query.filter_by(user_id=current_user.id, points=points).first()
-            entry_id = getattr(form, field).data
-
-            if vote and vote.entry_id == entry_id:
-                current_app.logger.debug("Not updating unchanged vote: %r", vote)
-            elif vote:
-                current_app.logger.debug("Updating vote: %r.", vote)
-                vote.update(entry_id=entry_id, created_on=now)
-                current_app.logger.debug("New entry: %r", vote.entry)
-            else:
-                vote = Vote.create(user_id=current_user.id, entry_id=entry_id, points=points,
-                                   created_on=now)
-                current_app.logger.debug("Created new vote: %r", vote)
+        choices = {points: getattr(form, field).data
+                   for points, field in VotingForm.points_to_fields.items()}
+        save_ballot(current_user.id, choices, ballot, now)
 
         if current_votes:
             flash("Your vote was successfully updated. Thank you for voting!", 'success')
@@ -157,30 +174,100 @@ def submit_vote():
 
 
 @blueprint.route('/list/')
+@query_budget(4)
 def list_entries():
     if current_user.is_authenticated and current_user.is_admin:
-        entries = CompetitionEntry.query.all()
+        # admins see unapproved entries too, which are not cached
+        page = get_requested_page(approved_only=False)
+        entries = {entry.id: entry for entry in load_listed_entries(page.entry_ids)}
+        entry_blocks = render_entry_blocks([entries[entry_id] for entry_id in page.entry_ids])
     else:
-        entries = CompetitionEntry.query.filter_by(is_approved=True)
+        page = get_requested_page()
+        entry_blocks = get_entry_blocks(page.entry_ids, load_listed_entries)
 
-    order = request.args.get('order')
-    desc = to_bool(request.args.get('desc'))
+    return render_template('competition/list.html', entry_blocks=entry_blocks,
+                           order=page.order, desc=page.desc, page=page)
 
-    if order in ('artist', 'title', 'published_on'):
-        if order == 'published_on':
-            def key_func(obj):
-                return obj.published_on or datetime.min
-        else:
-            key_func = attrgetter(order)
-        entries = sorted(entries, key=key_func, reverse=desc)
-    else:
-        entries = list(entries)
-        random.shuffle(entries)
 
-    return render_template('competition/list.html', entries=entries, order=order, desc=desc)
+@blueprint.route('/results/')
+@query_budget(4)
+def results():
+    """Competition results page."""
+    now = datetime.utcnow()
+    end_date = current_app.config.get('VOTING_PERIOD_END')
+    voting_over = end_date is None or now >= end_date
+    is_admin = current_user.is_authenticated and current_user.is_admin
+
+    return render_template(
+        'competition/results.html',
+        # admins can watch the live standings during the voting period
+        scoreboard=get_scoreboard() if voting_over else get_standings() if is_admin else None,
+        vote_points=VOTE_POINTS,
+        voting_over=voting_over
+    )
+
+
+@blueprint.route('/results/trend.json')
+def results_trend():
+    """Voting trend data (see ``trend.get_trend``) for the voting trend chart."""
+    end_date = current_app.config.get('VOTING_PERIOD_END')
+    voting_over = end_date is None or datetime.utcnow() >= end_date
+    is_admin = current_user.is_authenticated and current_user.is_admin
+
+    if not (voting_over or is_admin):
+        return jsonify(error="The voting trend is published after the voting period."), 403
+
+    return jsonify(get_cached_trend())
+
+
+@blueprint.route('/results/trend')
+@login_required
+@check_is_admin
+def results_trend_chart():
+    """Voting trend chart."""
+    return render_template('competition/trend.html')
+
+
+@blueprint.route('/stats/')
+@query_budget(6)
+def stats():
+    """Competition statistics page."""
+    return render_template('competition/stats.html', stats=get_stats(), dashboard=False)
+
+
+@blueprint.route('/stats/admin')
+@login_required
+@check_is_admin
+def stats_dashboard():
+    """Competition statistics dashboard for admins."""
+    return render_template('competition/stats.html', stats=get_stats(), dashboard=True,
+                           export_datasets=sorted(DATASETS), export_formats=sorted(FORMATS))
+
+
+@blueprint.route('/export/<dataset>.<fmt>')
+@login_required
+@check_is_admin
+def export_data(dataset, fmt):
+    """Download competition data export (see ``export`` module)."""
+    if dataset not in DATASETS or fmt not in FORMATS:
+        abort(404)
+
+    try:
+        chunks = export(dataset, fmt)
+    except ExportError as exc:
+        flash(str(exc), 'warning')
+        return redirect(url_for('competition.stats_dashboard'))
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=FORMATS[fmt][0],
+        headers={'Content-Disposition': 'attachment; filename="{}"'.format(
+            export_filename(dataset, fmt))}
+    )
 
 
 @blueprint.route('/view/<int:entry>')
+@query_budget(4)
 def view_entry(entry):
     entry = CompetitionEntry.get_by_id(entry)
     if not entry or not entry.is_approved:
@@ -222,31 +309,42 @@ def submit_entry():
 
     if form.validate_on_submit():
         url, _ = canonify_track_url(form.url.data)
+        title = form.title.data.strip()
+        artist = form.artist.data.strip()
 
         if user_entry:
             if user_entry.is_published:
                 flash("Your competition entry is already published "
                       "and can't be updated anymore.", 'danger')
             else:
+                checked = (user_entry.url, user_entry.title, user_entry.artist)
+                needs_check = not user_entry.check_passed or (url, title, artist) != checked
                 user_entry.update(
-                    title=form.title.data.strip(),
-                    artist=form.artist.data.strip(),
+                    title=title,
+                    artist=artist,
                     url=url,
                     description=form.description.data.strip(),
                     production_details=form.production_details.data.strip(),
                     last_modified_on=datetime.utcnow()
                 )
+                invalidate_entry(user_entry.id)
+
+                if needs_check:
+                    queue_entry_check(user_entry)
+
                 flash("Your competition entry was successfully updated.", 'success')
         else:
             user_entry = CompetitionEntry.create(
-                title=form.title.data.strip(),
-                artist=form.artist.data.strip(),
+                title=title,
+                artist=artist,
                 url=url,
                 description=form.description.data.strip(),
                 production_details=form.production_details.data.strip(),
                 last_modified_on=datetime.utcnow(),
                 user_id=current_user.id
             )
+            invalidate_entry(user_entry.id)
+            queue_entry_check(user_entry)
 
             try:
                 view_url = url_for('competition.approve', entry=user_entry.id,
@@ -293,6 +391,12 @@ def publish_entry():
     if user_entry:
         if user_entry.is_published:
             flash("Your competition entry is already published.", 'info')
+        elif user_entry.check_status == CompetitionEntry.CHECK_PENDING:
+            flash("The Archive.org meta data of your competition entry is still being checked. "
+                  "Please try again in a moment.", 'info')
+        elif not user_entry.check_passed:
+            flash("Your competition entry can not be published until the problems with its "
+                  "Archive.org meta data are fixed.", 'danger')
         else:
             confirm = to_bool(request.args.get('confirm'))
 
@@ -301,6 +405,7 @@ def publish_entry():
                     is_published=True,
                     published_on=datetime.utcnow()
                 )
+                invalidate_entry(user_entry.id)
 
                 try:
                     approve_url = url_for('competition.approve', entry=user_entry.id,
@@ -351,6 +456,22 @@ def manage_entry():
     )
 
 
+@blueprint.route('/submit/status')
+@login_required
+def entry_check_status():
+    """Return status of the Archive.org meta data check of the user's entry as JSON."""
+    user_entry = CompetitionEntry.query.filter_by(user_id=current_user.id).first()
+
+    if not user_entry:
+        return jsonify(status=None, errors=[]), 404
+
+    return jsonify(
+        status=user_entry.check_status,
+        errors=user_entry.check_error_list,
+        checked_on=user_entry.checked_on.isoformat() if user_entry.checked_on else None
+    )
+
+
 @blueprint.route('/approve/<int:entry>')
 @login_required
 @check_is_admin
@@ -363,6 +484,10 @@ def approve(entry):
     confirm = to_bool(request.args.get('confirm'))
     if confirm:
         entry.update(is_approved=True)
+        invalidate_entry(entry.id)
+        # warm meta data cache for download_entries et al.
+        queue_prefetch(entry.url)
+
         try:
             view_url = url_for('competition.view_entry', entry=entry.id,
                                _external=True, _scheme='https')
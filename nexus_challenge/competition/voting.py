@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Reading and writing of user ballots, i.e. the set of votes a user cast.
+
+A ballot consists of at most one vote per possible number of points (enforced by a unique
+constraint on ``(user_id, points)``). ``save_ballot`` loads the existing votes of the user once
+and writes all changes, including the changes of the vote counters (see ``counters`` module) and
+the vote events the voting trend is replayed from (see ``trend`` module), in a single
+transaction, so a ballot is never left half-updated.
+
+The ballot may have been changed by a concurrent request (e.g. a double-click) after it was
+loaded. New votes then violate the unique constraint and changed votes are only updated, if
+they still are for the entry they were loaded with, so the counters and events are never
+derived from a stale ballot: the transaction is rolled back and the changes are applied again
+to the reloaded ballot.
+
+"""
+
+# Standard library modules
+from collections import defaultdict
+from datetime import datetime
+
+# Third-party modules
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+# Application specific modules
+from nexus_challenge.database import db
+
+from .counters import apply_vote_deltas
+from .fragments import VOTE_CHOICES_KEY, get_or_build
+from .models import CompetitionEntry, Vote, VoteEvent
+
+
+#: number of times the changes of a ballot are applied, if it is changed concurrently
+SAVE_ATTEMPTS = 3
+
+
+class BallotConflict(Exception):
+    """Raised when a ballot is changed concurrently while it is saved."""
+
+
+def get_vote_choices():
+    """Return list of ``(entry_id, label, user_id)`` tuples for all approved entries.
+
+    The list is sorted by label and cached (see ``fragments.invalidate_entry``).
+
+    """
+    def build():
+        query = (
+            db.session.query(CompetitionEntry.id, CompetitionEntry.title,
+                             CompetitionEntry.artist, CompetitionEntry.user_id)
+            .filter(CompetitionEntry.is_approved == True)  # noqa:E712
+        )
+        choices = [(id_, '“{}” by {}'.format(title, artist), user_id)
+                   for id_, title, artist, user_id in query]
+        return sorted(choices, key=lambda choice: choice[1])
+
+    return get_or_build(VOTE_CHOICES_KEY, build)
+
+
+def load_ballot(user_id):
+    """Return dict mapping points to ``Vote`` instances of the user with given id."""
+    return {vote.points: vote for vote in Vote.query.filter_by(user_id=user_id)}
+
+
+def save_ballot(user_id, choices, ballot=None, now=None):
+    """Apply ballot choices, a dict mapping points to entry ids, for user in one transaction.
+
+    ``ballot`` is the user's current ballot as returned by ``load_ballot`` and is loaded, if not
+    given. Only changed votes are written. Returns the number of votes created or changed.
+
+    If a concurrent request (e.g. a double-click) changed the ballot in the meantime, it is
+    reloaded and the changes are applied again. Raises ``BallotConflict``, if that keeps
+    happening.
+
+    """
+    now = now or datetime.utcnow()
+
+    for attempt in range(1, SAVE_ATTEMPTS + 1):
+        if ballot is None:
+            ballot = load_ballot(user_id)
+
+        changed = 0
+        deltas = defaultdict(lambda: defaultdict(int))
+        events = []
+        # (vote id, entry id as loaded, new entry id) of the changed votes
+        updates = []
+
+        for points, entry_id in choices.items():
+            vote = ballot.get(points)
+
+            if vote is None:
+                vote = Vote(user_id=user_id, entry_id=entry_id, points=points, created_on=now)
+                db.session.add(vote)
+                current_app.logger.debug("Creating vote: user %s, entry %s, %s points.",
+                                         user_id, entry_id, points)
+            elif vote.entry_id != entry_id:
+                current_app.logger.debug("Updating vote: user %s, entry %s -> %s, %s points.",
+                                         user_id, vote.entry_id, entry_id, points)
+                updates.append((vote.id, vote.entry_id, entry_id))
+                deltas[vote.entry_id][points] -= 1
+
+                if vote.entry_id is not None:
+                    events.append(dict(user_id=user_id, entry_id=vote.entry_id, points=points,
+                                       delta=-1, created_on=now))
+            else:
+                continue
+
+            deltas[entry_id][points] += 1
+            events.append(dict(user_id=user_id, entry_id=entry_id, points=points, delta=1,
+                               created_on=now))
+            changed += 1
+
+        try:
+            for vote_id, old_entry_id, entry_id in updates:
+                updated = (
+                    Vote.query
+                    .filter(Vote.id == vote_id, Vote.entry_id == old_entry_id)
+                    .update({Vote.entry_id: entry_id, Vote.created_on: now},
+                            synchronize_session=False)
+                )
+
+                if updated != 1:
+                    raise BallotConflict("Vote {} was changed concurrently.".format(vote_id))
+
+            apply_vote_deltas(deltas, new_voters=1 if changed and not ballot else 0)
+
+            if events:
+                db.session.bulk_insert_mappings(VoteEvent, events)
+
+            db.session.commit()
+        except (BallotConflict, IntegrityError):
+            db.session.rollback()
+
+            if attempt == SAVE_ATTEMPTS:
+                raise
+
+            current_app.logger.debug("Ballot of user %s changed concurrently, retrying.",
+                                     user_id)
+            ballot = None
+        else:
+            return changed
@@ -17,14 +17,26 @@ from flask_pagedown import PageDown
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf.csrf import CSRFProtect
 
+# Application specific modules
+from .assets import Assets
+from .jobs import JobRunner
+from .metrics import Metrics
+from .passwords import PasswordHasher
+from .querystats import QueryStats
 
+
+assets = Assets()
 bcrypt = Bcrypt()
 cache = Cache()
 csrf_protect = CSRFProtect()
 db = SQLAlchemy()
 debug_toolbar = DebugToolbarExtension()
+jobs = JobRunner()
 login_manager = LoginManager()
 mail = Mail()
+metrics = Metrics()
 migrate = Migrate()
 misaka = Misaka()
 pagedown = PageDown()
+password_hasher = PasswordHasher()
+query_stats = QueryStats()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""Background jobs run in a bounded in-process thread pool.
+
+Jobs are plain functions, which are called within an application context of the app, which
+submitted them. Since the state of a job is not kept anywhere else, jobs have to record their
+outcome themselves, e.g. in the database, where it can be queried by any worker process.
+
+"""
+
+# Standard library modules
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Third-party modules
+from flask import current_app
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is attempted while the circuit breaker for its key is open."""
+
+
+class CircuitBreaker:
+    """Per-key (e.g. per-host) circuit breaker.
+
+    After ``failure_threshold`` consecutive failures for a key, the circuit for this key is
+    opened and calls are rejected for ``reset_timeout`` seconds. After that, one trial call is
+    let through. If it succeeds, the circuit is closed again, otherwise it stays open for
+    another ``reset_timeout`` seconds.
+
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = {}
+        self._opened_at = {}
+
+    def allow(self, key):
+        """Return whether a call for given key may be attempted now."""
+        with self._lock:
+            opened_at = self._opened_at.get(key)
+
+            if opened_at is None:
+                return True
+
+            if time.monotonic() - opened_at >= self.reset_timeout:
+                # half-open: let one trial call through and re-arm timeout
+                self._opened_at[key] = time.monotonic()
+                return True
+
+            return False
+
+    def is_open(self, key):
+        """Return whether the circuit for given key is currently open."""
+        with self._lock:
+            return key in self._opened_at
+
+    def record_success(self, key):
+        """Close the circuit for given key after a successful call."""
+        with self._lock:
+            self._failures.pop(key, None)
+            self._opened_at.pop(key, None)
+
+    def record_failure(self, key):
+        """Count a failed call for given key and open its circuit, if the threshold is reached."""
+        with self._lock:
+            self._failures[key] = failures = self._failures.get(key, 0) + 1
+
+            if failures >= self.failure_threshold:
+                self._opened_at.setdefault(key, time.monotonic())
+
+    def call(self, key, func, *args, **kwargs):
+        """Call func with given arguments, guarded by the circuit for given key.
+
+        Raises ``CircuitOpenError``, if the circuit for the key is open.
+
+        """
+        if not self.allow(key):
+            raise CircuitOpenError("Too many recent failures for '%s', "
+                                   "not trying again for now." % key)
+
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure(key)
+            raise
+        else:
+            self.record_success(key)
+            return result
+
+
+class JobRunner:
+    """Run jobs in a bounded thread pool within the application context.
+
+    At most ``JOBS_MAX_WORKERS`` jobs run concurrently and at most ``JOBS_MAX_PENDING`` jobs
+    may be queued or running at any time. If config ``JOBS_RUN_SYNC`` is true, jobs are run
+    immediately in the calling thread instead (useful for tests).
+
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Set config defaults and register the runner with the app."""
+        app.config.setdefault('JOBS_MAX_WORKERS', 2)
+        app.config.setdefault('JOBS_MAX_PENDING', 20)
+        app.config.setdefault('JOBS_RUN_SYNC', False)
+        app.extensions['jobs'] = self
+
+    @property
+    def pending(self):
+        """Number of jobs currently queued or running in this process."""
+        return self._pending
+
+    def _get_executor(self, max_workers):
+        # The pool must not be shared with a forked child process (e.g. a gunicorn worker)
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                                thread_name_prefix='job')
+            self._pid = os.getpid()
+            self._pending = 0
+
+        return self._executor
+
+    def submit(self, func, *args, **kwargs):
+        """Queue func to be called with given arguments in the background.
+
+        Returns ``False`` if the job could not be queued, because too many jobs are pending.
+
+        """
+        app = current_app._get_current_object()
+
+        if app.config['JOBS_RUN_SYNC']:
+            func(*args, **kwargs)
+            return True
+
+        with self._lock:
+            if self._pending >= app.config['JOBS_MAX_PENDING']:
+                app.logger.warning("Job queue full, rejecting job %s.", func.__name__)
+                return False
+
+            executor = self._get_executor(app.config['JOBS_MAX_WORKERS'])
+            self._pending += 1
+
+        executor.submit(self._run, app, func, args, kwargs)
+        return True
+
+    def _run(self, app, func, args, kwargs):
+        try:
+            with app.app_context():
+                func(*args, **kwargs)
+        except Exception:
+            app.logger.exception("Error in background job %s.", func.__name__)
+        finally:
+            with self._lock:
+                self._pending -= 1
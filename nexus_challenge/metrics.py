@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""Application metrics in the Prometheus text format.
+
+Counters and histograms are recorded in memory by each process. If ``METRICS_DIR`` is set,
+``/metrics`` reports the sum over the files of all processes in this directory, so the values of
+all gunicorn workers are aggregated, including those of workers which have exited. Only server
+processes, which set ``METRICS_WRITE_FILES`` (see ``deployment/start-nexus-challenge-webapp.sh``,
+which also empties the directory when the application server is (re)started), write their
+values to their own file in the directory (at most ``METRICS_FLUSH_INTERVAL`` seconds after they
+changed and at exit, if there are any), so CLI commands run from cron don't leave files behind.
+
+``/metrics`` only answers requests made directly from one of ``METRICS_ALLOWED_HOSTS``, not
+those forwarded by a proxy.
+
+"""
+
+# Standard library modules
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+# Third-party modules
+from flask import Response, abort, current_app, g, request
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+REMOTE_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Metric = namedtuple('Metric', 'name kind description buckets')
+
+#: all counters and histograms by name
+METRICS = {}
+
+
+def counter(name, description):
+    METRICS[name] = metric = Metric(name, 'counter', description, None)
+    return metric
+
+
+def histogram(name, description, buckets=LATENCY_BUCKETS):
+    METRICS[name] = metric = Metric(name, 'histogram', description, tuple(buckets))
+    return metric
+
+
+HTTP_REQUESTS = counter(
+    'nexus_http_requests_total', "HTTP requests by endpoint, method and status code.")
+HTTP_REQUEST_DURATION = histogram(
+    'nexus_http_request_duration_seconds', "HTTP request latency by endpoint.")
+HTTP_REQUEST_DB_DURATION = histogram(
+    'nexus_http_request_db_seconds', "Time spent in SQL queries per request by endpoint.",
+    DB_BUCKETS)
+DB_QUERIES = counter(
+    'nexus_db_queries_total', "SQL queries made by HTTP requests by endpoint.")
+CACHE_REQUESTS = counter(
+    'nexus_cache_requests_total', "Cache lookups by cached value and result (hit or miss).")
+MAIL_SEND_DURATION = histogram(
+    'nexus_mail_send_duration_seconds', "Email send latency by result (sent or failed).",
+    REMOTE_BUCKETS)
+MAIL_SEND_FAILURES = counter(
+    'nexus_mail_send_failures_total', "Failed attempts to send an email.")
+ARCHIVEORG_REQUEST_DURATION = histogram(
+    'nexus_archiveorg_request_duration_seconds',
+    "Archive.org request latency by HTTP status code ('error' if there was no response).",
+    REMOTE_BUCKETS)
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+
+    return '{' + ','.join('{}="{}"'.format(
+        name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels) + '}'
+
+
+class Metrics:
+    """Process-local metrics, optionally shared with other processes via files in a directory.
+
+    Gauges, whose values are not kept by the processes, but read at scrape time (e.g. from the
+    database), are added with the ``collector`` decorator.
+
+    """
+
+    def __init__(self, app=None, directory=None, write_files=True):
+        self.directory = directory
+        self.write_files = write_files
+        self.flush_interval = 1.0
+        self.collectors = []
+        self._lock = threading.Lock()
+        self._atexit = False
+        self._reset()
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Set config defaults, register the request hooks and the ``/metrics`` view."""
+        app.config.setdefault('METRICS_DIR', None)
+        app.config.setdefault('METRICS_WRITE_FILES', False)
+        app.config.setdefault('METRICS_FLUSH_INTERVAL', 1.0)
+        app.config.setdefault('METRICS_ALLOWED_HOSTS', ('127.0.0.1', '::1'))
+        app.extensions['metrics'] = self
+        self.directory = app.config['METRICS_DIR']
+        self.write_files = app.config['METRICS_WRITE_FILES']
+        self.flush_interval = app.config['METRICS_FLUSH_INTERVAL']
+
+        with self._lock:
+            self._reset()
+
+        if self.directory and self.write_files:
+            os.makedirs(self.directory, exist_ok=True)
+
+            if not self._atexit:
+                atexit.register(self.flush)
+                self._atexit = True
+
+        app.before_request(self._start_request)
+        # must be registered after the query_stats extension, so this runs before its
+        # after_request handler, which removes the query recorder of the request
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.view)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._filename = 'metrics-{}-{}.json'.format(self._pid, uuid.uuid4().hex[:8])
+        self._values = {}
+        self._timer = None
+
+    def inc(self, metric, value=1, **labels):
+        """Increment counter by value."""
+        self._update(metric, tuple(sorted(labels.items())), value)
+
+    def observe(self, metric, value, **labels):
+        """Add an observation to histogram."""
+        self._update(metric, tuple(sorted(labels.items())), value)
+
+    def _update(self, metric, labels, value):
+        with self._lock:
+            if self._pid != os.getpid():
+                # forked, e.g. a gunicorn worker of an app created before forking
+                self._reset()
+
+            key = (metric.name, labels)
+
+            if metric.kind == 'histogram':
+                # counts per bucket (the last one is '+Inf') and sum
+                counts, total = self._values.get(key) or ([0] * (len(metric.buckets) + 1), 0.0)
+                index = next((i for i, bound in enumerate(metric.buckets) if value <= bound),
+                             len(metric.buckets))
+                counts[index] += 1
+                self._values[key] = [counts, total + value]
+            else:
+                self._values[key] = self._values.get(key, 0) + value
+
+            if self.directory and self.write_files and self._timer is None:
+                # write the changes at most once per flush interval
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def snapshot(self):
+        """Return a copy of the values of this process as a list of ``[name, labels, value]``."""
+        with self._lock:
+            return [[name, [list(label) for label in labels], json.loads(json.dumps(value))]
+                    for (name, labels), value in self._values.items()]
+
+    def flush(self):
+        """Write the values of this process to its file in the metrics directory, if any."""
+        if not (self.directory and self.write_files) or self._pid != os.getpid():
+            return
+
+        with self._lock:
+            self._timer = None
+
+        values = self.snapshot()
+
+        if not values:
+            return
+
+        fd, tmpname = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(values, fp)
+
+        os.replace(tmpname, os.path.join(self.directory, self._filename))
+
+    def collect(self):
+        """Return dict mapping ``(name, labels)`` to the values summed over all processes."""
+        sources = [self.snapshot()]
+
+        if self.directory:
+            for filename in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+                if os.path.basename(filename) == self._filename:
+                    continue
+
+                try:
+                    with open(filename) as fp:
+                        sources.append(json.load(fp))
+                except (OSError, ValueError):
+                    # removed or being replaced
+                    continue
+
+        merged = {}
+
+        for values in sources:
+            for name, labels, value in values:
+                metric = METRICS.get(name)
+
+                if metric is None:
+                    continue
+
+                key = (name, tuple(tuple(label) for label in labels))
+
+                if metric.kind == 'histogram':
+                    if len(value[0]) != len(metric.buckets) + 1:
+                        continue
+
+                    counts, total = merged.get(key) or ([0] * len(value[0]), 0.0)
+                    merged[key] = [[a + b for a, b in zip(counts, value[0])], total + value[1]]
+                else:
+                    merged[key] = merged.get(key, 0) + value
+
+        return merged
+
+    def collector(self, func):
+        """Register function returning gauges to report at scrape time.
+
+        The function must return a list of ``(name, description, samples)`` tuples, where
+        ``samples`` is a list of ``(labels, value)`` tuples and ``labels`` a dict.
+
+        """
+        self.collectors.append(func)
+        return func
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        merged = self.collect()
+        lines = []
+
+        for metric in sorted(METRICS.values()):
+            samples = sorted((labels, value) for (name, labels), value in merged.items()
+                             if name == metric.name)
+
+            if not samples:
+                continue
+
+            lines.append('# HELP {} {}'.format(metric.name, metric.description))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+
+            for labels, value in samples:
+                if metric.kind == 'histogram':
+                    counts, total = value
+                    cumulative = 0
+
+                    for bound, count in zip(metric.buckets + (float('inf'),), counts):
+                        cumulative += count
+                        lines.append('{}_bucket{} {}'.format(
+                            metric.name, format_labels(labels + (('le', format_value(bound)),)),
+                            cumulative))
+
+                    lines.append('{}_sum{} {}'.format(metric.name, format_labels(labels),
+                                                      format_value(total)))
+                    lines.append('{}_count{} {}'.format(metric.name, format_labels(labels),
+                                                        cumulative))
+                else:
+                    lines.append('{}{} {}'.format(metric.name, format_labels(labels),
+                                                  format_value(value)))
+
+        for collect_gauges in self.collectors:
+            for name, description, samples in collect_gauges():
+                lines.append('# HELP {} {}'.format(name, description))
+                lines.append('# TYPE {} gauge'.format(name))
+                lines.extend('{}{} {}'.format(name, format_labels(sorted(labels.items())),
+                                              format_value(value))
+                             for labels, value in samples)
+
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _start_request():
+        g.metrics_started = time.perf_counter()
+
+    def _finish_request(self, response):
+        started = g.pop('metrics_started', None)
+
+        if started is None:
+            return response
+
+        endpoint = request.endpoint or 'none'
+        self.inc(HTTP_REQUESTS, endpoint=endpoint, method=request.method,
+                 status=response.status_code)
+        self.observe(HTTP_REQUEST_DURATION, time.perf_counter() - started, endpoint=endpoint)
+        queries = g.get('sql_queries')
+
+        if queries is not None:
+            self.observe(HTTP_REQUEST_DB_DURATION, queries.duration, endpoint=endpoint)
+            self.inc(DB_QUERIES, queries.count, endpoint=endpoint)
+
+        return response
+
+    def view(self):
+        """Report metrics to local clients, which do not connect through a proxy."""
+        allowed_hosts = current_app.config['METRICS_ALLOWED_HOSTS']
+
+        if request.remote_addr not in allowed_hosts or 'X-Forwarded-For' in request.headers:
+            abort(404)
+
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
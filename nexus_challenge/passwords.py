@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Password hashing and checking in a bounded process pool.
+
+bcrypt is deliberately slow (about 0.5 s of CPU time with the default ``BCRYPT_LOG_ROUNDS``
+of 13). Run inline, a burst of logins, e.g. at the start of the voting period, keeps all CPU
+cores and workers busy and starves page views. ``PasswordHasher`` runs it in a pool of
+``PASSWORD_POOL_WORKERS`` processes per application worker process instead, which limits the
+CPU time taken by password hashing. At most ``PASSWORD_POOL_MAX_PENDING`` operations may be
+queued or running and each call waits at most ``PASSWORD_POOL_TIMEOUT`` seconds for its
+result. Otherwise ``PasswordHasherBusy`` is raised, which is answered with a "503 Service
+Unavailable" response, so that visitors are asked to try again instead of piling up.
+
+With ``PASSWORD_POOL_WORKERS`` set to 0, passwords are hashed in the calling thread.
+
+"""
+
+# Standard library modules
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+# Third-party modules
+from flask import current_app
+from flask_bcrypt import Bcrypt
+from werkzeug.exceptions import ServiceUnavailable
+
+# Application specific modules
+from .metrics import REMOTE_BUCKETS, counter, histogram
+
+
+PASSWORD_HASHING_DURATION = histogram(
+    'nexus_password_hashing_seconds',
+    "Time waited for password hashing and checking (queueing included) by operation.",
+    REMOTE_BUCKETS)
+PASSWORD_HASHING_REJECTED = counter(
+    'nexus_password_hashing_rejected_total',
+    "Password operations rejected because the pool was full ('busy') or too slow ('timeout').")
+
+# used in the pool processes, which get the number of rounds passed explicitly
+_bcrypt = Bcrypt()
+
+
+def generate_hash(password, rounds):
+    return _bcrypt.generate_password_hash(password, rounds)
+
+
+def check_hash(pw_hash, password):
+    return _bcrypt.check_password_hash(pw_hash, password)
+
+
+class PasswordHasherBusy(ServiceUnavailable):
+    """Raised when a password can't be hashed or checked in time."""
+
+    description = ("Too many people are logging in right now. "
+                   "Please try again in a few seconds.")
+
+
+class PasswordHasher:
+    """Hash and check passwords in a bounded process pool."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Set config defaults and register the hasher with the app."""
+        app.config.setdefault('PASSWORD_POOL_WORKERS', 2)
+        app.config.setdefault('PASSWORD_POOL_MAX_PENDING', 8)
+        app.config.setdefault('PASSWORD_POOL_TIMEOUT', 5.0)
+        app.extensions['password_hasher'] = self
+
+    @property
+    def pending(self):
+        """Number of operations currently queued or running in the pool of this process."""
+        return self._pending
+
+    def _get_executor(self, max_workers):
+        # The pool must not be shared with a forked child process (e.g. a gunicorn worker).
+        # Its processes are started from a clean server process, since forking a process
+        # with threads (mail workers, jobs) is unsafe.
+        if self._executor is None or self._pid != os.getpid():
+            method = ('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods()
+                      else 'spawn')
+            self._executor = ProcessPoolExecutor(max_workers=max_workers,
+                                                 mp_context=multiprocessing.get_context(method))
+            self._pid = os.getpid()
+            self._pending = 0
+
+        return self._executor
+
+    def shutdown(self, wait=True):
+        """Shut down the pool processes of this process."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def _call(self, operation, func, *args):
+        config = current_app.config
+        started = time.perf_counter()
+
+        if not config['PASSWORD_POOL_WORKERS']:
+            result = func(*args)
+        else:
+            with self._lock:
+                if self._pending >= config['PASSWORD_POOL_MAX_PENDING']:
+                    future = None
+                else:
+                    future = self._get_executor(config['PASSWORD_POOL_WORKERS']).submit(
+                        func, *args)
+                    self._pending += 1
+
+            if future is None:
+                self._reject('busy', operation)
+
+            future.add_done_callback(self._done)
+
+            try:
+                result = future.result(timeout=config['PASSWORD_POOL_TIMEOUT'])
+            except FutureTimeoutError:
+                # only possible, if it's still queued, otherwise it completes unobserved
+                future.cancel()
+                self._reject('timeout', operation)
+
+        current_app.extensions['metrics'].observe(
+            PASSWORD_HASHING_DURATION, time.perf_counter() - started, operation=operation)
+        return result
+
+    def _reject(self, reason, operation):
+        current_app.logger.warning("Password %s rejected (%s), %i operations pending.",
+                                   operation, reason, self._pending)
+        current_app.extensions['metrics'].inc(PASSWORD_HASHING_REJECTED, reason=reason)
+        raise PasswordHasherBusy()
+
+    def generate(self, password):
+        """Return bcrypt hash of password.
+
+        Raises ``PasswordHasherBusy``, if the pool is saturated.
+
+        """
+        if not password:
+            # raise here rather than in the pool process
+            raise ValueError('Password must be non-empty.')
+
+        return self._call('hash', generate_hash, password,
+                          current_app.config.get('BCRYPT_LOG_ROUNDS', 12))
+
+    def check(self, pw_hash, password):
+        """Return whether password matches bcrypt hash.
+
+        Raises ``PasswordHasherBusy``, if the pool is saturated.
+
+        """
+        if not pw_hash:
+            return False
+
+        return self._call('check', check_hash, pw_hash, password)
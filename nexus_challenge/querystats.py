@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""Per-request SQL query counting and timing.
+
+The ``QueryStats`` extension listens to the cursor execution events of all SQLAlchemy engines
+and records the number and duration of the statements executed while handling a request.
+
+* Requests with at least ``SQL_SLOW_REQUEST_QUERIES`` queries or at least
+  ``SQL_SLOW_REQUEST_MS`` milliseconds spent in queries are logged as warnings, together with
+  their most frequent and slowest statements (a statement repeated many times is usually an
+  N+1 pattern, e.g. a lazy loaded ``entry.user`` in a loop).
+* If ``SQL_DEBUG_HEADERS`` is true (by default in debug mode), responses get ``X-SQL-Queries``
+  and ``X-SQL-Time`` (milliseconds) headers and a ``Server-Timing`` entry, which browser
+  developer tools show.
+* Views decorated with ``query_budget(n)`` may make at most ``n`` queries. Exceeding the budget
+  is logged and, if ``SQL_ENFORCE_BUDGETS`` is true (by default when testing), raises
+  ``QueryBudgetExceeded``, so regressions make the tests fail.
+
+``max_queries(n)`` asserts a budget for arbitrary code, e.g. a test function, or, with ``None``,
+only counts its queries (e.g. those of the requests of ``flask bench``).
+
+"""
+
+# Standard library modules
+import threading
+import time
+from collections import Counter
+from contextlib import ContextDecorator
+
+# Third-party modules
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+#: maximum number of statements kept per request for the slow request log
+MAX_RECORDED_STATEMENTS = 200
+#: statements are shortened to this length in log messages
+MAX_STATEMENT_LENGTH = 200
+
+
+def shorten(statement):
+    statement = ' '.join(statement.split())
+
+    if len(statement) > MAX_STATEMENT_LENGTH:
+        statement = statement[:MAX_STATEMENT_LENGTH - 3] + '...'
+
+    return statement
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when more queries than budgeted were made."""
+
+    def __init__(self, budget, recorder, where=None):
+        self.budget = budget
+        self.recorder = recorder
+        super().__init__("{} made {} SQL queries, budget is {}:\n{}".format(
+            where or "Code", recorder.count, budget, recorder.format_statements()))
+
+
+class QueryRecorder:
+    """Number, total duration and statements of the queries executed in a scope."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+
+        if len(self.statements) < MAX_RECORDED_STATEMENTS:
+            self.statements.append((statement, duration))
+
+    def format_statements(self, limit=5):
+        """Return the most frequent and the slowest statements as a string for a log message."""
+        counts = Counter(statement for statement, duration in self.statements)
+        lines = ["  {:4d}x {}".format(count, shorten(statement))
+                 for statement, count in counts.most_common(limit)]
+        slowest = sorted(self.statements, key=lambda item: item[1], reverse=True)[:limit]
+        lines.extend("  {:7.1f} ms {}".format(duration * 1000.0, shorten(statement))
+                     for statement, duration in slowest)
+        return '\n'.join(lines)
+
+
+# recorders of the current request (on 'g') and of active 'max_queries' scopes
+_local = threading.local()
+
+
+def _active_recorders():
+    recorders = list(getattr(_local, 'recorders', ()))
+
+    if has_app_context():
+        recorder = g.get('sql_queries')
+
+        if recorder is not None:
+            recorders.append(recorder)
+
+    return recorders
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append((cursor, time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()[1]
+    duration = time.perf_counter() - started
+
+    for recorder in _active_recorders():
+        recorder.record(statement, duration)
+
+
+def _handle_error(exception_context):
+    # a failed statement has no after_cursor_execute event, so its start time must be removed
+    # here, or it stays on the pooled connection (but only if it was pushed, i.e. the error did
+    # not happen before the statement was sent or after its after_cursor_execute event)
+    conn = exception_context.connection
+    started = conn.info.get('query_started') if conn is not None else None
+    # the cursor is not passed for errors raised by the statement, but is that of its context
+    cursor = exception_context.cursor or getattr(exception_context.execution_context, 'cursor',
+                                                 None)
+
+    if started and cursor is not None and started[-1][0] is cursor:
+        started.pop()
+
+
+def install_listeners():
+    """Listen to the cursor execution events of all engines (idempotent)."""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+
+def query_budget(max_count):
+    """Decorator setting the maximum number of SQL queries a view may make per request."""
+    def decorator(view):
+        view.query_budget = max_count
+        return view
+
+    return decorator
+
+
+class max_queries(ContextDecorator):
+    """Context manager / decorator raising ``QueryBudgetExceeded`` after too many queries.
+
+    Queries of the current thread are counted. The recorder is available as the target of the
+    ``with`` statement. With a maximum of ``None``, the queries are only recorded.
+
+    """
+
+    def __init__(self, max_count):
+        self.max_count = max_count
+
+    def __enter__(self):
+        install_listeners()
+        self.recorder = QueryRecorder()
+        _local.recorders = getattr(_local, 'recorders', ()) + (self.recorder,)
+        return self.recorder
+
+    def __exit__(self, *exc_info):
+        _local.recorders = tuple(recorder for recorder in _local.recorders
+                                 if recorder is not self.recorder)
+
+        over_budget = self.max_count is not None and self.recorder.count > self.max_count
+
+        if exc_info[0] is None and over_budget:
+            raise QueryBudgetExceeded(self.max_count, self.recorder)
+
+
+class QueryStats:
+    """Count and time the SQL queries of each request."""
+
+    def __init__(self, app=None):
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Set config defaults, install the engine event listeners and the request hooks."""
+        app.config.setdefault('SQL_SLOW_REQUEST_QUERIES', 30)
+        app.config.setdefault('SQL_SLOW_REQUEST_MS', 500)
+        app.config.setdefault('SQL_DEBUG_HEADERS', app.debug)
+        app.config.setdefault('SQL_ENFORCE_BUDGETS', app.testing)
+        app.extensions['query_stats'] = self
+        install_listeners()
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._discard)
+
+    @staticmethod
+    def _start():
+        g.sql_queries = QueryRecorder()
+
+    @staticmethod
+    def _discard(exc=None):
+        g.pop('sql_queries', None)
+
+    def _finish(self, response):
+        recorder = g.pop('sql_queries', None)
+
+        if recorder is None:
+            return response
+
+        config = current_app.config
+        duration_ms = recorder.duration * 1000.0
+        where = '{} {}'.format(request.method, request.full_path.rstrip('?'))
+
+        many_queries = recorder.count >= config['SQL_SLOW_REQUEST_QUERIES']
+
+        if many_queries or duration_ms >= config['SQL_SLOW_REQUEST_MS']:
+            current_app.logger.warning("%s made %i SQL queries taking %.1f ms:\n%s", where,
+                                       recorder.count, duration_ms,
+                                       recorder.format_statements())
+
+        if config['SQL_DEBUG_HEADERS']:
+            response.headers['X-SQL-Queries'] = str(recorder.count)
+            response.headers['X-SQL-Time'] = '{:.1f}'.format(duration_ms)
+            response.headers.add('Server-Timing', 'db;desc="SQL ({} queries)";dur={:.1f}'.format(
+                recorder.count, duration_ms))
+
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+
+        if budget is not None and recorder.count > budget:
+            if config['SQL_ENFORCE_BUDGETS']:
+                raise QueryBudgetExceeded(budget, recorder, where)
+
+            current_app.logger.warning("%s exceeded its budget of %i SQL queries.",
+                                       where, budget)
+
+        return response
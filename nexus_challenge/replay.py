@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""Replay of gunicorn access logs.
+
+The access log written by gunicorn (see ``deployment/start-nexus-challenge-webapp.sh``, default
+log format) is parsed into a sequence of requests, which is replayed with the original relative
+timing, optionally sped up by a factor, against the Flask test client of an app with a seeded
+database (see ``bench`` module) or against a running local instance (e.g. gunicorn) over HTTP.
+
+The log has neither cookies nor request bodies, so requests to views which need a logged in user
+are made with the sessions of seeded users (``bench<n>``), logins log in a seeded user and vote
+submissions post a random ballot. Other ``POST`` requests and logouts are skipped.
+
+The result is a report of the latency distribution per endpoint.
+
+"""
+
+# Standard library modules
+import re
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urljoin, urlsplit
+
+# Third-party modules
+import requests
+from flask_login import login_required
+from werkzeug.exceptions import HTTPException
+
+# Application specific modules
+from .bench import BENCH_PASSWORD, ROUTES, BenchClients, BenchError, percentile, rounded
+from .competition.forms import VotingForm
+
+
+#: gunicorn's default access log format: '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s"
+#: "%(a)s"'
+LOG_LINE = re.compile(
+    r'^(?P<host>\S+) \S+ \S+ \[(?P<time>[^\]]+)\] '
+    r'"(?P<method>[A-Z]+) (?P<path>\S+)(?: HTTP/[\d.]+)?" (?P<status>\d{3}) (?P<size>\S+)'
+)
+LOG_TIME_FORMAT = '%d/%b/%Y:%H:%M:%S %z'
+CSRF_TOKEN = re.compile(r'<input[^>]*name="csrf_token"[^>]*value="([^"]*)"')
+
+SKIPPED_ENDPOINTS = {'user.logout'}
+
+# all views wrapped by login_required share the code of its wrapper function
+LOGIN_REQUIRED_CODE = login_required(lambda: None).__code__
+
+LogRecord = namedtuple('LogRecord', 'time method path status')
+ReplayRequest = namedtuple('ReplayRequest', 'offset endpoint action method path status')
+ReplayRequest.__doc__ = """\
+A request to replay ``offset`` seconds after the start of the replay.
+
+``action`` is one of 'get' (a ``GET`` or ``HEAD`` request of ``path``), 'session' (the same
+with the session of a logged in user), 'login' or 'vote'.
+
+"""
+
+
+def parse_log(lines):
+    """Return list of ``LogRecord`` tuples and number of lines, which could not be parsed."""
+    records = []
+    invalid = 0
+
+    for line in lines:
+        match = LOG_LINE.match(line)
+
+        try:
+            when = datetime.strptime(match.group('time'), LOG_TIME_FORMAT)
+        except (AttributeError, ValueError):
+            invalid += 1
+            continue
+
+        records.append(LogRecord(when, match.group('method'), match.group('path'),
+                                 int(match.group('status'))))
+
+    return records, invalid
+
+
+def needs_login(view):
+    """Return whether the view function (or one of the views it wraps) requires a login."""
+    while view is not None:
+        if getattr(view, '__code__', None) is LOGIN_REQUIRED_CODE:
+            return True
+
+        view = getattr(view, '__wrapped__', None)
+
+    return False
+
+
+def plan_replay(app, records, speed=1.0):
+    """Turn log records into a list of ``ReplayRequest`` tuples.
+
+    The offsets are the original offsets from the first record divided by ``speed`` (all zero,
+    if speed is 0). Returns the list of requests and a dict counting the skipped records per
+    endpoint.
+
+    """
+    adapter = app.url_map.bind('localhost')
+    planned = []
+    skipped = defaultdict(int)
+    start = records[0].time if records else None
+
+    for record in records:
+        path = urlsplit(record.path).path
+
+        try:
+            endpoint, args = adapter.match(path, method=record.method)
+        except HTTPException:
+            endpoint = None
+
+        name = endpoint or 'unknown'
+
+        if record.method not in ('GET', 'HEAD'):
+            name += ' [{}]'.format(record.method)
+
+        offset = (record.time - start).total_seconds() / speed if speed else 0.0
+
+        if endpoint in SKIPPED_ENDPOINTS:
+            skipped[name] += 1
+        elif record.method in ('GET', 'HEAD'):
+            action = 'get'
+            if endpoint and needs_login(app.view_functions[endpoint]):
+                action = 'session'
+            planned.append(ReplayRequest(offset, name, action, record.method, record.path,
+                                         record.status))
+        elif endpoint == 'user.login':
+            planned.append(ReplayRequest(offset, name, 'login', record.method, record.path,
+                                         record.status))
+        elif endpoint == 'competition.submit_vote':
+            planned.append(ReplayRequest(offset, name, 'vote', record.method, record.path,
+                                         record.status))
+        else:
+            # request body unknown
+            skipped[name] += 1
+
+    return planned, dict(skipped)
+
+
+class ClientTarget:
+    """Replay target using the Flask test client of an app with a seeded database."""
+
+    routes = {route.name: route for route in ROUTES}
+
+    def __init__(self, app, sessions, rng, password=BENCH_PASSWORD):
+        self.app = app
+        self.bench = BenchClients(app, sessions, rng, password)
+        self.rng = rng
+
+    def request(self, action, method, path):
+        """Make request and return its status code."""
+        if action == 'login':
+            return self.bench.request(self.routes['login']).status_code
+        elif action == 'vote':
+            return self.bench.request(self.routes['submit_vote']).status_code
+
+        client = self.rng.choice(self.bench.clients) if action == 'session' else \
+            self.app.test_client()
+        return client.open(path, method=method).status_code
+
+
+class HTTPTarget:
+    """Replay target making HTTP requests to a running instance.
+
+    The sessions log in as the users ``bench0``, ``bench1``, etc., who must exist in the
+    instance's database, e.g. seeded with ``flask bench --database-url <url> --requests 0``.
+    Login and vote timings include fetching the form (for its CSRF token and choices).
+
+    """
+
+    def __init__(self, base_url, sessions, rng, password=BENCH_PASSWORD, timeout=30):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.password = password
+        self.rng = rng
+        self.timeout = timeout
+        self.sessions = []
+        self.local = threading.local()
+
+        for i in range(sessions):
+            session = requests.Session()
+            response = self.login(session, 'bench{}'.format(i))
+
+            if response.status_code != 302:
+                raise BenchError("Login as bench{} failed.".format(i))
+
+            self.sessions.append(session)
+
+    def url(self, path):
+        return urljoin(self.base_url, path.lstrip('/'))
+
+    def post_form(self, session, path, data, form_html=None):
+        """Post form data to path, adding the CSRF token of the form page, if it has one."""
+        if form_html is None:
+            form_html = session.get(self.url(path), timeout=self.timeout).text
+
+        token = CSRF_TOKEN.search(form_html)
+
+        if token:
+            data = dict(data, csrf_token=token.group(1))
+
+        return session.post(self.url(path), data=data, allow_redirects=False,
+                            timeout=self.timeout)
+
+    def login(self, session, username):
+        return self.post_form(session, '/users/login',
+                              {'username': username, 'password': self.password})
+
+    def vote(self, session):
+        form_html = session.get(self.url('/submit_vote'), timeout=self.timeout).text
+        fields = [VotingForm.points_to_fields[points]
+                  for points in sorted(VotingForm.points_to_fields, reverse=True)]
+        entry_ids = sorted(set(re.findall(r'<option[^>]*value="(\d+)"', form_html)))
+        return self.post_form(session, '/submit_vote',
+                              dict(zip(fields, self.rng.sample(entry_ids, len(fields)))),
+                              form_html)
+
+    def anonymous(self):
+        # one connection pool per replay thread
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+
+        self.local.session.cookies.clear()
+        return self.local.session
+
+    def request(self, action, method, path):
+        """Make request and return its status code."""
+        if action == 'login':
+            return self.login(self.anonymous(),
+                              'bench{}'.format(self.rng.randrange(len(self.sessions)))
+                              ).status_code
+        elif action == 'vote':
+            return self.vote(self.rng.choice(self.sessions)).status_code
+
+        session = self.rng.choice(self.sessions) if action == 'session' else self.anonymous()
+        return session.request(method, self.url(path), allow_redirects=False,
+                               timeout=self.timeout).status_code
+
+
+def replay(target, planned, workers=1, echo=None):
+    """Replay the planned requests against target.
+
+    Requests are started at their planned offsets by a pool of ``workers`` threads. Returns a
+    dict mapping endpoints to lists of ``(latency, status, original status)`` tuples and the
+    list of delays of the request starts behind the plan (in seconds).
+
+    """
+    samples = defaultdict(list)
+    lags = []
+    lock = threading.Lock()
+
+    def run(request, due):
+        started = time.monotonic()
+
+        try:
+            status = target.request(request.action, request.method, request.path)
+        except Exception as exc:
+            if echo:
+                echo("{} {} failed: {}".format(request.method, request.path, exc))
+            status = None
+
+        elapsed = time.monotonic() - started
+
+        with lock:
+            samples[request.endpoint].append((elapsed, status, request.status))
+            lags.append(max(0.0, started - due))
+
+    start = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i, request in enumerate(planned, 1):
+            due = start + request.offset
+            delay = due - time.monotonic()
+
+            if delay > 0:
+                time.sleep(delay)
+
+            executor.submit(run, request, due)
+
+            if echo and i % 1000 == 0:
+                echo("{} of {} requests started.".format(i, len(planned)))
+
+    return dict(samples), lags
+
+
+def summarize(samples, lags, skipped, elapsed):
+    """Return replay report as a JSON-serializable dict."""
+    endpoints = {}
+
+    for endpoint, rows in sorted(samples.items()):
+        latencies = [row[0] * 1000.0 for row in rows]
+        endpoints[endpoint] = {
+            'requests': len(rows),
+            'errors': sum(1 for row in rows if row[1] is None or row[1] >= 500),
+            'status_changed': sum(1 for row in rows if row[1] != row[2]),
+            'latency_ms': {
+                'p50': rounded(percentile(latencies, 50)),
+                'p95': rounded(percentile(latencies, 95)),
+                'p99': rounded(percentile(latencies, 99)),
+                'max': rounded(max(latencies, default=None)),
+            },
+        }
+
+    return {
+        'created_on': datetime.utcnow().isoformat() + 'Z',
+        'elapsed': rounded(elapsed),
+        'requests': sum(len(rows) for rows in samples.values()),
+        'lag_ms': {
+            'p50': rounded(percentile([lag * 1000.0 for lag in lags], 50)),
+            'p95': rounded(percentile([lag * 1000.0 for lag in lags], 95)),
+        },
+        'skipped': skipped,
+        'endpoints': endpoints,
+    }
@@ -22,10 +22,35 @@ DEBUG = ENV == 'development'
 SQLALCHEMY_DATABASE_URI = env.str('DATABASE_URL')
 SECRET_KEY = env.str('SECRET_KEY')
 BCRYPT_LOG_ROUNDS = env.int('BCRYPT_LOG_ROUNDS', default=13)
+# password hashing pool (per worker process, 0 workers hash in the request thread): number of
+# processes, maximum number of queued operations and seconds to wait for a result
+PASSWORD_POOL_WORKERS = env.int('PASSWORD_POOL_WORKERS', default=2)
+PASSWORD_POOL_MAX_PENDING = env.int('PASSWORD_POOL_MAX_PENDING', default=8)
+PASSWORD_POOL_TIMEOUT = env.float('PASSWORD_POOL_TIMEOUT', default=5.0)
 DEBUG_TB_ENABLED = env.bool('DEBUG_TB_ENABLED', default=DEBUG)
 DEBUG_TB_INTERCEPT_REDIRECTS = False
-CACHE_TYPE = 'simple'  # Can be "memcached", "redis", etc.
+# Can be "memcached", "redis", etc. Use a cache shared by all worker processes (i.e. not
+# "simple") when running more than one, so that invalidated page fragments are not served.
+CACHE_TYPE = env.str('CACHE_TYPE', default='simple')
+CACHE_DIR = env.str('CACHE_DIR', default=None)
+CACHE_REDIS_URL = env.str('CACHE_REDIS_URL', default=None)
+# seconds to keep rendered entry list fragments
+FRAGMENT_CACHE_TIMEOUT = env.int('FRAGMENT_CACHE_TIMEOUT', default=3600)
+# number of entries per page of the entry lists
+ENTRIES_PER_PAGE = env.int('ENTRIES_PER_PAGE', default=20)
+# voting trend: length of the time buckets in seconds and seconds to cache the trend data
+VOTE_TREND_BUCKET_SECONDS = env.int('VOTE_TREND_BUCKET_SECONDS', default=3600)
+VOTE_TREND_CACHE_TIMEOUT = env.int('VOTE_TREND_CACHE_TIMEOUT', default=60)
+# seconds to cache the competition statistics (see 'flask compo refresh-stats')
+STATS_CACHE_TIMEOUT = env.int('STATS_CACHE_TIMEOUT', default=300)
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+# log requests with at least this many SQL queries or milliseconds spent in them
+SQL_SLOW_REQUEST_QUERIES = env.int('SQL_SLOW_REQUEST_QUERIES', default=30)
+SQL_SLOW_REQUEST_MS = env.int('SQL_SLOW_REQUEST_MS', default=500)
+# add X-SQL-Queries, X-SQL-Time and Server-Timing headers to responses
+SQL_DEBUG_HEADERS = env.bool('SQL_DEBUG_HEADERS', default=DEBUG)
+# raise an error instead of logging a warning when a view exceeds its query budget
+SQL_ENFORCE_BUDGETS = env.bool('SQL_ENFORCE_BUDGETS', default=False)
 
 SECURITY_PASSWORD_SALT = env.str('PASSWORD_SALT')
 WTF_CSRF_ENABLED = True
@@ -43,6 +68,19 @@ MAIL_PASSWORD = env.str('APP_MAIL_PASSWORD')
 
 MAIL_DEFAULT_SENDER = env.str('APP_MAIL_DEFAULT_SENDER', default='challenge@osamc.de')
 
+# in-process mail worker pool (per worker process, set threads to 0 to leave all sending to
+# 'flask email worker')
+MAIL_WORKER_THREADS = env.int('MAIL_WORKER_THREADS', default=2)
+MAIL_QUEUE_SIZE = env.int('MAIL_QUEUE_SIZE', default=100)
+MAIL_WORKER_IDLE_TIMEOUT = env.int('MAIL_WORKER_IDLE_TIMEOUT', default=30)
+# email outbox
+MAIL_OUTBOX_LEASE = env.int('MAIL_OUTBOX_LEASE', default=600)
+MAIL_OUTBOX_MAX_ATTEMPTS = env.int('MAIL_OUTBOX_MAX_ATTEMPTS', default=8)
+MAIL_OUTBOX_RETRY_DELAY = env.int('MAIL_OUTBOX_RETRY_DELAY', default=60)
+# reminder campaigns (rate in messages per second, 0 means unlimited)
+MAIL_CAMPAIGN_RATE = env.float('MAIL_CAMPAIGN_RATE', default=2.0)
+MAIL_CAMPAIGN_RENDER_WORKERS = env.int('MAIL_CAMPAIGN_RENDER_WORKERS', default=4)
+
 SITE_AUTHOR = "Open Source Audio Meeting Cologne"
 SITE_TITLE = "Open Source Music Nexus Challenge"
 SITE_URL = "https://nexus-challenge.osamc.de/"
@@ -65,6 +103,22 @@ SOCIAL_BUTTONS_CODE = (
     'https://twitter.com/osamCologne',
 )
 
+# per-process cache of the logged in users: maximum number and seconds to keep them
+USER_CACHE_SIZE = env.int('USER_CACHE_SIZE', default=1000)
+USER_CACHE_TTL = env.int('USER_CACHE_TTL', default=60)
+# directory shared by the worker processes to aggregate the metrics (see 'metrics' module)
+METRICS_DIR = env.str('METRICS_DIR', default=None)
+# whether this process writes its metrics to METRICS_DIR (only set for the application server)
+METRICS_WRITE_FILES = env.bool('METRICS_WRITE_FILES', default=False)
+
+# Archive.org meta data cache
+ARCHIVEORG_CACHE_TTL = env.int('ARCHIVEORG_CACHE_TTL', default=3600)
+ARCHIVEORG_TIMEOUT = env.int('ARCHIVEORG_TIMEOUT', default=30)
+
+# Background jobs (per worker process)
+JOBS_MAX_WORKERS = env.int('JOBS_MAX_WORKERS', default=2)
+JOBS_MAX_PENDING = env.int('JOBS_MAX_PENDING', default=20)
+
 # Competition parameters
 MIN_TRACK_LENGTH = 60.0
 MAX_TRACK_LENGTH = 300.0
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""A minimal local SMTP server, which accepts and discards all messages.
+
+Used as a stand-in for a real mail server when benchmarking and testing email sending. It
+speaks just enough SMTP for ``smtplib`` (including ``AUTH PLAIN``, which is accepted with any
+credentials) and can add a delay to every reply to simulate the latency of a remote server.
+
+"""
+
+# Standard library modules
+import socketserver
+import threading
+import time
+from contextlib import contextmanager
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Handle one SMTP client connection."""
+
+    def reply(self, *lines):
+        """Send (multi-line) reply, each line given as '<code> <text>'."""
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        for i, line in enumerate(lines, 1):
+            sep = ' ' if i == len(lines) else '-'
+            self.wfile.write(line[:3].encode() + sep.encode() + line[4:].encode() + b'\r\n')
+
+    def handle(self):
+        """Answer SMTP commands until the client quits or disconnects."""
+        self.server.count('connections')
+        self.reply('220 localhost SMTP sink ready')
+
+        for line in self.rfile:
+            command = line[:4].upper()
+
+            if command == b'EHLO':
+                self.reply('250 localhost', '250 AUTH PLAIN', '250 8BITMIME')
+            elif command == b'AUTH':
+                self.reply('235 Authentication successful')
+            elif command == b'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+
+                for data in self.rfile:
+                    if data.rstrip(b'\r\n') == b'.':
+                        break
+
+                self.server.count('messages')
+                self.reply('250 Message accepted')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                break
+            else:
+                # HELO, MAIL, RCPT, RSET, NOOP
+                self.reply('250 OK')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """SMTP server accepting any message, counting connections and messages.
+
+    Use ``port=0`` to bind to a free port, which is then available as ``server_address[1]``.
+
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        super().__init__((host, port), SMTPSinkHandler)
+        self.latency = latency
+        self.connections = 0
+        self.messages = 0
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        """Increment the counter with given name."""
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def reset(self):
+        """Reset the connection and message counters."""
+        with self._lock:
+            self.connections = self.messages = 0
+
+    def start(self):
+        """Serve in a background thread."""
+        thread = threading.Thread(target=self.serve_forever, name='smtp-sink', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Stop serving and close the server socket."""
+        self.shutdown()
+        self.server_close()
+
+
+@contextmanager
+def use_smtp_sink(app, latency=0.0):
+    """Run an ``SMTPSink`` and point the Flask-Mail extension of app to it, while in context.
+
+    Yields the running sink.
+
+    """
+    sink = SMTPSink(latency=latency)
+    sink.start()
+    state = app.extensions['mail']
+    saved = {name: getattr(state, name)
+             for name in ('server', 'port', 'use_tls', 'use_ssl', 'suppress')}
+
+    try:
+        state.server, state.port = sink.server_address
+        state.use_tls = state.use_ssl = state.suppress = False
+        yield sink
+    finally:
+        for name, value in saved.items():
+            setattr(state, name, value)
+
+        sink.stop()
@@ -0,0 +1,31 @@
+/*
+ * Click-to-load archive.org players.
+ *
+ * Replaces the placeholder of a player rendered in lite mode (see 'archiveorg_player' in
+ * utils.py) with the player iframe, when its play button is clicked.
+ */
+(function ($) {
+    var preconnected = false;
+
+    // start connecting to archive.org, when a visitor is about to play a track
+    $(document).on('mouseover focusin', '.archiveorg-player-lite', function () {
+        if (!preconnected) {
+            $('<link rel="preconnect" href="https://archive.org">').appendTo('head');
+            preconnected = true;
+        }
+    });
+
+    $(document).on('click', '.archiveorg-player-lite .archiveorg-player-play', function (event) {
+        var placeholder = $(this).closest('.archiveorg-player-lite');
+        var src = placeholder.data('src');
+
+        event.preventDefault();
+        $('<iframe class="archiveorg-player" frameborder="0" allow="autoplay" ' +
+          'allowfullscreen webkitallowfullscreen="true" mozallowfullscreen="true"></iframe>')
+            .attr('id', placeholder.attr('id'))
+            .attr('src', src + (src.indexOf('?') < 0 ? '?' : '&') + 'autoplay=1')
+            .attr('width', placeholder.data('width'))
+            .attr('height', placeholder.data('height'))
+            .replaceAll(placeholder);
+    });
+})(jQuery);
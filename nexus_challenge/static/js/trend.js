@@ -0,0 +1,95 @@
+// Voting trend chart: draws the total points of each entry over time as an SVG line chart
+(function ($) {
+    'use strict';
+
+    var SVG_NS = 'http://www.w3.org/2000/svg',
+        WIDTH = 800,
+        HEIGHT = 400,
+        MARGIN = 40;
+
+    function svgElement(name, attrs) {
+        var element = document.createElementNS(SVG_NS, name);
+
+        $.each(attrs, function (key, value) {
+            element.setAttribute(key, value);
+        });
+        return element;
+    }
+
+    function drawChart(container, data) {
+        var times = $.map(data.times, function (time) { return Date.parse(time); }),
+            first = times[0],
+            last = times[times.length - 1],
+            maxPoints = 1,
+            svg = svgElement('svg', {
+                viewBox: '0 0 ' + WIDTH + ' ' + HEIGHT,
+                width: '100%',
+                role: 'img'
+            });
+
+        $.each(data.entries, function (i, entry) {
+            maxPoints = Math.max.apply(Math, [maxPoints].concat(entry.points));
+        });
+
+        function x(time) {
+            var fraction = last > first ? (time - first) / (last - first) : 1;
+
+            return MARGIN + (WIDTH - 2 * MARGIN) * fraction;
+        }
+
+        function y(points) {
+            return HEIGHT - MARGIN - (HEIGHT - 2 * MARGIN) * points / maxPoints;
+        }
+
+        svg.appendChild(svgElement('line', {
+            x1: MARGIN, y1: y(0), x2: WIDTH - MARGIN, y2: y(0), stroke: '#999'
+        }));
+        svg.appendChild(svgElement('line', {
+            x1: MARGIN, y1: y(0), x2: MARGIN, y2: y(maxPoints), stroke: '#999'
+        }));
+
+        $.each([0, maxPoints], function (i, points) {
+            var label = svgElement('text', {x: MARGIN - 5, y: y(points) + 4, 'text-anchor': 'end'});
+
+            label.textContent = points;
+            svg.appendChild(label);
+        });
+
+        $.each(data.entries, function (i, entry) {
+            var coords = $.map(entry.points, function (points, j) {
+                    return x(times[j]).toFixed(1) + ',' + y(points).toFixed(1);
+                }),
+                line = svgElement('polyline', {
+                    points: coords.join(' '),
+                    fill: 'none',
+                    stroke: 'hsl(' + Math.round(i * 360 / data.entries.length) + ', 60%, 45%)',
+                    'stroke-width': 2
+                }),
+                title = svgElement('title', {});
+
+            title.textContent = '“' + entry.title + '” by ' + entry.artist + ': ' +
+                entry.points[entry.points.length - 1] + ' points';
+            line.appendChild(title);
+            svg.appendChild(line);
+        });
+
+        container.empty().append(svg);
+    }
+
+    $(function () {
+        var container = $('#voting-trend');
+
+        $.getJSON(container.data('url'))
+            .done(function (data) {
+                if (data.times.length < 2) {
+                    container.find('.voting-trend-status').text('No votes have been cast yet.');
+                } else {
+                    drawChart(container, data);
+                }
+            })
+            .fail(function () {
+                container.find('.voting-trend-status')
+                    .text('The voting trend could not be loaded.');
+            });
+    });
+}(jQuery));
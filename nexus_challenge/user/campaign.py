@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""Email campaigns, i.e. the same kind of email sent to many recipients at once.
+
+A campaign renders the emails in a small thread pool and sends them over a single SMTP
+connection, optionally limited to a maximum rate (config ``MAIL_CAMPAIGN_RATE``).
+
+Every email sent successfully is recorded in the ``email_campaign_log`` table under the name of
+the campaign. When a campaign with the same name is run again, e.g. after it was interrupted or
+some emails failed, recipients who already got the email are skipped. An email sent just before
+a crash, but not yet logged, may be sent twice, but no more than one per crash.
+
+"""
+
+# Standard library modules
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# Third-party modules
+from flask import current_app, render_template
+from sqlalchemy.exc import IntegrityError
+
+# Application specific modules
+from nexus_challenge.database import db
+
+from .email import SMTPSender, make_message
+from .models import CampaignSend
+
+
+CampaignEmail = namedtuple('CampaignEmail', 'key recipient subject template context')
+CampaignEmail.__doc__ = """\
+One email of a campaign.
+
+``key`` identifies the recipient in the campaign log (e.g. the plain email address),
+``recipient`` is the address the email is sent to and ``template`` is rendered with
+``context`` to get the HTML body. Since emails are rendered in other threads, ORM objects in
+the context must be fully loaded and detached from the session (see ``db.session.expunge``),
+so they are neither lazy-loaded nor expired by commits of the sending thread.
+
+"""
+
+CampaignResult = namedtuple('CampaignResult', 'sent failed skipped elapsed')
+
+
+class RateLimiter:
+    """Space out calls to ``wait`` to at most ``rate`` per second (0 or None: unlimited)."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._next = None
+
+    def wait(self):
+        """Block until the next call is allowed."""
+        if not self.interval:
+            return
+
+        now = time.monotonic()
+
+        if self._next is not None and now < self._next:
+            time.sleep(self._next - now)
+            now = self._next
+
+        self._next = now + self.interval
+
+
+def render_emails(emails, workers=1):
+    """Render bodies of campaign emails in a pool of threads.
+
+    Yields ``(email, body, exception)`` tuples in the order of ``emails``. ``body`` is ``None``
+    and ``exception`` is set, if rendering failed.
+
+    """
+    app = current_app._get_current_object()
+
+    def render(email):
+        try:
+            with app.test_request_context():
+                return email, render_template(email.template, **email.context), None
+        except Exception as exc:
+            return email, None, exc
+
+    if workers <= 1:
+        yield from map(render, emails)
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='render') as pool:
+            yield from pool.map(render, emails)
+
+
+def get_sent_keys(campaign):
+    """Return set of recipient keys, which were already sent the email of given campaign."""
+    query = db.session.query(CampaignSend.recipient).filter_by(campaign=campaign)
+    return {row.recipient for row in query}
+
+
+def log_sent(campaign, key):
+    """Record in the campaign log, that the email for given recipient key was sent."""
+    try:
+        CampaignSend.create(campaign=campaign, recipient=key)
+    except IntegrityError:
+        # another run of the same campaign got there first
+        db.session.rollback()
+
+
+def run_campaign(campaign, emails, sender=None, rate=None, render_workers=None, dry_run=False,
+                 echo=None):
+    """Send list of ``CampaignEmail`` instances as part of campaign with given name.
+
+    Emails whose recipient key is already in the log of the campaign are skipped. If
+    ``campaign`` is ``None``, nothing is looked up or logged.
+
+    ``rate`` and ``render_workers`` default to config ``MAIL_CAMPAIGN_RATE`` and
+    ``MAIL_CAMPAIGN_RENDER_WORKERS``. If no SMTP ``sender`` is given, a new ``SMTPSender`` is
+    used and closed afterwards. If ``dry_run`` is true, emails are only rendered and passed to
+    ``echo``, a function called with a status message for every email.
+
+    Returns a ``CampaignResult`` with the number of emails sent, failed and skipped and the
+    elapsed time in seconds.
+
+    """
+    app = current_app._get_current_object()
+    rate = app.config['MAIL_CAMPAIGN_RATE'] if rate is None else rate
+    render_workers = render_workers or app.config['MAIL_CAMPAIGN_RENDER_WORKERS']
+    echo = echo or (lambda msg: None)
+
+    started = time.monotonic()
+    done = get_sent_keys(campaign) if campaign else set()
+    todo = [email for email in emails if email.key not in done]
+    sent = failed = 0
+    close_sender = sender is None
+    sender = sender or SMTPSender()
+    limiter = RateLimiter(rate)
+
+    try:
+        for email, body, exc in render_emails(todo, render_workers):
+            if exc is not None:
+                app.logger.error("Error rendering email to '%s': %s", email.recipient, exc)
+                echo("Could not render email to '{}'. See log for details.".format(
+                     email.recipient))
+                failed += 1
+                continue
+
+            if dry_run:
+                echo("\nTo: {}\nSubject: {}\n\n{}\n".format(email.recipient, email.subject, body))
+                continue
+
+            limiter.wait()
+
+            try:
+                sender.send(make_message(app, email.recipient, email.subject, body))
+            except Exception:
+                app.logger.exception("Error sending email to '%s'.", email.recipient)
+                echo("Could not send email to '{}'. See log for details.".format(
+                     email.recipient))
+                failed += 1
+            else:
+                if campaign:
+                    log_sent(campaign, email.key)
+
+                echo("Email sent to '{}'.".format(email.recipient))
+                sent += 1
+    finally:
+        if close_sender:
+            sender.close()
+
+    return CampaignResult(sent, failed, len(emails) - len(todo), time.monotonic() - started)
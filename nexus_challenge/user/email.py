@@ -1,35 +1,315 @@
 # -*- coding: utf-8 -*-
-"""User blueprint email helper module."""
+"""User blueprint email helper module.
+
+Emails are not sent directly from views. ``start_send_email_task`` writes them to the
+``email_outbox`` table, from where they are sent either right away by the in-process
+``MailWorker`` thread pool or, if that is disabled or sending fails, by the
+``flask email worker`` command, which retries failed emails with exponential backoff.
+
+"""
 
 # Standard library modules
-from multiprocessing import get_context
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
 
 # Third-party modules
 from flask import current_app
 from flask_mail import Message
 
 # Application specific modules
-from nexus_challenge.extensions import mail
-
-
-def send_email(app, recipient, subject, template):
-    """Send email to recipient with subject using template."""
-    with app.app_context():
-        msg = Message(
-            subject,
-            recipients=[recipient],
-            html=template,
-            sender=app.config.get('MAIL_DEFAULT_SENDER', 'noreply@example.com')
-        )
+from nexus_challenge.database import db
+from nexus_challenge.extensions import mail, metrics
+from nexus_challenge.metrics import MAIL_SEND_DURATION, MAIL_SEND_FAILURES
+
+from .models import OutgoingEmail
+
+
+def make_message(app, recipient, subject, template):
+    """Create HTML email message to recipient with subject using template."""
+    return Message(
+        subject,
+        recipients=[recipient],
+        html=template,
+        sender=app.config.get('MAIL_DEFAULT_SENDER', 'noreply@example.com')
+    )
+
+
+class SMTPSender:
+    """Send messages over a lazily opened SMTP connection, which is kept open.
+
+    If sending over a re-used connection fails, the message is retried once over a new
+    connection, since the server may have closed the old one in the meantime.
+
+    """
+
+    def __init__(self):
+        self.conn = None
+        self.last_used = None
+
+    def send(self, msg):
+        """Send message, (re-)connecting if necessary."""
+        for attempt in (1, 2):
+            is_new = self.conn is None
+            started = time.perf_counter()
+
+            try:
+                if is_new:
+                    self.conn = mail.connect().__enter__()
+                self.conn.send(msg)
+            except Exception:
+                metrics.observe(MAIL_SEND_DURATION, time.perf_counter() - started,
+                                result='failed')
+                metrics.inc(MAIL_SEND_FAILURES)
+                self.close()
+
+                if is_new or attempt == 2:
+                    raise
+            else:
+                self.last_used = time.monotonic()
+                metrics.observe(MAIL_SEND_DURATION, time.perf_counter() - started, result='sent')
+                return
+
+    def close(self):
+        """Close SMTP connection, if it is open."""
+        if self.conn is not None:
+            try:
+                self.conn.__exit__(None, None, None)
+            except Exception as exc:
+                current_app.logger.debug("Error closing SMTP connection: %s", exc)
+
+        self.conn = None
+
+
+def claim_email(email_id, now=None):
+    """Lease outbox email with given id for sending, if it is due.
+
+    Returns whether the email could be claimed. Claiming increments the number of attempts
+    and moves the time of the next attempt past the lease period (config
+    ``MAIL_OUTBOX_LEASE``), so no other process sends it concurrently and it is retried
+    automatically, should the sender die before recording the outcome.
+
+    """
+    now = now or datetime.utcnow()
+    lease = timedelta(seconds=current_app.config['MAIL_OUTBOX_LEASE'])
+    count = (
+        OutgoingEmail.query
+        .filter(OutgoingEmail.id == email_id,
+                OutgoingEmail.status == OutgoingEmail.STATUS_PENDING,
+                OutgoingEmail.next_attempt_on <= now)
+        .update({OutgoingEmail.next_attempt_on: now + lease,
+                 OutgoingEmail.attempts: OutgoingEmail.attempts + 1},
+                synchronize_session=False)
+    )
+    db.session.commit()
+    return count == 1
+
+
+def send_outgoing_email(sender, email):
+    """Send claimed outbox email with given SMTP sender and record the outcome.
+
+    Failed emails are scheduled for another attempt with exponential backoff (based on
+    config ``MAIL_OUTBOX_RETRY_DELAY``), until ``MAIL_OUTBOX_MAX_ATTEMPTS`` is reached.
+
+    Returns whether the email was sent.
+
+    """
+    config = current_app.config
+
+    try:
+        sender.send(make_message(current_app, email.recipient, email.subject, email.html))
+    except Exception as exc:
+        current_app.logger.warning("Failed to send email with subject '%s' to '%s' "
+                                   "(attempt %i): %s", email.subject, email.recipient,
+                                   email.attempts, exc)
+        email.last_error = str(exc)
+
+        if email.attempts >= config['MAIL_OUTBOX_MAX_ATTEMPTS']:
+            email.status = OutgoingEmail.STATUS_FAILED
+            current_app.logger.error("Giving up sending email with subject '%s' to '%s'.",
+                                     email.subject, email.recipient)
+        else:
+            delay = config['MAIL_OUTBOX_RETRY_DELAY'] * 2 ** (email.attempts - 1)
+            email.next_attempt_on = datetime.utcnow() + timedelta(seconds=delay)
+
+        sent = False
+    else:
+        email.status = OutgoingEmail.STATUS_SENT
+        email.sent_on = datetime.utcnow()
+        email.last_error = None
+        sent = True
+
+    email.save()
+    return sent
+
+
+def drain_outbox(sender, batch_size=50):
+    """Send up to batch_size due emails from the outbox with given SMTP sender.
+
+    Returns a ``(sent, failed)`` tuple with the number of emails sent and failed.
+
+    """
+    now = datetime.utcnow()
+    due = (
+        db.session.query(OutgoingEmail.id)
+        .filter(OutgoingEmail.status == OutgoingEmail.STATUS_PENDING,
+                OutgoingEmail.next_attempt_on <= now)
+        .order_by(OutgoingEmail.next_attempt_on)
+        .limit(batch_size)
+    )
+    sent = failed = 0
+
+    for email_id in [row.id for row in due]:
+        if claim_email(email_id, now):
+            if send_outgoing_email(sender, OutgoingEmail.get_by_id(email_id)):
+                sent += 1
+            else:
+                failed += 1
+
+    return sent, failed
+
+
+class MailWorker:
+    """Send emails from the outbox right away in a pool of worker threads.
+
+    Each worker thread keeps its SMTP connection open between messages and closes it after
+    ``MAIL_WORKER_IDLE_TIMEOUT`` seconds without messages to send.
+
+    At most ``MAIL_QUEUE_SIZE`` emails may be waiting. Emails which could not be queued or sent
+    stay in the outbox for ``flask email worker``. With ``MAIL_WORKER_THREADS`` set to 0, no
+    emails are sent in-process at all.
+
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._queue = None
+        self._threads = []
+        self._pid = None
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Set config defaults and register the worker with the app."""
+        app.config.setdefault('MAIL_WORKER_THREADS', 2)
+        app.config.setdefault('MAIL_QUEUE_SIZE', 100)
+        app.config.setdefault('MAIL_WORKER_IDLE_TIMEOUT', 30)
+        app.config.setdefault('MAIL_OUTBOX_LEASE', 600)
+        app.config.setdefault('MAIL_OUTBOX_MAX_ATTEMPTS', 8)
+        app.config.setdefault('MAIL_OUTBOX_RETRY_DELAY', 60)
+        app.config.setdefault('MAIL_CAMPAIGN_RATE', 2.0)
+        app.config.setdefault('MAIL_CAMPAIGN_RENDER_WORKERS', 4)
+        app.extensions['mail_worker'] = self
+
+    @property
+    def queue_depth(self):
+        """Number of emails waiting to be sent in this process."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _start(self, app):
+        # Threads don't survive a fork, so (re-)start them lazily in each worker process
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            self._queue = queue.Queue(maxsize=app.config['MAIL_QUEUE_SIZE'])
+            self._threads = []
+
+            for i in range(app.config['MAIL_WORKER_THREADS']):
+                thread = threading.Thread(target=self._run, args=(app, self._queue),
+                                          name='mail-worker-%i' % i, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+            self._pid = os.getpid()
+
+    def submit(self, email_id, app=None):
+        """Queue outbox email with given id to be sent by a worker thread.
+
+        Returns ``False``, if the email was left in the outbox, because the queue is full or
+        no worker threads are configured.
+
+        """
+        app = app or current_app._get_current_object()
+
+        if not app.config['MAIL_WORKER_THREADS']:
+            return False
+
+        self._start(app)
+
         try:
-            mail.send(msg)
-        except Exception:
-            app.logger.exception("Failed to send email with subject '%s' to '%s'.",
-                                 subject, recipient)
+            self._queue.put_nowait(email_id)
+        except queue.Full:
+            app.logger.warning("Mail queue full, leaving email %i in outbox.", email_id)
+            return False
+
+        return True
+
+    def shutdown(self, timeout=10.0):
+        """Stop worker threads after they have sent all queued emails."""
+        if self._pid != os.getpid():
+            return
+
+        for thread in self._threads:
+            self._queue.put(None)
+
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+
+        self._pid = None
+
+    def _run(self, app, email_queue):
+        with app.app_context():
+            sender = SMTPSender()
+            idle_timeout = app.config['MAIL_WORKER_IDLE_TIMEOUT']
+
+            while True:
+                try:
+                    email_id = email_queue.get(timeout=idle_timeout if sender.conn else None)
+                except queue.Empty:
+                    sender.close()
+                    continue
+
+                if email_id is None:
+                    sender.close()
+                    break
+
+                try:
+                    if claim_email(email_id):
+                        send_outgoing_email(sender, OutgoingEmail.get_by_id(email_id))
+                except Exception:
+                    app.logger.exception("Error sending email %i from outbox.", email_id)
+                finally:
+                    db.session.remove()
+                    email_queue.task_done()
+
+
+mail_worker = MailWorker()
+atexit.register(mail_worker.shutdown)
+
+
+@metrics.collector
+def outbox_gauges():
+    """Number of emails in the outbox by status for the metrics."""
+    counts = dict(db.session.query(OutgoingEmail.status, db.func.count(OutgoingEmail.id))
+                  .group_by(OutgoingEmail.status))
+    statuses = (OutgoingEmail.STATUS_PENDING, OutgoingEmail.STATUS_SENT,
+                OutgoingEmail.STATUS_FAILED)
+    return [('nexus_mail_outbox_emails', "Emails in the outbox by status.",
+             [({'status': status}, counts.get(status, 0)) for status in statuses])]
 
 
 def start_send_email_task(recipient, subject, template):
-    ctx = get_context('fork')
-    proc = ctx.Process(target=send_email, args=(current_app, recipient, subject, template),
-                       daemon=True)
-    proc.start()
+    """Put HTML email to recipient with subject using template into the outbox.
+
+    The email is committed to the database together with any other pending changes of the
+    current session and then handed to the in-process mail worker for sending.
+
+    """
+    email = OutgoingEmail.create(recipient=recipient, subject=subject, html=template)
+    mail_worker.submit(email.id)
+    return email
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Cached loading of the logged in user.
+
+Flask-Login loads the user for every request of a logged in visitor, i.e. for most requests
+during the voting period. Instead of the ``User`` model instance, ``load_user`` returns a
+compact, read-only ``UserSnapshot`` with the columns needed to render pages and check
+permissions, which is kept in a per-process LRU cache for ``USER_CACHE_TTL`` seconds.
+
+Views which change the logged in user must fetch the model instance with
+``User.get_by_id(current_user.id)``. ``User.save`` and ``User.update`` remove the user from
+the cache of the process making the change, other worker processes see it after at most
+``USER_CACHE_TTL`` seconds.
+
+"""
+
+# Standard library modules
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# Third-party modules
+from flask_login import UserMixin
+
+
+#: ``User`` columns kept in a snapshot
+SNAPSHOT_COLUMNS = ('id', 'username', 'email', 'first_name', 'last_name', 'is_active',
+                    'is_admin', 'is_confirmed')
+
+
+class UserSnapshot(namedtuple('UserSnapshot', SNAPSHOT_COLUMNS), UserMixin):
+    """Read-only copy of the columns of a ``User`` for ``current_user``."""
+
+    @property
+    def full_name(self):
+        """Full user name."""
+        return '{0} {1}'.format(self.first_name, self.last_name)
+
+    def __repr__(self):
+        """Represent instance as a unique string."""
+        return '<UserSnapshot({username!r})>'.format(username=self.username)
+
+
+class UserCache:
+    """Per-process LRU cache of user snapshots, which expire after a number of seconds.
+
+    The cache is emptied when initialized with an app. ``USER_CACHE_SIZE`` is the maximum
+    number of users cached, ``USER_CACHE_TTL`` the maximum age of a snapshot in seconds (0
+    disables the cache).
+
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._snapshots = OrderedDict()
+        self.maxsize = 1000
+        self.ttl = 60
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Set config defaults, register the cache with the app and empty it."""
+        app.config.setdefault('USER_CACHE_SIZE', 1000)
+        app.config.setdefault('USER_CACHE_TTL', 60)
+        app.extensions['user_cache'] = self
+        self.maxsize = app.config['USER_CACHE_SIZE']
+        self.ttl = app.config['USER_CACHE_TTL']
+        self.clear()
+
+    def __len__(self):
+        return len(self._snapshots)
+
+    def get(self, user_id, load):
+        """Return snapshot of user with given id, calling ``load(user_id)``, if not cached.
+
+        ``load`` must return a ``UserSnapshot`` or ``None``, if there is no such user (which is
+        not cached).
+
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            cached = self._snapshots.get(user_id)
+
+            if cached is not None and cached[0] > now:
+                self._snapshots.move_to_end(user_id)
+                return cached[1]
+
+        snapshot = load(user_id)
+
+        if snapshot is not None and self.ttl > 0:
+            with self._lock:
+                self._snapshots[user_id] = (now + self.ttl, snapshot)
+                self._snapshots.move_to_end(user_id)
+
+                while len(self._snapshots) > self.maxsize:
+                    self._snapshots.popitem(last=False)
+
+        return snapshot
+
+    def invalidate(self, user_id):
+        """Remove snapshot of user with given id from the cache."""
+        with self._lock:
+            self._snapshots.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._snapshots.clear()
+
+
+user_cache = UserCache()
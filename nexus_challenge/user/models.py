@@ -10,7 +10,9 @@ from sqlalchemy.ext.hybrid import hybrid_property
 
 # Application specific modules
 from nexus_challenge.database import Column, Model, SurrogatePK, db, reference_col, relationship
-from nexus_challenge.extensions import bcrypt
+from nexus_challenge.extensions import password_hasher
+
+from .loader import SNAPSHOT_COLUMNS, UserSnapshot, user_cache
 
 
 class Role(SurrogatePK, Model):
@@ -53,18 +55,79 @@ class User(SurrogatePK, Model, UserMixin):
 
     @password.setter
     def password(self, value):
-        """Set password."""
-        self.hashed_password = bcrypt.generate_password_hash(value)
+        """Set password (hashed in the password hashing pool)."""
+        self.hashed_password = password_hasher.generate(value)
 
     def check_password(self, value):
-        """Check password."""
-        return bcrypt.check_password_hash(self.password, value)
+        """Check password (in the password hashing pool)."""
+        return password_hasher.check(self.password, value)
 
     @property
     def full_name(self):
         """Full user name."""
         return '{0} {1}'.format(self.first_name, self.last_name)
 
+    @classmethod
+    def get_snapshot(cls, user_id):
+        """Return ``UserSnapshot`` of user with given id or ``None``, if it does not exist."""
+        row = (db.session.query(*[getattr(cls, column) for column in SNAPSHOT_COLUMNS])
+               .filter(cls.id == user_id).first())
+        return UserSnapshot(*row) if row else None
+
+    def update(self, commit=True, **kwargs):
+        """Update specific fields and remove the user from the user cache."""
+        result = super().update(commit=commit, **kwargs)
+        user_cache.invalidate(self.id)
+        return result
+
+    def save(self, commit=True):
+        """Save the user and remove it from the user cache."""
+        result = super().save(commit=commit)
+        user_cache.invalidate(self.id)
+        return result
+
     def __repr__(self):
         """Represent instance as a unique string."""
         return '<User({username!r})>'.format(username=self.username)
+
+
+class OutgoingEmail(SurrogatePK, Model):
+    """An email waiting in (or sent from) the outbox."""
+
+    __tablename__ = 'email_outbox'
+    recipient = Column(db.String(255), nullable=False)
+    subject = Column(db.String(255), nullable=False)
+    html = Column(db.Text, nullable=False)
+    status = Column(db.String(20), nullable=False, default='pending', index=True)
+    attempts = Column(db.Integer, nullable=False, default=0)
+    last_error = Column(db.Text)
+    created_on = Column(db.DateTime, nullable=False, default=dt.datetime.utcnow)
+    next_attempt_on = Column(db.DateTime, nullable=False, default=dt.datetime.utcnow)
+    sent_on = Column(db.DateTime)
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+
+    def __repr__(self):
+        """Represent instance as a unique string."""
+        return '<OutgoingEmail({recipient!r}, {subject!r}, {status})>'.format(
+            recipient=self.recipient, subject=self.subject, status=self.status)
+
+
+class CampaignSend(SurrogatePK, Model):
+    """Log entry for an email sent to a recipient as part of a campaign (e.g. a reminder)."""
+
+    __tablename__ = 'email_campaign_log'
+    __table_args__ = (
+        db.UniqueConstraint('campaign', 'recipient'),
+        {'extend_existing': True},
+    )
+    campaign = Column(db.String(80), nullable=False, index=True)
+    recipient = Column(db.String(255), nullable=False)
+    sent_on = Column(db.DateTime, nullable=False, default=dt.datetime.utcnow)
+
+    def __repr__(self):
+        """Represent instance as a unique string."""
+        return '<CampaignSend({campaign!r}, {recipient!r})>'.format(
+            campaign=self.campaign, recipient=self.recipient)
@@ -17,6 +17,7 @@ from nexus_challenge.utils import in_submission_period, in_voting_period
 from .decorators import check_confirmed
 from .email import start_send_email_task
 from .forms import ChangePasswordForm, ForgotForm, LoginForm, RegisterForm
+from .loader import user_cache
 from .models import User
 from .token import confirm_token, generate_confirmation_token
 
@@ -26,8 +27,8 @@ blueprint = Blueprint('user', __name__, url_prefix='/users', static_folder='../s
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Load user by ID."""
-    return User.get_by_id(int(user_id))
+    """Load (cached) read-only snapshot of user by ID (see ``loader`` module)."""
+    return user_cache.get(int(user_id), User.get_snapshot)
 
 
 @blueprint.route('/')
@@ -43,13 +44,6 @@ def register():
     form = RegisterForm(request.form)
 
     if form.validate_on_submit():
-        token = generate_confirmation_token(form.email.data)
-        confirm_url = url_for('user.confirm_email', token=token, _external=True, _scheme='https')
-        html = render_template('users/activate.html', confirm_url=confirm_url)
-        subject = 'Please confirm your email'
-        start_send_email_task(form.email.data, subject, html)
-        flash('A confirmation email has been sent to {}.'.format(form.email.data), 'success')
-
         user = User.create(
             username=form.username.data,
             email=form.email.data,
@@ -57,6 +51,14 @@ def register():
             is_active=True,
             is_confirmed=False
         )
+
+        token = generate_confirmation_token(form.email.data)
+        confirm_url = url_for('user.confirm_email', token=token, _external=True, _scheme='https')
+        html = render_template('users/activate.html', confirm_url=confirm_url)
+        subject = 'Please confirm your email'
+        start_send_email_task(form.email.data, subject, html)
+        flash('A confirmation email has been sent to {}.'.format(form.email.data), 'success')
+
         login_user(user)
         return redirect(url_for('user.unconfirmed'))
 
@@ -83,15 +85,11 @@ def login():
     """Handle login form."""
     form = LoginForm(request.form)
 
+    # the form has checked the password and loaded the user
     if form.validate_on_submit():
-        user = User.query.filter_by(username=form.username.data).first()
-        if user and user.check_password(request.form['password']):
-            login_user(user)
-            flash('You are logged in.', 'success')
-            return form.redirect()
-        else:
-            flash('Invalid email and/or password.', 'danger')
-            return render_template('users/login.html', form=form)
+        login_user(form.user)
+        flash('You are logged in.', 'success')
+        return form.redirect()
 
     return render_template('users/login.html', form=form)
 
@@ -113,7 +111,8 @@ def profile():
     form = ChangePasswordForm(request.form)
 
     if form.validate_on_submit():
-        user = User.query.filter_by(email=current_user.username).first()
+        # current_user is a read-only snapshot
+        user = User.get_by_id(current_user.id)
 
         if user:
             user.update(password=form.password.data)
@@ -194,8 +193,8 @@ def forgot():
         reset_url = url_for('user.forgot_new', token=token, _external=True, _scheme='https')
         html = render_template('users/reset.html', username=user.email, reset_url=reset_url)
         subject = 'Reset your password'
+        user.update(password_reset_token=token, commit=False)
         start_send_email_task(user.email, subject, html)
-        user.update(password_reset_token=token)
         flash('A password reset email has been sent via email.', 'success')
         return redirect(url_for('public.home'))
 
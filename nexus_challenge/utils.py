@@ -2,11 +2,16 @@
 """Helper utilities and decorators."""
 
 # Standard library modules
+from functools import lru_cache
 from posixpath import basename
 from urllib.parse import urlencode, urlparse
 
 # Third-party modules
 from flask import current_app, flash, render_template
+from markupsafe import escape
+
+# Application specific modules
+from .extensions import misaka
 
 
 TMPL_IFRAME = """\
@@ -19,9 +24,36 @@ TMPL_IFRAME = """\
 and Iframe embedding from archive.org.</p>
 """
 
+# placeholder of the player in lite mode, see 'static/js/player.js'
+TMPL_LITE = """\
+<div class="archiveorg-player-lite" id="{id}" data-src="{url}" data-width="{width}"
+  data-height="{height}" style="min-height: {height}px">
+  <a class="archiveorg-player-play" href="{details_url}" target="_new" role="button"
+    title="Play {title}" aria-label="Play {title}">&#9654;</a>
+  <span class="archiveorg-player-title">{title}</span>
+  <span class="archiveorg-player-duration">{duration}</span>
+</div>
+"""
+
+
+@lru_cache(maxsize=1024)
+def render_lite_player(url, details_url, id, width, height, title, duration):
+    """Render placeholder of player in lite mode (memoised, since it only depends on args)."""
+    return TMPL_LITE.format(
+        url=escape(url), details_url=escape(details_url), id=escape(id), width=escape(width),
+        height=escape(height), title=escape(title),
+        duration=format_duration(duration) if duration else '')
+
 
 def archiveorg_player(url, **options):
-    """Generate HTML snippet to embed archive.org audio / video player."""
+    """Generate HTML snippet to embed archive.org audio / video player.
+
+    With the ``lite`` option, a static placeholder showing the ``title`` and ``duration`` (in
+    seconds) options and a play button is rendered instead, which is replaced by the player,
+    when the button is clicked. This saves the visitor's browser from loading a player for each
+    entry of a list.
+
+    """
     options = options or {}
     opts = {
         'id': 'archiveorg_player',
@@ -44,11 +76,16 @@ def archiveorg_player(url, **options):
     if "poster" in opts:
         params['poster'] = opts['poster']
 
-    url = "https://archive.org/embed/" + canonify_track_url(url)[1]
+    details_url, track_id = canonify_track_url(url)
+    url = "https://archive.org/embed/" + track_id
 
     if params:
         url += '?' + urlencode(params)
 
+    if opts.get('lite'):
+        return render_lite_player(url, details_url, opts['id'], opts['width'], opts['height'],
+                                  opts.get('title') or track_id, opts.get('duration'))
+
     return render_template('archiveorgplayer.html', url=url, **opts)
 
 
@@ -104,5 +141,13 @@ def inject_site_info():
     )
 
 
+def render_markdown(text, autolink=True, **options):
+    """Render Markdown text to HTML like the 'markdown' template filter does."""
+    if text is None:
+        return None
+
+    return str(misaka.render(text, autolink=autolink, **options))
+
+
 def to_bool(val, true_values=('1', 'on', 't', 'true', 'y', 'yes')):
     return str(val).strip().lower() in true_values
@@ -1,15 +1,21 @@
 # -*- coding: utf-8 -*-
 """Defines fixtures available to all tests."""
 
+# Standard library modules
+import datetime as dt
+
 # Third-party modules
 import pytest
 from webtest import TestApp
 
 # Application specific modules
 from nexus_challenge.app import create_app
+from nexus_challenge.competition import archiveorg
 from nexus_challenge.database import db as _db
+from nexus_challenge.querystats import max_queries
 
 from .factories import UserFactory
+from .helpers import make_metadata
 
 
 @pytest.fixture
@@ -50,3 +56,37 @@ def user(db):
     user = UserFactory(password='myprecious')
     db.session.commit()
     return user
+
+
+@pytest.fixture
+def assert_max_queries(db):
+    """Context manager failing the test, when more than the given number of queries is made."""
+    return max_queries
+
+
+@pytest.fixture
+def voting_period(app):
+    """Configure a voting period, which is currently running."""
+    now = dt.datetime.utcnow()
+    app.config['SUBMISSION_PERIOD_START'] = now - dt.timedelta(days=14)
+    app.config['VOTING_PERIOD_START'] = now - dt.timedelta(days=1)
+    app.config['VOTING_PERIOD_END'] = now + dt.timedelta(days=6)
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    """Record calls to fetch_item_metadata and return canned responses."""
+    calls = []
+    responses = []
+
+    def fake_fetch(track_id, etag=None, timeout=30):
+        calls.append((track_id, etag))
+        response = responses.pop(0) if responses else (make_metadata(), '"etag1"')
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(archiveorg, 'fetch_item_metadata', fake_fetch)
+    fake_fetch.calls = calls
+    fake_fetch.responses = responses
+    return fake_fetch
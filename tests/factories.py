@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
 """Factories to help in tests."""
 
+# Standard library modules
+import datetime as dt
+
 # Third-party modules
-from factory import Sequence
+from factory import LazyFunction, Sequence, SubFactory
 from factory.alchemy import SQLAlchemyModelFactory
 
 # Application specific modules
+from nexus_challenge.competition.models import CompetitionEntry, Vote
 from nexus_challenge.database import db
 from nexus_challenge.user.models import User
 
@@ -32,3 +36,36 @@ class UserFactory(BaseFactory):
         """Factory configuration."""
 
         model = User
+
+
+class CompetitionEntryFactory(BaseFactory):
+    """Competition entry factory."""
+
+    title = Sequence(lambda n: 'Track {0}'.format(n))
+    artist = Sequence(lambda n: 'Artist {0}'.format(n))
+    url = Sequence(lambda n: 'https://archive.org/details/track{0}'.format(n))
+    description = 'A *nice* track.'
+    production_details = 'Made with [Ardour](https://ardour.org/).'
+    is_published = True
+    is_approved = True
+    last_modified_on = LazyFunction(dt.datetime.utcnow)
+    published_on = LazyFunction(dt.datetime.utcnow)
+    user = SubFactory(UserFactory)
+
+    class Meta:
+        """Factory configuration."""
+
+        model = CompetitionEntry
+
+
+class VoteFactory(BaseFactory):
+    """Vote factory."""
+
+    points = 1
+    entry = SubFactory(CompetitionEntryFactory)
+    user = SubFactory(UserFactory)
+
+    class Meta:
+        """Factory configuration."""
+
+        model = Vote
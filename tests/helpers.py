@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""Helper functions shared by the tests."""
+
+#: WSGI environment of a request made from the local host
+LOCAL = {'REMOTE_ADDR': '127.0.0.1'}
+
+
+def log_in(testapp, user, password='myprecious'):
+    """Log in user with the Webtest app."""
+    return testapp.post('/users/login', {'username': user.username, 'password': password})
+
+
+def make_metadata(title='My Track', creator='Me', length='120.5'):
+    """Return Archive.org item meta data of a track."""
+    return {
+        'metadata': {'title': title, 'creator': creator},
+        'files': [
+            {'name': 'mytrack.flac', 'format': 'Flac', 'size': '1234', 'md5': 'abc',
+             'length': length},
+            {'name': 'mytrack_meta.xml', 'format': 'Metadata'},
+        ]
+    }
+
+
+def samples(text):
+    """Return dict mapping the sample names (with labels) of metrics text to their values."""
+    return {line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+            for line in text.splitlines() if line and not line.startswith('#')}
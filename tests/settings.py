@@ -6,6 +6,7 @@ SQLALCHEMY_DATABASE_URI = 'sqlite://'
 SECRET_KEY = 'not-so-secret-in-tests'
 SECURITY_PASSWORD_SALT = 'test-password-salt'
 BCRYPT_LOG_ROUNDS = 4  # For faster tests; needs at least 4 to avoid "ValueError: Invalid rounds"
+PASSWORD_POOL_WORKERS = 0  # Hash passwords inline, the pool is tested explicitly
 DEBUG_TB_ENABLED = False
 CACHE_TYPE = 'simple'  # Can be "memcached", "redis", etc.
 SQLALCHEMY_TRACK_MODIFICATIONS = False
@@ -13,3 +14,8 @@ WEBPACK_MANIFEST_PATH = 'webpack/manifest.json'
 WTF_CSRF_ENABLED = False  # Allows form testing
 MAIL_USERNAME = 'dummy'
 MAIL_PASSWORD = 'test-mail-password'
+MAIL_SERVER = 'localhost'
+SITE_URL = 'http://localhost/'
+SITE_ADMIN_EMAIL = 'admin@example.com'
+JOBS_RUN_SYNC = True  # Background jobs can't use the in-memory database from other threads
+MAIL_WORKER_THREADS = 0  # Leave emails in the outbox, tests send them explicitly
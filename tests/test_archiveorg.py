@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Archive.org meta data cache tests."""
+
+# Standard library modules
+import datetime as dt
+
+# Third-party modules
+import pytest
+
+# Application specific modules
+from nexus_challenge import utils
+from nexus_challenge.competition import archiveorg
+from nexus_challenge.competition.archiveorg import check_item, get_item_metadata
+from nexus_challenge.competition.models import ArchiveItem
+from nexus_challenge.jobs import CircuitBreaker
+from nexus_challenge.utils import archiveorg_player, render_lite_player
+
+from .factories import CompetitionEntryFactory, UserFactory
+from .helpers import log_in, make_metadata
+
+
+@pytest.mark.usefixtures('db')
+class TestItemMetadataCache:
+    """Archive.org item meta data cache."""
+
+    def test_cached(self, fetches):
+        """Meta data is only fetched once within the cache TTL."""
+        item = get_item_metadata('mytrack')
+        assert item.title == 'My Track'
+        assert item.flac_name == 'mytrack.flac'
+        assert item.flac_length == 120.5
+        assert item.files[0]['md5'] == 'abc'
+
+        get_item_metadata('mytrack')
+        assert fetches.calls == [('mytrack', None)]
+
+    def test_stale_revalidated_with_etag(self, fetches):
+        """Stale meta data is re-fetched with a conditional request."""
+        item = get_item_metadata('mytrack')
+        item.update(last_fetched_on=dt.datetime.utcnow() - dt.timedelta(days=1))
+        fetches.responses.append((None, '"etag1"'))
+
+        item = get_item_metadata('mytrack')
+        assert fetches.calls[-1] == ('mytrack', '"etag1"')
+        assert item.title == 'My Track'
+        assert not item.is_stale(60)
+
+    def test_fetch_error_uses_cached_copy(self, fetches):
+        """Cached meta data is used if refreshing fails."""
+        get_item_metadata('mytrack')
+        fetches.responses.append(IOError("Connection refused"))
+        item = get_item_metadata('mytrack', refresh=True)
+        assert item.title == 'My Track'
+
+    def test_check_item(self, fetches):
+        """Entry data is checked against the cached meta data."""
+        item = get_item_metadata('mytrack')
+        assert check_item(item, 'my track ', 'ME') == []
+        assert len(check_item(item, 'Other Track', 'Me')) == 1
+
+        fetches.responses.append((make_metadata(length='10'), None))
+        item = get_item_metadata('mytrack', refresh=True)
+        assert check_item(item, 'My Track', 'Me') == [
+            "Track does not have minimum required duration (01:00 min.)."]
+
+
+def submit_entry(testapp, **data):
+    entry_data = {
+        'title': 'My Track',
+        'artist': 'Me',
+        'url': 'https://archive.org/details/mytrack',
+        'description': 'A very nice track.',
+        'production_details': 'Made with Ardour.',
+    }
+    entry_data.update(data)
+    return testapp.post('/submit_entry', entry_data)
+
+
+class TestEntryCheck:
+    """Asynchronous Archive.org meta data check of competition entries."""
+
+    def test_check_passed(self, user, testapp, fetches):
+        """Entry passing the check can be published."""
+        log_in(testapp, user)
+        submit_entry(testapp)
+        res = testapp.get('/submit/status')
+        assert res.json['status'] == 'passed'
+        assert res.json['errors'] == []
+
+        testapp.get('/publish_entry', {'confirm': 1})
+        assert user.competition_entries[0].is_published
+
+    def test_check_failed(self, user, testapp, fetches):
+        """Entry failing the check is accepted, but can't be published."""
+        log_in(testapp, user)
+        res = submit_entry(testapp, artist='Somebody Else').follow()
+        assert 'Artist does not match' in res
+
+        res = testapp.get('/submit/status')
+        assert res.json['status'] == 'failed'
+        assert len(res.json['errors']) == 1
+
+        testapp.get('/publish_entry', {'confirm': 1})
+        assert not user.competition_entries[0].is_published
+
+    def test_unchanged_entry_not_rechecked(self, user, testapp, fetches):
+        """Updating only the description of a checked entry does not queue a new check."""
+        log_in(testapp, user)
+        submit_entry(testapp)
+        submit_entry(testapp, description='Even nicer track.')
+        assert len(fetches.calls) == 1
+
+    def test_circuit_breaker(self, user, testapp, fetches, monkeypatch):
+        """Archive.org is not contacted anymore after repeated failures."""
+        monkeypatch.setattr(archiveorg, 'breaker', CircuitBreaker(failure_threshold=2))
+        fetches.responses.extend([IOError("timeout")] * 3)
+        monkeypatch.setattr(
+            archiveorg, 'fetch_item_metadata',
+            lambda *args, **kw: archiveorg.breaker.call('archive.org', fetches, *args, **kw))
+
+        log_in(testapp, user)
+        for i in range(3):
+            submit_entry(testapp, title='My Track %i' % i)
+
+        assert len(fetches.calls) == 2
+        res = testapp.get('/submit/status')
+        assert res.json['status'] == 'error'
+        assert 'not trying again' in res.json['errors'][0]
+
+    def test_approve_queues_prefetch(self, db, testapp, fetches, monkeypatch):
+        """Approving an entry refreshes its meta data in a background job."""
+        queued = []
+        monkeypatch.setattr(archiveorg.jobs, 'submit', lambda func, *args: queued.append(args))
+        entry = CompetitionEntryFactory(is_approved=False)
+        admin = UserFactory(password='myprecious', is_admin=True)
+        db.session.commit()
+
+        log_in(testapp, admin)
+        testapp.get('/approve/{}?confirm=1'.format(entry.id))
+        assert queued == [(entry.url,)]
+        assert fetches.calls == []
+
+
+class TestLitePlayer:
+    """Click-to-load player placeholders."""
+
+    def test_placeholder(self, app, monkeypatch):
+        """The placeholder shows title and duration and is rendered once per entry."""
+        render_lite_player.cache_clear()
+
+        def render_template(*args, **kwargs):
+            raise AssertionError("Template rendered")
+
+        monkeypatch.setattr(utils, 'render_template', render_template)
+
+        for i in range(3):
+            html = archiveorg_player('https://archive.org/details/mytrack', lite=True,
+                                     id='player-1', title='Me - <My Track>', duration=185.2)
+
+        assert 'data-src="https://archive.org/embed/mytrack"' in html
+        assert 'Me - &lt;My Track&gt;' in html
+        assert '03:05' in html
+        assert '<iframe' not in html
+        assert render_lite_player.cache_info().hits == 2
+
+        html = archiveorg_player('mytrack', lite=True, playlist=True)
+        assert 'data-src="https://archive.org/embed/mytrack?playlist=1"' in html
+        assert '>mytrack</span>' in html
+
+    def test_entry_list(self, db, testapp):
+        """Entry lists show placeholders with the cached track length, entry pages the player."""
+        entry = CompetitionEntryFactory(url='https://archive.org/details/mytrack')
+        db.session.commit()
+        ArchiveItem.create(track_id='mytrack', flac_length=61.0)
+
+        res = testapp.get('/list/')
+        assert 'class="archiveorg-player-lite" id="archiveorg-player-{}"'.format(entry.id) in res
+        assert '01:01' in res
+        assert '<iframe' not in res
+
+        assert '<iframe' in testapp.get('/view/{}'.format(entry.id))
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Static asset pipeline tests."""
+
+# Standard library modules
+import gzip
+import json
+
+# Third-party modules
+import pytest
+
+# Application specific modules
+from nexus_challenge.assets import BUNDLES, build, minify_css, minify_js
+from nexus_challenge.extensions import assets
+
+
+@pytest.fixture
+def static(tmp_path):
+    """A static folder with a few source files."""
+    folder = tmp_path / 'static'
+    (folder / 'js').mkdir(parents=True)
+    (folder / 'css').mkdir()
+    (folder / 'js' / 'lib.min.js').write_text('var lib={}\n//# sourceMappingURL=lib.min.map\n')
+    (folder / 'js' / 'main.js').write_text('// main\nfunction f(a) {\n  return a / 2;\n}\n')
+    (folder / 'css' / 'site.css').write_text('/* site */\nbody {\n  color: red;\n}\n'
+                                             '/*# sourceMappingURL=site.css.map */\n')
+    return folder
+
+
+BUNDLES_FOR_TEST = {'app.js': ('js/lib.min.js', 'js/main.js'), 'site.css': ('css/site.css',)}
+
+
+class TestMinify:
+    """Conservative CSS and JavaScript minification."""
+
+    def test_css(self):
+        """Comments and whitespace are removed, strings are kept."""
+        source = '/* a */\nh1 > a,\nh2  {\n  content: "/* b */  c";\n  margin: 0 auto;\n}\n'
+        assert minify_css(source) == 'h1>a,h2{content: "/* b */  c";margin: 0 auto}'
+
+    def test_js(self):
+        """Comments and indentation are removed, literals and line breaks are kept."""
+        source = ('// a\nvar x = 1 / 2; /* b */\n\n  var re = /[/]\\//g;\n'
+                  '  var s = "// c", t = `/* d */`;\n')
+        assert minify_js(source) == ('var x = 1 / 2;\nvar re = /[/]\\//g;\n'
+                                     'var s = "// c", t = `/* d */`;')
+
+
+class TestBuild:
+    """Building bundles and the manifest."""
+
+    def test_build(self, static):
+        """Bundles are written with content hashes in their names and compressed copies."""
+        output = static / 'dist'
+        manifest = build(str(static), str(output), BUNDLES_FOR_TEST)
+
+        assert json.loads((output / 'manifest.json').read_text()) == manifest
+        assert sorted(manifest) == ['app.js', 'site.css']
+        assert manifest['site.css'].startswith('dist/site.')
+        built = static / manifest['app.js']
+        assert built.read_text() == 'var lib={};\nfunction f(a) {\nreturn a / 2;\n}\n'
+        assert gzip.decompress((static / (manifest['app.js'] + '.gz')).read_bytes()) == \
+            built.read_bytes()
+        assert (static / manifest['site.css']).read_text() == 'body{color: red}\n'
+
+    def test_rebuild(self, static):
+        """Only changed bundles get new names, old builds are removed with ``clean``."""
+        output = static / 'dist'
+        first = build(str(static), str(output), BUNDLES_FOR_TEST, compressors={})
+        assert build(str(static), str(output), BUNDLES_FOR_TEST, compressors={}) == first
+
+        (static / 'css' / 'site.css').write_text('body { color: blue; }')
+        second = build(str(static), str(output), BUNDLES_FOR_TEST, compressors={})
+        assert second['app.js'] == first['app.js']
+        assert second['site.css'] != first['site.css']
+        assert (static / first['site.css']).exists()
+
+        build(str(static), str(output), BUNDLES_FOR_TEST, compressors={}, clean=True)
+        assert not (static / first['site.css']).exists()
+        assert sorted(path.name for path in output.iterdir()) == sorted(
+            ['manifest.json'] + [filename.split('/')[1] for filename in second.values()])
+
+
+class TestAssetUrls:
+    """Resolving logical asset names in templates."""
+
+    def test_sources_without_manifest(self, app, testapp, tmp_path):
+        """The source files of bundles are included, if they have not been built."""
+        app.config['ASSETS_OUTPUT_DIR'] = str(tmp_path)
+        html = testapp.get('/').text
+
+        for source in BUNDLES['app.js'] + BUNDLES['styles.css']:
+            assert '/static/{}'.format(source) in html
+
+        assert assets.url('img/previewbg.gif') == '/static/img/previewbg.gif'
+
+        with pytest.raises(ValueError):
+            assets.url('app.js')
+
+    def test_manifest(self, app, testapp, tmp_path):
+        """Built bundles are resolved through the manifest."""
+        app.config['ASSETS_OUTPUT_DIR'] = str(tmp_path)
+        (tmp_path / 'manifest.json').write_text(json.dumps({
+            'app.js': 'dist/app.0123abcd.js', 'styles.css': 'dist/styles.4567cdef.css'}))
+        html = testapp.get('/').text
+
+        assert '/static/dist/app.0123abcd.js' in html
+        assert '/static/dist/styles.4567cdef.css' in html
+        assert 'jquery.min.js' not in html
+        assert assets.url('app.js') == '/static/dist/app.0123abcd.js'
+
+        # not used in debug mode
+        app.config['ASSETS_DEBUG'] = True
+        assert 'jquery.min.js' in testapp.get('/').text
+
+    def test_build_command(self, app, tmp_path):
+        """The build command writes the bundles and uses the new manifest."""
+        app.config['ASSETS_OUTPUT_DIR'] = str(tmp_path / 'dist')
+        result = app.test_cli_runner().invoke(args=['assets', 'build'])
+
+        assert result.exit_code == 0, result.output
+        manifest = json.loads((tmp_path / 'dist' / 'manifest.json').read_text())
+        assert sorted(manifest) == sorted(BUNDLES)
+        assert assets.url('trend.js').endswith(manifest['trend.js'])
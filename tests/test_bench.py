@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Benchmark harness tests."""
+
+# Standard library modules
+import json
+import os
+from types import SimpleNamespace
+
+# Third-party modules
+import pytest
+from werkzeug.utils import import_string
+
+# Application specific modules
+from nexus_challenge.bench import (BenchError, ROUTES, bench_app, percentile, run_benchmark,
+                                   seed)
+from nexus_challenge.competition.counters import reconcile
+from nexus_challenge.competition.models import Vote
+from nexus_challenge.user.models import User
+
+
+@pytest.mark.usefixtures('voting_period')
+class TestBench:
+    """Seeding and benchmark run."""
+
+    def test_seed(self, db):
+        """Users, entries and ballots are created and the counters initialized."""
+        assert seed(users=30, entries=8, voters=20) == dict(users=30, entries=8, votes=100)
+        assert Vote.query.filter(Vote.user_id.in_(
+            db.session.query(User.id).filter_by(username='bench25'))).count() == 0
+        assert reconcile() == []
+
+        with pytest.raises(BenchError):
+            seed(users=10, entries=6)
+
+    def test_run_benchmark(self, app, db):
+        """All routes are requested and reported without errors."""
+        seed(users=20, entries=8)
+        report = run_benchmark(app, requests=3, clients=2, alloc_requests=1)
+
+        assert set(report['routes']) == {route.name for route in ROUTES}
+        for name, stats in report['routes'].items():
+            assert stats['requests'] == 3
+            assert stats['errors'] == 0, name
+            assert stats['latency_ms']['p50'] <= stats['latency_ms']['p99']
+            assert stats['alloc_kib']['max'] > 0
+
+        assert report['routes']['submit_vote']['queries']['max'] > 0
+        json.dumps(report)
+
+    def test_shared_cache_untouched(self, tmp_path):
+        """A run does not write to a cache or metrics directory shared with the live site."""
+        settings = import_string('tests.settings')
+        shared = SimpleNamespace(**{name: getattr(settings, name) for name in dir(settings)
+                                    if name.isupper()})
+        shared.CACHE_TYPE = 'filesystem'
+        shared.CACHE_DIR = str(tmp_path / 'cache')
+        shared.METRICS_DIR = str(tmp_path / 'metrics')
+        os.makedirs(shared.CACHE_DIR)
+
+        with bench_app(config_object=shared) as app:
+            assert app.config['CACHE_TYPE'] == 'simple'
+
+            with app.app_context():
+                seed(users=10, entries=6)
+
+            report = run_benchmark(app, requests=2, clients=1, alloc_requests=0)
+
+        assert all(stats['errors'] == 0 for stats in report['routes'].values())
+        assert os.listdir(shared.CACHE_DIR) == []
+        assert not os.path.exists(shared.METRICS_DIR)
+
+    def test_percentile(self):
+        """Percentiles use the nearest rank."""
+        values = list(range(1, 101))
+        assert (percentile(values, 50), percentile(values, 95), percentile(values, 99)) == (
+            50, 95, 99)
+        assert percentile([3.0], 99) == 3.0
+        assert percentile([], 50) is None
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Archive.org item file downloader tests."""
+
+# Standard library modules
+import hashlib
+import os
+
+# Third-party modules
+import pytest
+
+# Application specific modules
+from nexus_challenge.competition import downloader
+from nexus_challenge.competition.downloader import (DownloadProgress, HostThrottle,
+                                                    download_file, download_files,
+                                                    local_status, select_files)
+
+
+CONTENT = os.urandom(200 * 1024)
+FILES = [
+    {'name': 'track.flac', 'format': 'Flac', 'size': str(len(CONTENT)),
+     'md5': hashlib.md5(CONTENT).hexdigest()},
+    {'name': 'track.mp3', 'format': 'VBR MP3', 'size': '1000', 'md5': 'abc'},
+    {'name': 'track_meta.xml', 'format': 'Metadata', 'size': '10', 'md5': 'def'},
+]
+
+
+class FakeResponse:
+    """Streaming HTTP response."""
+
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    """Session serving CONTENT with support for range requests."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append((url, headers))
+
+        if self.errors:
+            return FakeResponse(self.errors.pop(0))
+
+        range_ = (headers or {}).get('Range')
+
+        if range_:
+            offset = int(range_.split('=')[1].rstrip('-'))
+            if offset >= len(CONTENT):
+                return FakeResponse(416)
+            return FakeResponse(206, CONTENT[offset:])
+
+        return FakeResponse(200, CONTENT)
+
+
+@pytest.fixture
+def session(monkeypatch):
+    """A fake HTTP session used by the downloader."""
+    session = FakeSession()
+    monkeypatch.setattr(downloader, 'get_session', lambda: session)
+    return session
+
+
+@pytest.fixture
+def task(tmpdir):
+    """Download task for the FLAC file."""
+    return select_files('track', FILES, str(tmpdir), glob='*.flac')[0]
+
+
+def read(path):
+    with open(path, 'rb') as fp:
+        return fp.read()
+
+
+class TestDownloader:
+    """Item file downloader."""
+
+    def test_select_files(self, tmpdir):
+        """Files are selected by format and glob pattern."""
+        tasks = select_files('track', FILES, str(tmpdir), formats=['FLAC', 'metadata'])
+        assert [task.name for task in tasks] == ['track.flac', 'track_meta.xml']
+        assert tasks[0].url == 'https://archive.org/download/track/track.flac'
+        assert tasks[0].dest == str(tmpdir.join('track', 'track.flac'))
+        assert tasks[0].size == len(CONTENT)
+
+    def test_download_and_skip(self, session, task):
+        """Files are downloaded once and skipped, when they are complete."""
+        tasks = [task]
+
+        progress = download_files(tasks)
+        assert (progress.downloaded, progress.skipped, progress.failed) == (1, 0, 0)
+        assert progress.bytes == len(CONTENT)
+        assert read(task.dest) == CONTENT
+        assert local_status(task) == 'complete'
+
+        progress = download_files(tasks)
+        assert (progress.downloaded, progress.skipped, progress.failed) == (0, 1, 0)
+        assert len(session.requests) == 1
+
+    def test_unknown_size(self, session, task):
+        """Files of unknown size are complete, once they have been downloaded."""
+        task = task._replace(size=None, md5=None)
+        os.makedirs(os.path.dirname(task.dest))
+        open(task.dest, 'wb').close()
+        assert local_status(task) == 'missing'
+
+        assert download_file(task, HostThrottle(), DownloadProgress(1))
+        assert local_status(task) == 'complete'
+
+        progress = download_files([task])
+        assert (progress.downloaded, progress.skipped, progress.failed) == (0, 1, 0)
+        assert len(session.requests) == 1
+
+    def test_resume_partial_file(self, session, task):
+        """Partial downloads are resumed with a range request."""
+        os.makedirs(os.path.dirname(task.dest))
+        with open(task.dest + '.part', 'wb') as fp:
+            fp.write(CONTENT[:1000])
+        assert local_status(task) == 'partial'
+
+        assert download_file(task, HostThrottle(), DownloadProgress(1))
+        assert session.requests == [(task.url, {'Range': 'bytes=1000-'})]
+        assert read(task.dest) == CONTENT
+        assert not os.path.exists(task.dest + '.part')
+
+    def test_checksum_mismatch(self, session, task):
+        """Files with a wrong checksum are not kept."""
+        task = task._replace(md5='0' * 32)
+        progress = DownloadProgress(1)
+
+        assert not download_file(task, HostThrottle(min_delay=0.01), progress, retries=2)
+        assert progress.failed == 1
+        assert len(session.requests) == 2
+        assert local_status(task) == 'missing'
+
+    def test_backoff_and_retry(self, session, task):
+        """Server errors are retried after backing off from the host."""
+        session.errors = [503, 429]
+        throttle = HostThrottle(min_delay=0.01)
+
+        assert download_file(task, throttle, DownloadProgress(1))
+        assert len(session.requests) == 3
+        # delay is halved again after the success
+        assert throttle.delay('archive.org') == 0.01
+
+    def test_client_error_not_retried(self, session, task):
+        """Client errors other than 429 fail right away."""
+        session.errors = [404]
+        progress = DownloadProgress(1)
+
+        assert not download_file(task, HostThrottle(), progress)
+        assert len(session.requests) == 1
+        assert progress.failed == 1
+
+
+class TestHostThrottle:
+    """Per-host throttle."""
+
+    def test_backoff(self):
+        """Delay doubles with each failure up to the maximum and halves with each success."""
+        throttle = HostThrottle(min_delay=1.0, max_delay=4.0)
+        for expected in (1.0, 2.0, 4.0, 4.0):
+            throttle.failure('example.com')
+            assert throttle.delay('example.com') == expected
+
+        throttle.success('example.com')
+        assert throttle.delay('example.com') == 2.0
+        assert throttle.delay('other.example.com') == 0.0
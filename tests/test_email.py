@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Email sending tests."""
+
+# Standard library modules
+import datetime as dt
+import threading
+from types import SimpleNamespace
+
+# Third-party modules
+import pytest
+
+# Application specific modules
+from nexus_challenge.commands import default_campaign
+from nexus_challenge.database import db as _db
+from nexus_challenge.extensions import mail
+from nexus_challenge.smtpsink import use_smtp_sink
+from nexus_challenge.user.campaign import CampaignEmail, run_campaign
+from nexus_challenge.user.email import (MailWorker, SMTPSender, drain_outbox,
+                                        start_send_email_task)
+from nexus_challenge.user.models import CampaignSend, OutgoingEmail
+
+from .factories import CompetitionEntryFactory
+
+
+class FailingSender(SMTPSender):
+    """SMTP sender which can't connect."""
+
+    def send(self, msg):
+        raise ConnectionRefusedError("Connection refused")
+
+
+@pytest.mark.usefixtures('db')
+class TestOutbox:
+    """Email outbox."""
+
+    def test_email_queued_in_outbox(self):
+        """Emails are stored in the outbox and sent from there."""
+        email = start_send_email_task('foo@example.com', 'Hello', '<p>Hi!</p>')
+        assert email.status == OutgoingEmail.STATUS_PENDING
+
+        with mail.record_messages() as outbox:
+            assert drain_outbox(SMTPSender()) == (1, 0)
+
+        assert len(outbox) == 1
+        assert outbox[0].recipients == ['foo@example.com']
+        assert outbox[0].html == '<p>Hi!</p>'
+        assert OutgoingEmail.get_by_id(email.id).status == OutgoingEmail.STATUS_SENT
+        assert drain_outbox(SMTPSender()) == (0, 0)
+
+    def test_retry_with_backoff(self, app):
+        """Failed emails are retried later and eventually given up."""
+        app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] = 2
+        email = start_send_email_task('foo@example.com', 'Hello', '<p>Hi!</p>')
+
+        assert drain_outbox(FailingSender()) == (0, 1)
+        email = OutgoingEmail.get_by_id(email.id)
+        assert email.status == OutgoingEmail.STATUS_PENDING
+        assert email.attempts == 1
+        assert email.next_attempt_on > dt.datetime.utcnow()
+        assert 'Connection refused' in email.last_error
+        # not due yet
+        assert drain_outbox(FailingSender()) == (0, 0)
+
+        email.update(next_attempt_on=dt.datetime.utcnow())
+        assert drain_outbox(FailingSender()) == (0, 1)
+        assert OutgoingEmail.get_by_id(email.id).status == OutgoingEmail.STATUS_FAILED
+
+
+@pytest.mark.usefixtures('db')
+class TestMailWorker:
+    """In-process mail worker pool."""
+
+    def test_send_from_worker_thread(self, app):
+        """Queued emails are sent by the worker threads."""
+        app.config['MAIL_WORKER_THREADS'] = 1
+        worker = MailWorker(app)
+        emails = [OutgoingEmail.create(recipient='foo%i@example.com' % i, subject='Hi', html='Hi')
+                  for i in range(5)]
+
+        with mail.record_messages() as outbox:
+            for email in emails:
+                assert worker.submit(email.id)
+
+            worker.shutdown()
+
+        assert worker.queue_depth == 0
+        assert [msg.recipients[0] for msg in outbox] == [email.recipient for email in emails]
+        assert OutgoingEmail.query.filter_by(status=OutgoingEmail.STATUS_SENT).count() == 5
+
+    def test_queue_full(self, app, monkeypatch):
+        """Emails stay in the outbox, when the queue is full."""
+        release = threading.Event()
+        monkeypatch.setattr(MailWorker, '_run', lambda self, app, queue: release.wait())
+        app.config['MAIL_WORKER_THREADS'] = 1
+        app.config['MAIL_QUEUE_SIZE'] = 2
+        worker = MailWorker(app)
+
+        assert worker.submit(1)
+        assert worker.submit(2)
+        assert not worker.submit(3)
+        assert worker.queue_depth == 2
+        release.set()
+
+
+class ListSender:
+    """SMTP sender collecting messages, which fails for given recipients."""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.messages = []
+
+    def send(self, msg):
+        if msg.recipients[0] in self.fail:
+            raise ConnectionRefusedError("Connection refused")
+        self.messages.append(msg)
+
+    def close(self):
+        pass
+
+
+def make_campaign_emails(count):
+    return [CampaignEmail(key='user%i@example.com' % i, recipient='user%i@example.com' % i,
+                          subject='Hello', template='competition/reminder_publish.html',
+                          context=dict(entry_url='http://localhost/submit/', deadline=NOW,
+                                       entry=SimpleNamespace(title='T', artist='A', url='U',
+                                                             created_on=NOW),
+                                       user=SimpleNamespace(username='user%i' % i)))
+            for i in range(count)]
+
+
+NOW = dt.datetime(2019, 10, 1)
+
+
+@pytest.mark.usefixtures('db')
+class TestCampaign:
+    """Email campaigns."""
+
+    def test_resume_campaign(self):
+        """Recipients who were already sent the email are skipped, when a campaign is re-run."""
+        emails = make_campaign_emails(4)
+        sender = ListSender(fail=['user2@example.com'])
+
+        result = run_campaign('test', emails, sender=sender, rate=0, render_workers=2)
+        assert result[:3] == (3, 1, 0)
+        assert [msg.recipients[0] for msg in sender.messages] == [
+            'user0@example.com', 'user1@example.com', 'user3@example.com']
+        assert 'Hello user1,' in sender.messages[1].html
+
+        sender = ListSender()
+        result = run_campaign('test', emails, sender=sender, rate=0)
+        assert result[:3] == (1, 0, 3)
+        assert [msg.recipients[0] for msg in sender.messages] == ['user2@example.com']
+        assert CampaignSend.query.filter_by(campaign='test').count() == 4
+
+        # other campaigns are not affected
+        assert run_campaign('other', emails, sender=ListSender(), rate=0).sent == 4
+
+    def test_rate_limit(self):
+        """Emails are spaced out according to the rate limit."""
+        result = run_campaign(None, make_campaign_emails(5), sender=ListSender(), rate=100)
+        assert result.sent == 5
+        assert result.elapsed >= 0.04
+
+    def test_single_connection(self, app):
+        """All emails of a campaign are sent over one SMTP connection."""
+        with use_smtp_sink(app) as sink:
+            result = run_campaign(None, make_campaign_emails(5), rate=0)
+
+        assert result.sent == 5
+        assert sink.messages == 5
+        assert sink.connections == 1
+
+    def test_voting_reminder(self, app):
+        """Voting reminder is sent once to each user with an approved entry."""
+        app.config['VOTING_PERIOD_START'] = NOW
+        app.config['VOTING_PERIOD_END'] = NOW + dt.timedelta(days=7)
+        entries = CompetitionEntryFactory.create_batch(3)
+        CompetitionEntryFactory(is_approved=False)
+        # e.g. of a deleted user
+        CompetitionEntryFactory(user=None)
+        _db.session.commit()
+        recipients = sorted(entry.user.email for entry in entries)
+        runner = app.test_cli_runner()
+
+        with mail.record_messages() as outbox:
+            result = runner.invoke(args=['email', 'voting-reminder', '--rate', '0'])
+            assert result.exit_code == 0, result.output
+            assert sorted(msg.recipients[0].split('<')[1][:-1] for msg in outbox) == recipients
+            assert 'you must vote before' in outbox[0].html
+
+            result = runner.invoke(args=['email', 'voting-reminder'])
+            assert '0 emails sent, 0 failed, 3 skipped' in result.output
+            assert len(outbox) == 3
+
+    def test_default_campaign(self):
+        """Reminders for the same deadline sent on different days are separate campaigns."""
+        deadline = dt.datetime(2019, 11, 1, 12, 0)
+        first = default_campaign('voting-reminder', deadline, dt.date(2019, 10, 25))
+        assert first == 'voting-reminder-20191101-20191025'
+        assert default_campaign('voting-reminder', deadline, dt.date(2019, 10, 30)) != first
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Data export tests."""
+
+# Standard library modules
+import csv
+import io
+import json
+
+# Third-party modules
+import pytest
+
+# Application specific modules
+from nexus_challenge.commands import export_data
+from nexus_challenge.competition import export as export_module
+from nexus_challenge.competition.export import ExportError, export
+
+from .factories import CompetitionEntryFactory, UserFactory, VoteFactory
+from .helpers import log_in
+
+
+@pytest.fixture
+def competition(db):
+    """Approved entries with votes by their entrants and another user."""
+    entries = CompetitionEntryFactory.create_batch(3)
+    voter = UserFactory()
+
+    for user in [entry.user for entry in entries] + [voter]:
+        VoteFactory(user=user, entry=entries[0], points=5)
+        VoteFactory(user=user, entry=entries[1], points=4)
+
+    db.session.commit()
+    return entries
+
+
+class TestExport:
+    """Export of competition data."""
+
+    def test_export_entries_csv(self, app, competition, tmpdir):
+        """Entries are exported as CSV by the command."""
+        path = str(tmpdir.join('entries.csv'))
+        titles = [entry.title for entry in competition]
+        username = competition[0].user.username
+        result = app.test_cli_runner().invoke(export_data, ['entries', '-o', path])
+        assert result.exit_code == 0
+
+        with open(path, newline='') as fp:
+            rows = list(csv.DictReader(fp))
+
+        assert [row['title'] for row in rows] == titles
+        assert rows[0]['username'] == username
+        assert rows[0]['is_approved'] == 'True'
+
+    def test_export_ballots_jsonl(self, db, competition, monkeypatch):
+        """Ballots are anonymized and streamed in batches."""
+        monkeypatch.setattr(export_module, 'BATCH_SIZE', 3)
+        chunks = list(export('ballots', 'jsonl'))
+        assert len(chunks) == 3
+
+        rows = [json.loads(line) for line in b''.join(chunks).decode('utf-8').splitlines()]
+        assert len(rows) == 8
+        assert len({row['voter'] for row in rows}) == 4
+        assert sum(row['voter_is_entrant'] for row in rows) == 6
+        assert sum(row['points'] for row in rows) == 36
+        assert all(set(row) == {'voter', 'voter_is_entrant', 'entry_id', 'points', 'created_on'}
+                   for row in rows)
+        # pseudonyms are stable
+        assert [json.loads(line)['voter'] for line in
+                b''.join(export('ballots', 'jsonl')).decode('utf-8').splitlines()] == [
+            row['voter'] for row in rows]
+
+    def test_export_parquet(self, db, competition):
+        """Scoreboard is exported as Parquet, if pyarrow is installed."""
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            with pytest.raises(ExportError):
+                export('scoreboard', 'parquet')
+        else:
+            table = pq.read_table(io.BytesIO(b''.join(export('scoreboard', 'parquet'))))
+            assert table.column('points').to_pylist() == [20, 16, 0]
+
+    def test_export_download(self, db, testapp, competition):
+        """Admins can download exports."""
+        admin = UserFactory(password='myprecious', is_admin=True)
+        db.session.commit()
+        log_in(testapp, admin)
+
+        res = testapp.get('/export/scoreboard.csv')
+        assert res.content_type == 'text/csv'
+        assert 'filename="nexus-challenge-scoreboard.csv"' in res.headers['Content-Disposition']
+        rows = list(csv.DictReader(io.StringIO(res.text)))
+        assert [int(row['points']) for row in rows] == [20, 16, 0]
+        assert rows[0]['votes_5'] == '4'
+
+        testapp.get('/export/users.csv', status=404)
+
+    def test_export_admin_only(self, user, testapp, competition):
+        """Other users can't download exports."""
+        log_in(testapp, user)
+        res = testapp.get('/export/ballots.csv').follow()
+        assert 'permission' in res
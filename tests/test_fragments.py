@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Cached entry list fragment tests."""
+
+# Standard library modules
+import threading
+import time
+from types import SimpleNamespace
+
+# Third-party modules
+import pytest
+
+# Application specific modules
+from nexus_challenge.competition import fragments
+from nexus_challenge.competition.fragments import get_entry_blocks, get_or_build
+
+from .factories import CompetitionEntryFactory, UserFactory
+from .helpers import log_in
+
+
+@pytest.mark.usefixtures('db')
+class TestFragments:
+    """Cached entry list fragments."""
+
+    def test_entry_blocks_cached(self, db):
+        """Entry blocks are rendered once and then served from the cache."""
+        entries = CompetitionEntryFactory.create_batch(3)
+        db.session.commit()
+        ids = [entry.id for entry in entries]
+        loaded = []
+
+        def load_entries(entry_ids):
+            loaded.append(sorted(entry_ids))
+            return [entry for entry in entries if entry.id in entry_ids]
+
+        blocks = get_entry_blocks(ids[:2], load_entries)
+        assert len(blocks) == 2
+        assert entries[0].title in blocks[0]
+
+        blocks = get_entry_blocks(list(reversed(ids)), load_entries)
+        assert [entry.title in block for entry, block in zip(reversed(entries), blocks)] == [
+            True, True, True]
+        assert loaded == [ids[:2], ids[2:]]
+
+    def test_single_flight(self, app):
+        """Concurrent requests for a missing value build it only once."""
+        builds = []
+
+        def build():
+            builds.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+
+        def get():
+            with app.app_context():
+                results.append(get_or_build('test-key', build))
+
+        threads = [threading.Thread(target=get) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == ['value'] * 5
+        assert len(builds) == 1
+
+    def test_entry_blocks_locked_per_entry(self, app, monkeypatch):
+        """Concurrent requests for different entries only wait for blocks rendered by others."""
+        rendered = []
+
+        def render_entry_blocks(entries):
+            rendered.extend(entry.id for entry in entries)
+            time.sleep(0.2)
+            return ['block {}'.format(entry.id) for entry in entries]
+
+        def load_entries(entry_ids):
+            return [SimpleNamespace(id=entry_id) for entry_id in entry_ids]
+
+        monkeypatch.setattr(fragments, 'render_entry_blocks', render_entry_blocks)
+        results = {}
+
+        def get(entry_ids):
+            with app.app_context():
+                results[tuple(entry_ids)] = get_entry_blocks(entry_ids, load_entries)
+
+        # e.g. two visitors with different random orders on a cold cache
+        started = time.monotonic()
+        threads = [threading.Thread(target=get, args=(entry_ids,))
+                   for entry_ids in ([1, 2, 3], [3, 4, 2])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert time.monotonic() - started < 2.0
+        assert sorted(rendered) == [1, 2, 3, 4]
+        assert results == {(1, 2, 3): ['block 1', 'block 2', 'block 3'],
+                           (3, 4, 2): ['block 3', 'block 4', 'block 2']}
+
+    def test_approve_invalidates(self, db, testapp, fetches):
+        """Approving an entry updates the cached entry list."""
+        CompetitionEntryFactory(title='Approved Track')
+        entry = CompetitionEntryFactory(title='New Track', is_approved=False)
+        admin = UserFactory(password='myprecious', is_admin=True)
+        db.session.commit()
+
+        res = testapp.get('/list/')
+        assert 'Approved Track' in res
+        assert 'New Track' not in res
+
+        log_in(testapp, admin)
+        testapp.get('/approve/{}?confirm=1'.format(entry.id))
+        testapp.get('/users/logout')
+
+        res = testapp.get('/list/')
+        assert 'Approved Track' in res
+        assert 'New Track' in res
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Public page freezing tests."""
+
+# Standard library modules
+import datetime as dt
+import json
+
+# Third-party modules
+import pytest
+
+# Application specific modules
+from nexus_challenge.competition import freeze as freeze_module
+from nexus_challenge.competition.freeze import FreezeError, freeze, frozen_filename
+
+from .factories import CompetitionEntryFactory
+
+
+def test_frozen_filename():
+    """Pages are written to index files named after their query string."""
+    assert frozen_filename('/list/') == 'list/index.html'
+    assert frozen_filename('/list/?order=title&desc=1') == 'list/index-order=title&desc=1.html'
+    assert frozen_filename('/view/3') == 'view/3/index.html'
+    assert frozen_filename('/results/trend.json') == 'results/trend.json'
+
+
+@pytest.fixture
+def voting_over(app):
+    """Configure a voting period, which has ended."""
+    now = dt.datetime.utcnow()
+    app.config['SUBMISSION_PERIOD_START'] = now - dt.timedelta(days=21)
+    app.config['VOTING_PERIOD_START'] = now - dt.timedelta(days=7)
+    app.config['VOTING_PERIOD_END'] = now - dt.timedelta(days=1)
+
+
+@pytest.mark.usefixtures('db', 'voting_over')
+class TestFreeze:
+    """Rendering public pages to static files."""
+
+    @pytest.fixture
+    def entries(self, db):
+        entries = CompetitionEntryFactory.create_batch(3)
+        hidden = CompetitionEntryFactory(is_approved=False)
+        db.session.commit()
+        return entries, hidden
+
+    def test_freeze(self, app, entries, tmp_path):
+        """All public pages of approved entries are written, including their players."""
+        approved, hidden = entries
+        output = tmp_path / 'frozen'
+        pages = freeze(str(output), workers=2)
+
+        # results, trend data, stats, 2 x 7 list/vote pages and the entries
+        assert len(pages) == 3 + 14 + 3
+        assert sorted(page.filename for page in pages) == sorted(
+            str(path.relative_to(output)) for path in output.rglob('*') if path.is_file())
+        view = (output / 'view' / str(approved[0].id) / 'index.html').read_text()
+        assert approved[0].title in view
+        assert 'https://archive.org/embed/track' in view
+        assert not (output / 'view' / str(hidden.id)).exists()
+        assert hidden.title not in (output / 'list' / 'index.html').read_text()
+        by_title = (output / 'list' / 'index-order=title&desc=1.html').read_text()
+        positions = [by_title.index(entry.title) for entry in approved]
+        assert positions[2] < positions[1] < positions[0]
+        json.loads((output / 'results' / 'trend.json').read_text())
+
+    def test_failure(self, app, entries, tmp_path, monkeypatch):
+        """The output directory is left unchanged, if a page can't be rendered."""
+        output = tmp_path / 'frozen'
+        freeze(str(output))
+        monkeypatch.setattr(freeze_module, 'public_urls', lambda: ['/list/', '/view/0'])
+
+        with pytest.raises(FreezeError):
+            freeze(str(output))
+
+        assert (output / 'list' / 'index-order=artist&desc=0.html').exists()
+        assert sorted(path.name for path in tmp_path.iterdir()) == ['frozen']
+
+    def test_command(self, app, entries, tmp_path):
+        """The pages are only frozen after the voting period, unless forced."""
+        app.config['VOTING_PERIOD_END'] = dt.datetime.utcnow() + dt.timedelta(days=1)
+        output = tmp_path / 'frozen'
+        runner = app.test_cli_runner()
+
+        result = runner.invoke(args=['compo', 'freeze', str(output)])
+        assert result.exit_code != 0
+        assert 'voting period is not over' in result.output
+        assert not output.exists()
+
+        result = runner.invoke(args=['compo', 'freeze', '--force', str(output)])
+        assert result.exit_code == 0, result.output
+        # without the voting trend data
+        assert '19 pages' in result.output
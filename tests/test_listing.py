@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Entry list pagination tests."""
+
+# Standard library modules
+import datetime as dt
+import re
+
+# Third-party modules
+import pytest
+
+# Application specific modules
+from nexus_challenge.competition.listing import (decode_cursor, encode_cursor, keyset_query,
+                                                 sort_key)
+
+from .factories import CompetitionEntryFactory, UserFactory
+from .helpers import log_in
+
+TITLE = re.compile(r'<p class="track-title">(.*?)</p>')
+
+
+def walk(testapp, url):
+    """Return titles of the entries on all pages of entry list and the visited pages."""
+    titles = []
+    pages = []
+    res = testapp.get(url)
+
+    while True:
+        pages.append(res)
+        titles.extend(TITLE.findall(res.text))
+        link = res.html.find('a', rel='next')
+
+        if link is None:
+            return titles, pages
+
+        res = testapp.get(link['href'])
+
+
+@pytest.fixture
+def entries(app, db):
+    app.config['ENTRIES_PER_PAGE'] = 2
+    entries = [CompetitionEntryFactory(title=title, artist='Artist {}'.format(i))
+               for i, title in enumerate(['Delta', 'alpha', 'Echo', 'Bravo', 'Charlie'])]
+    db.session.commit()
+    return entries
+
+
+@pytest.mark.usefixtures('voting_period', 'entries')
+class TestPagination:
+    """Entry lists are shown in pages."""
+
+    @pytest.mark.parametrize('url', ['/list/', '/vote/'])
+    def test_sorted(self, testapp, url):
+        """Sorted pages follow each other and link back to the previous page."""
+        titles, pages = walk(testapp, url + '?order=title&desc=0')
+        assert titles == ['Bravo', 'Charlie', 'Delta', 'Echo', 'alpha']
+        assert len(pages) == 3
+        assert pages[0].html.find('a', rel='prev') is None
+        prev_link = pages[2].html.find('a', rel='prev')['href']
+        assert prev_link == pages[1].request.path_qs
+        assert testapp.get(pages[1].html.find('a', rel='prev')['href']).text == pages[0].text
+
+        titles, pages = walk(testapp, url + '?order=title&desc=1')
+        assert titles == ['alpha', 'Echo', 'Delta', 'Charlie', 'Bravo']
+
+    def test_random(self, testapp):
+        """The random order of a visitor is the same for all pages and requests."""
+        titles, pages = walk(testapp, '/list/')
+        assert sorted(titles) == ['Bravo', 'Charlie', 'Delta', 'Echo', 'alpha']
+        assert walk(testapp, '/list/')[0] == titles
+        assert walk(testapp, '/vote/')[0] == titles
+
+    def test_shuffle_seeds(self, db):
+        """The random order depends on the seed."""
+        orders = {tuple(row.id for row in keyset_query(sort_key(None, seed)))
+                  for seed in range(10)}
+        assert len(orders) > 1
+
+    def test_invalid_cursor(self, testapp):
+        """Invalid cursors are not found."""
+        testapp.get('/list/?order=title&after=garbage', status=404)
+        testapp.get('/list/?order=published_on&after=' + encode_cursor('x', 1), status=404)
+
+    def test_admin(self, db, testapp):
+        """Admins see unapproved entries in the list too."""
+        CompetitionEntryFactory(title='Unapproved', is_approved=False)
+        admin = UserFactory(password='myprecious', is_admin=True)
+        db.session.commit()
+        assert 'Unapproved' not in walk(testapp, '/list/?order=title')[0]
+
+        log_in(testapp, admin)
+        assert 'Unapproved' in walk(testapp, '/list/?order=title')[0]
+
+
+def test_cursor_round_trip():
+    """Cursors encode sort key and entry id."""
+    published = dt.datetime(2019, 10, 1, 12, 30)
+    assert decode_cursor(encode_cursor(published, 7), 'published_on') == (published, 7)
+    assert decode_cursor(encode_cursor('Title', 3), 'title') == ('Title', 3)
+    assert decode_cursor(encode_cursor(12345, 3), None) == (12345, 3)
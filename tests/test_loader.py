@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Cached user loading tests."""
+
+# Standard library modules
+import time
+
+# Application specific modules
+from nexus_challenge.user.loader import UserCache, UserSnapshot, user_cache
+from nexus_challenge.user.models import User
+
+from .helpers import log_in
+
+
+def snapshot(user_id):
+    return UserSnapshot(user_id, 'user{}'.format(user_id), 'user{}@example.com'.format(user_id),
+                        None, None, True, False, True)
+
+
+class TestUserCache:
+    """LRU cache of user snapshots with expiry."""
+
+    def test_lru(self):
+        """The least recently used users are removed, when the cache is full."""
+        cache = UserCache()
+        cache.maxsize = 2
+        loads = []
+
+        def load(user_id):
+            loads.append(user_id)
+            return snapshot(user_id) if user_id < 10 else None
+
+        assert cache.get(1, load).username == 'user1'
+        cache.get(2, load)
+        cache.get(1, load)
+        cache.get(3, load)
+        assert len(cache) == 2
+        cache.get(1, load)
+        cache.get(2, load)
+        assert cache.get(10, load) is None
+        cache.get(10, load)
+        assert loads == [1, 2, 3, 2, 10, 10]
+
+    def test_expiry(self):
+        """Snapshots are loaded again after the TTL and when invalidated."""
+        cache = UserCache()
+        cache.ttl = 0.05
+        loads = []
+
+        def load(user_id):
+            loads.append(user_id)
+            return snapshot(user_id)
+
+        cache.get(1, load)
+        cache.get(1, load)
+        time.sleep(0.06)
+        cache.get(1, load)
+        cache.invalidate(1)
+        cache.get(1, load)
+        assert loads == [1, 1, 1]
+
+
+class TestLoadUser:
+    """The logged in user is a cached snapshot."""
+
+    def test_cached(self, db, user, testapp, assert_max_queries):
+        """Requests of a logged in user don't query the user after the first one."""
+        log_in(testapp, user)
+        db.session.remove()
+
+        with assert_max_queries(None) as queries:
+            testapp.get('/users/')
+        assert any('FROM users' in sql for sql, duration in queries.statements)
+
+        with assert_max_queries(0):
+            res = testapp.get('/users/')
+        assert 'Welcome {}'.format(user.username) in res
+
+    def test_invalidated(self, db, user, testapp):
+        """Changes made with update or save are seen by the next request."""
+        log_in(testapp, user)
+        testapp.get('/stats/admin', status=302)
+        assert len(user_cache) == 1
+
+        user.update(is_admin=True)
+        assert len(user_cache) == 0
+        assert 'Draft entries' in testapp.get('/stats/admin')
+
+    def test_change_password(self, db, user, testapp):
+        """Views changing the logged in user fetch the model instance."""
+        log_in(testapp, user)
+        res = testapp.get('/users/profile')
+        form = res.forms[0]
+        form['password'] = 'newsecret'
+        form['confirm'] = 'newsecret'
+        res = form.submit().follow()
+        assert 'Password successfully changed' in res
+
+        db.session.remove()
+        assert User.get_by_id(user.id).check_password('newsecret')
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""Metrics tests."""
+
+# Standard library modules
+from types import SimpleNamespace
+
+# Third-party modules
+import pytest
+from flask import Flask
+
+# Application specific modules
+from nexus_challenge.competition import archiveorg
+from nexus_challenge.extensions import mail, metrics
+from nexus_challenge.metrics import (CACHE_REQUESTS, HTTP_REQUEST_DURATION, HTTP_REQUESTS,
+                                     MAIL_SEND_FAILURES, Metrics)
+from nexus_challenge.user.email import SMTPSender, drain_outbox, start_send_email_task
+
+from .factories import CompetitionEntryFactory
+from .helpers import LOCAL, samples
+
+
+class TestMetrics:
+    """Metrics recording and aggregation."""
+
+    def test_render(self):
+        """Counters and histograms are rendered in the Prometheus text format."""
+        registry = Metrics()
+        registry.inc(HTTP_REQUESTS, endpoint='list', method='GET', status=200)
+        registry.inc(HTTP_REQUESTS, 2, endpoint='list', method='GET', status=200)
+        registry.observe(HTTP_REQUEST_DURATION, 0.02, endpoint='say "hi"')
+        registry.observe(HTTP_REQUEST_DURATION, 20.0, endpoint='say "hi"')
+        text = registry.render()
+
+        assert '# TYPE nexus_http_requests_total counter' in text
+        assert '# TYPE nexus_http_request_duration_seconds histogram' in text
+        values = samples(text)
+        assert values['nexus_http_requests_total{endpoint="list",method="GET",status="200"}'] == 3
+        bucket = 'nexus_http_request_duration_seconds_bucket{{endpoint="say \\"hi\\"",le="{}"}}'
+        assert values[bucket.format('0.01')] == 0
+        assert values[bucket.format('0.025')] == 1
+        assert values[bucket.format('10')] == 1
+        assert values[bucket.format('+Inf')] == 2
+        assert values['nexus_http_request_duration_seconds_sum{endpoint="say \\"hi\\""}'] == 20.02
+        assert values['nexus_http_request_duration_seconds_count{endpoint="say \\"hi\\""}'] == 2
+
+    def test_aggregated_over_processes(self, tmp_path):
+        """Values of all processes sharing a directory are summed, including exited ones."""
+        workers = [Metrics(directory=str(tmp_path)) for i in range(3)]
+
+        for i, worker in enumerate(workers, 1):
+            worker.inc(CACHE_REQUESTS, i, key='foo', result='hit')
+            worker.observe(HTTP_REQUEST_DURATION, 0.1 * i, endpoint='list')
+            worker.flush()
+
+        # the last worker records more and exits (flushing at exit)
+        workers[2].inc(CACHE_REQUESTS, key='foo', result='hit')
+        workers[2].flush()
+        del workers[2]
+
+        values = samples(workers[0].render())
+        assert values['nexus_cache_requests_total{key="foo",result="hit"}'] == 7
+        assert values['nexus_http_request_duration_seconds_count{endpoint="list"}'] == 3
+        assert values['nexus_http_request_duration_seconds_sum{endpoint="list"}'] == \
+            pytest.approx(0.6)
+
+    def test_flushed_after_interval(self, tmp_path):
+        """Changes are written to the process's file after the flush interval."""
+        registry = Metrics(directory=str(tmp_path))
+        registry.flush_interval = 0.01
+        registry.inc(MAIL_SEND_FAILURES)
+        registry._timer.join()
+
+        assert len(list(tmp_path.glob('metrics-*.json'))) == 1
+        assert 'nexus_mail_send_failures_total 1' in Metrics(directory=str(tmp_path)).render()
+
+    def test_files_only_written_when_enabled(self, tmp_path):
+        """Only server processes with values write files, not e.g. CLI commands."""
+        Metrics(directory=str(tmp_path)).flush()
+        assert list(tmp_path.iterdir()) == []
+
+        app = Flask(__name__)
+        app.config['METRICS_DIR'] = str(tmp_path)
+        registry = Metrics(app)
+        registry.inc(MAIL_SEND_FAILURES)
+        assert registry._timer is None
+        registry.flush()
+        assert list(tmp_path.iterdir()) == []
+
+        registry.write_files = True
+        registry.flush()
+        assert len(list(tmp_path.glob('metrics-*.json'))) == 1
+
+
+@pytest.mark.usefixtures('db')
+class TestMetricsEndpoint:
+    """Metrics of the app."""
+
+    def test_local_only(self, testapp):
+        """Metrics are only reported to local clients, which don't connect through a proxy."""
+        assert testapp.get('/metrics', extra_environ=LOCAL).content_type == 'text/plain'
+        testapp.get('/metrics', extra_environ={'REMOTE_ADDR': '10.0.0.1'}, status=404)
+        testapp.get('/metrics', extra_environ=LOCAL, headers={'X-Forwarded-For': '10.0.0.1'},
+                    status=404)
+
+    def test_requests(self, db, testapp):
+        """Latency, database time and cache lookups are recorded per endpoint."""
+        CompetitionEntryFactory.create_batch(2)
+        db.session.commit()
+        testapp.get('/list/')
+        testapp.get('/list/')
+        values = samples(testapp.get('/metrics', extra_environ=LOCAL).text)
+
+        assert values['nexus_http_requests_total{endpoint="competition.list_entries",'
+                      'method="GET",status="200"}'] == 2
+        assert values['nexus_http_request_duration_seconds_count'
+                      '{endpoint="competition.list_entries"}'] == 2
+        assert values['nexus_http_request_db_seconds_count'
+                      '{endpoint="competition.list_entries"}'] == 2
+        assert values['nexus_db_queries_total{endpoint="competition.list_entries"}'] >= 2
+        assert values['nexus_cache_requests_total'
+                      '{key="competition/entry_block/*",result="miss"}'] == 2
+        assert values['nexus_cache_requests_total'
+                      '{key="competition/entry_block/*",result="hit"}'] == 2
+
+    def test_email(self, testapp, monkeypatch):
+        """Email send latency and failures are recorded and the outbox is reported."""
+        start_send_email_task('foo@example.com', 'Hello', '<p>Hi!</p>')
+        start_send_email_task('bar@example.com', 'Hello', '<p>Hi!</p>')
+
+        with mail.record_messages():
+            assert drain_outbox(SMTPSender(), batch_size=1) == (1, 0)
+
+        def refuse():
+            raise ConnectionRefusedError("Connection refused")
+
+        monkeypatch.setattr(mail, 'connect', refuse)
+        assert drain_outbox(SMTPSender()) == (0, 1)
+        values = samples(metrics.render())
+
+        assert values['nexus_mail_send_duration_seconds_count{result="sent"}'] == 1
+        assert values['nexus_mail_send_duration_seconds_count{result="failed"}'] == 1
+        assert values['nexus_mail_send_failures_total'] == 1
+        assert values['nexus_mail_outbox_emails{status="pending"}'] == 1
+        assert values['nexus_mail_outbox_emails{status="sent"}'] == 1
+
+    def test_archiveorg(self, monkeypatch):
+        """Archive.org request latencies are recorded by status code."""
+        response = SimpleNamespace(status_code=304, headers={})
+        session = SimpleNamespace(get=lambda url, **kwargs: response)
+        monkeypatch.setattr(archiveorg, 'get_session', lambda: session)
+        archiveorg.breaker.record_success('archive.org')
+
+        assert archiveorg.fetch_item_metadata('mytrack', etag='"etag1"') == (None, '"etag1"')
+        values = samples(metrics.render())
+        assert values['nexus_archiveorg_request_duration_seconds_count{status="304"}'] == 1
@@ -8,9 +8,10 @@ import datetime as dt
 import pytest
 
 # Application specific modules
+from nexus_challenge.competition.models import CompetitionEntry
 from nexus_challenge.user.models import Role, User
 
-from .factories import UserFactory
+from .factories import CompetitionEntryFactory, UserFactory
 
 
 @pytest.mark.usefixtures('db')
@@ -65,3 +66,22 @@ class TestUser:
         user.roles.append(role)
         user.save()
         assert role in user.roles
+
+
+@pytest.mark.usefixtures('db')
+class TestCompetitionEntry:
+    """Competition entry tests."""
+
+    def test_markdown_rendered_on_create(self):
+        """HTML of Markdown fields is rendered when the entry is created."""
+        entry = CompetitionEntryFactory(description='Some *emphasis*.',
+                                        production_details='See https://ardour.org/')
+        assert '<em>emphasis</em>' in entry.description_html
+        assert '<a href="https://ardour.org/">' in entry.production_details_html
+
+    def test_markdown_rerendered_on_update(self):
+        """HTML of a Markdown field is re-rendered when its text changes."""
+        entry = CompetitionEntryFactory(description='Old **text**.')
+        entry.update(description='New **text**.')
+        retrieved = CompetitionEntry.get_by_id(entry.id)
+        assert retrieved.description_html == '<p>New <strong>text</strong>.</p>\n'
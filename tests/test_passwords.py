@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Password hashing pool tests."""
+
+# Third-party modules
+import pytest
+
+# Application specific modules
+from nexus_challenge.extensions import metrics
+from nexus_challenge.passwords import PasswordHasher, PasswordHasherBusy
+
+from .helpers import LOCAL, samples
+
+
+@pytest.fixture
+def hasher(app):
+    """A password hasher using a pool with one process."""
+    app.config['PASSWORD_POOL_WORKERS'] = 1
+    hasher = PasswordHasher(app)
+    yield hasher
+    hasher.shutdown()
+
+
+@pytest.mark.usefixtures('db')
+class TestPasswordHasher:
+    """Password hashing and checking in a process pool."""
+
+    def test_pool(self, hasher):
+        """Passwords are hashed and checked in the pool."""
+        pw_hash = hasher.generate('myprecious')
+        assert pw_hash.startswith(b'$2b$04$')
+        assert hasher.check(pw_hash, 'myprecious')
+        assert not hasher.check(pw_hash, 'wrong')
+        assert not hasher.check(None, 'myprecious')
+        assert hasher.pending == 0
+
+        values = samples(metrics.render())
+        assert values['nexus_password_hashing_seconds_count{operation="hash"}'] == 1
+        assert values['nexus_password_hashing_seconds_count{operation="check"}'] == 2
+
+    def test_busy(self, app, hasher):
+        """Operations are rejected when too many are pending or they take too long."""
+        app.config['PASSWORD_POOL_TIMEOUT'] = 0.001
+
+        # the first operation has to wait for the pool process to start
+        with pytest.raises(PasswordHasherBusy):
+            hasher.generate('myprecious')
+
+        app.config['PASSWORD_POOL_MAX_PENDING'] = 0
+
+        with pytest.raises(PasswordHasherBusy):
+            hasher.generate('myprecious')
+
+        values = samples(metrics.render())
+        assert values['nexus_password_hashing_rejected_total{reason="timeout"}'] == 1
+        assert values['nexus_password_hashing_rejected_total{reason="busy"}'] == 1
+
+    def test_login_busy(self, app, user, testapp):
+        """A login is answered with a 503 error, if the pool is saturated."""
+        app.config['PASSWORD_POOL_WORKERS'] = 1
+        app.config['PASSWORD_POOL_MAX_PENDING'] = 0
+        res = testapp.post('/users/login', {'username': user.username, 'password': 'myprecious'},
+                           status=503)
+        assert 'try again in a few seconds' in res
+        assert testapp.get('/metrics', extra_environ=LOCAL).status_code == 200
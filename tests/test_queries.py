@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Regression tests for the number of database queries per page."""
+
+# Third-party modules
+import pytest
+
+# Application specific modules
+from nexus_challenge.commands import check_votes, raffle
+from nexus_challenge.extensions import cache
+
+from .factories import CompetitionEntryFactory, VoteFactory
+from .helpers import log_in
+
+
+def add_entries(db, count):
+    """Create approved entries with a vote from each of their users."""
+    entries = CompetitionEntryFactory.create_batch(count)
+    for entry in entries:
+        VoteFactory(user=entry.user, entry=entries[0], points=5)
+    db.session.commit()
+    return entries
+
+
+@pytest.mark.usefixtures('voting_period')
+class TestQueryCount:
+    """The number of queries of list pages does not depend on the number of entries."""
+
+    @pytest.mark.parametrize('url, cold, warm', [('/vote/', 5, 2), ('/list/', 3, 1)])
+    def test_anonymous(self, db, testapp, assert_max_queries, url, cold, warm):
+        """Pages make a fixed number of queries for anonymous users."""
+        add_entries(db, 3)
+        with assert_max_queries(cold) as queries:
+            testapp.get(url)
+        assert queries.count == cold
+
+        add_entries(db, 10)
+        cache.clear()
+        with assert_max_queries(cold) as queries:
+            testapp.get(url)
+        assert queries.count == cold
+
+        with assert_max_queries(warm) as queries:
+            res = testapp.get(url)
+        assert queries.count == warm
+        assert res.text.count('class="track-list-entry') == 13
+
+    @pytest.mark.parametrize('url, expected', [('/vote/', 6), ('/list/', 3)])
+    def test_logged_in(self, db, testapp, assert_max_queries, url, expected):
+        """Pages make a fixed number of queries for users who voted."""
+        entries = add_entries(db, 10)
+        user = entries[1].user
+        user.password = 'myprecious'
+        for points, entry in zip((4, 3, 2, 1), entries[2:]):
+            VoteFactory(user=user, entry=entry, points=points)
+        db.session.commit()
+        log_in(testapp, user)
+        # load the logged in user into the user cache
+        testapp.get('/users/')
+
+        with assert_max_queries(expected) as queries:
+            res = testapp.get(url)
+        assert queries.count == expected
+
+        if url == '/vote/':
+            assert res.text.count('<strong>') >= 5
+
+    def test_commands(self, app, db, assert_max_queries):
+        """The check_votes and raffle commands make a fixed number of queries."""
+        add_entries(db, 10)
+        runner = app.test_cli_runner()
+
+        with assert_max_queries(2):
+            result = runner.invoke(check_votes)
+        assert result.exit_code == 0, result.output
+        assert result.output.count('Voted: yes') == 10
+
+        with assert_max_queries(1):
+            result = runner.invoke(raffle, ['--exclude', ''])
+        assert result.exit_code == 0, result.output
+        assert 'The winner of the raffle is' in result.output
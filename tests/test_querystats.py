@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Per-request SQL query statistics tests."""
+
+# Third-party modules
+import pytest
+from sqlalchemy.exc import OperationalError
+
+# Application specific modules
+from nexus_challenge.competition.models import CompetitionEntry
+from nexus_challenge.querystats import QueryBudgetExceeded, max_queries, query_budget
+from nexus_challenge.user.models import User
+
+from .factories import CompetitionEntryFactory
+
+
+@pytest.fixture
+def entries(db):
+    """Approved entries."""
+    entries = CompetitionEntryFactory.create_batch(3)
+    db.session.commit()
+    return entries
+
+
+@pytest.fixture
+def lazy_view(app):
+    """A view loading the user of each entry lazily (N+1 queries)."""
+    @query_budget(3)
+    def lazy_users():
+        return ', '.join(entry.user.username for entry in CompetitionEntry.query)
+
+    app.add_url_rule('/lazy-users', 'lazy_users', lazy_users)
+
+
+@pytest.mark.usefixtures('voting_period', 'entries')
+class TestQueryStats:
+    """Queries are counted and timed per request."""
+
+    def test_debug_headers(self, app, db, testapp):
+        """Query count and time are added to the response headers in debug mode."""
+        app.config['SQL_DEBUG_HEADERS'] = True
+        db.session.remove()
+        res = testapp.get('/list/')
+        assert res.headers['X-SQL-Queries'] == '3'
+        assert float(res.headers['X-SQL-Time']) >= 0.0
+        assert res.headers['Server-Timing'].startswith('db;desc="SQL (3 queries)";dur=')
+
+        app.config['SQL_DEBUG_HEADERS'] = False
+        assert 'X-SQL-Queries' not in testapp.get('/list/').headers
+
+    def test_slow_request_logged(self, app, db, testapp, caplog):
+        """Requests with many queries are logged with their most frequent statements."""
+        app.config['SQL_SLOW_REQUEST_QUERIES'] = 2
+        db.session.remove()
+        testapp.get('/list/')
+        assert 'GET /list/ made 3 SQL queries' in caplog.text
+        assert '1x SELECT competition_entries.id' in caplog.text
+        assert ' ms SELECT competition_entries.id' in caplog.text
+
+    @pytest.mark.usefixtures('lazy_view')
+    def test_view_budget(self, app, db, testapp):
+        """Exceeding the query budget of a view raises an error when enforced."""
+        db.session.remove()
+
+        with pytest.raises(QueryBudgetExceeded, match=r'GET /lazy-users made 4 SQL queries'):
+            testapp.get('/lazy-users')
+
+        app.config['SQL_ENFORCE_BUDGETS'] = False
+        db.session.remove()
+        assert testapp.get('/lazy-users').status_code == 200
+
+    def test_max_queries(self, db, assert_max_queries):
+        """Budgets can be asserted for any code, also as a test decorator."""
+        with assert_max_queries(1) as recorder:
+            User.query.all()
+        assert recorder.count == 1
+
+        with pytest.raises(QueryBudgetExceeded, match=r'3x SELECT users'):
+            with assert_max_queries(2):
+                for _ in range(3):
+                    User.query.all()
+
+        @max_queries(0)
+        def no_queries():
+            return User.query.all()
+
+        with pytest.raises(QueryBudgetExceeded):
+            no_queries()
+
+    def test_failed_statement(self, db):
+        """The start time of a failing statement is not left on the pooled connection."""
+        with db.engine.connect() as conn:
+            with max_queries(None) as recorder:
+                for _ in range(3):
+                    with pytest.raises(OperationalError):
+                        conn.execute('SELECT * FROM no_such_table')
+
+                conn.execute('SELECT 1')
+
+            assert conn.info['query_started'] == []
+            assert recorder.count == 1
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Access log replay tests."""
+
+# Standard library modules
+import random
+import threading
+
+# Third-party modules
+import pytest
+from werkzeug.serving import make_server
+
+# Application specific modules
+from nexus_challenge.bench import bench_app, seed
+from nexus_challenge.replay import (ClientTarget, HTTPTarget, parse_log, plan_replay, replay,
+                                    summarize)
+
+
+LOG = """\
+127.0.0.1 - - [21/Oct/2019:12:00:00 +0000] "GET /vote/ HTTP/1.0" 200 5120 "-" "Mozilla/5.0"
+127.0.0.1 - - [21/Oct/2019:12:00:01 +0000] "POST /users/login HTTP/1.0" 302 209 "-" "Mozilla/5.0"
+127.0.0.1 - - [21/Oct/2019:12:00:03 +0000] "GET /submit_vote HTTP/1.0" 200 4096 "-" "Mozilla/5.0"
+127.0.0.1 - - [21/Oct/2019:12:00:04 +0000] "POST /submit_vote HTTP/1.0" 302 219 "-" "Mozilla/5.0"
+127.0.0.1 - - [21/Oct/2019:12:00:05 +0000] "GET /list/?order=title HTTP/1.0" 200 9000 "-" "-"
+127.0.0.1 - - [21/Oct/2019:12:00:06 +0000] "GET /users/logout HTTP/1.0" 302 209 "-" "-"
+127.0.0.1 - - [21/Oct/2019:12:00:08 +0000] "POST /users/register HTTP/1.0" 200 3000 "-" "-"
+[2019-10-21 12:00:09 +0000] [1234] [INFO] Booting worker with pid: 1234
+"""
+
+
+class TestReplay:
+    """Access log parsing and replay."""
+
+    def test_plan(self, app):
+        """Log lines are parsed and turned into replayable requests."""
+        records, invalid = parse_log(LOG.splitlines())
+        assert invalid == 1
+        assert len(records) == 7
+
+        planned, skipped = plan_replay(app, records, speed=2.0)
+        assert [(request.offset, request.endpoint, request.action) for request in planned] == [
+            (0.0, 'competition.vote', 'get'),
+            (0.5, 'user.login [POST]', 'login'),
+            (1.5, 'competition.submit_vote', 'session'),
+            (2.0, 'competition.submit_vote [POST]', 'vote'),
+            (2.5, 'competition.list_entries', 'get'),
+        ]
+        assert skipped == {'user.logout': 1, 'user.register [POST]': 1}
+
+    @pytest.mark.usefixtures('voting_period')
+    def test_replay_client(self, app, db):
+        """Requests are replayed with the test client and seeded sessions."""
+        seed(users=20, entries=8)
+        planned, skipped = plan_replay(app, parse_log(LOG.splitlines())[0], speed=0)
+        samples, lags = replay(ClientTarget(app, 2, random.Random(0)), planned)
+        report = summarize(samples, lags, skipped, 1.0)
+
+        assert report['requests'] == 5
+        for name, stats in report['endpoints'].items():
+            assert stats['errors'] == 0, name
+            assert stats['status_changed'] == 0, name
+
+    def test_replay_http(self):
+        """Requests are replayed over HTTP, with CSRF tokens taken from the forms."""
+        with bench_app(config_object='tests.settings', WTF_CSRF_ENABLED=True) as app:
+            with app.app_context():
+                seed(users=10, entries=6)
+
+            server = make_server('127.0.0.1', 0, app, threaded=True)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+
+            try:
+                target = HTTPTarget('http://127.0.0.1:{}'.format(server.server_port), 2,
+                                    random.Random(0))
+                planned, skipped = plan_replay(app, parse_log(LOG.splitlines())[0], speed=0)
+                samples, lags = replay(target, planned, workers=2)
+            finally:
+                server.shutdown()
+
+        assert {endpoint: [row[1] for row in rows] for endpoint, rows in samples.items()} == {
+            'competition.vote': [200],
+            'user.login [POST]': [302],
+            'competition.submit_vote': [200],
+            'competition.submit_vote [POST]': [302],
+            'competition.list_entries': [200],
+        }
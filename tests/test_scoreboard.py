@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Scoreboard tests."""
+
+# Standard library modules
+import datetime as dt
+
+# Third-party modules
+import pytest
+
+# Application specific modules
+from nexus_challenge.competition.scoreboard import get_scoreboard
+
+from .factories import CompetitionEntryFactory, UserFactory, VoteFactory
+
+
+def cast_ballot(db, user, *entries):
+    """Give 5, 4, 3, ... points to the given entries on behalf of user."""
+    for points, entry in zip(range(5, 0, -1), entries):
+        VoteFactory(user=user, entry=entry, points=points)
+    db.session.commit()
+
+
+@pytest.mark.usefixtures('db')
+class TestScoreboard:
+    """Scoreboard calculation."""
+
+    def test_totals_and_counts(self, db):
+        """Sum points and count votes per points value."""
+        a, b, c = CompetitionEntryFactory.create_batch(3)
+        cast_ballot(db, UserFactory(), a, b, c)
+        cast_ballot(db, UserFactory(), b, a)
+
+        rows = get_scoreboard()
+        assert [row.entry_id for row in rows] == [a.id, b.id, c.id]
+        assert [row.points for row in rows] == [9, 9, 3]
+        # tie on total points is broken by number of 5 point votes, but a and b each have one
+        assert rows[0].counts == {5: 1, 4: 1, 3: 0, 2: 0, 1: 0}
+        assert [row.rank for row in rows] == [1, 1, 3]
+
+    def test_tie_break(self, db):
+        """Entry with more higher-point votes wins a tie."""
+        a, b, c = CompetitionEntryFactory.create_batch(3)
+        # a: 5 + 1 = 6, b: 4 + 2 = 6, c: 3
+        VoteFactory(entry=a, points=5)
+        VoteFactory(entry=a, points=1)
+        VoteFactory(entry=b, points=4)
+        VoteFactory(entry=b, points=2)
+        VoteFactory(entry=c, points=3)
+        db.session.commit()
+
+        rows = get_scoreboard()
+        assert [(row.entry_id, row.rank) for row in rows] == [(a.id, 1), (b.id, 2), (c.id, 3)]
+
+    def test_entries_without_votes(self, db):
+        """Approved entries without votes are listed, unapproved ones are not."""
+        entry = CompetitionEntryFactory()
+        CompetitionEntryFactory(is_approved=False)
+        db.session.commit()
+
+        rows = get_scoreboard()
+        assert len(rows) == 1
+        assert rows[0].entry_id == entry.id
+        assert rows[0].points == 0
+        assert rows[0].username == entry.user.username
+
+
+class TestResultsPage:
+    """Results page."""
+
+    def test_hidden_before_voting_end(self, app, db, testapp):
+        """Results are not shown before the voting period ends."""
+        app.config['VOTING_PERIOD_END'] = dt.datetime.utcnow() + dt.timedelta(days=1)
+        entry = CompetitionEntryFactory()
+        db.session.commit()
+        res = testapp.get('/results/')
+        assert entry.title not in res
+
+    def test_shown_after_voting_end(self, app, db, testapp):
+        """Results are shown after the voting period ended."""
+        app.config['VOTING_PERIOD_END'] = dt.datetime.utcnow() - dt.timedelta(days=1)
+        entry = CompetitionEntryFactory()
+        db.session.commit()
+        res = testapp.get('/results/')
+        assert entry.title in res
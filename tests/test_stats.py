@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Competition statistics tests."""
+
+# Standard library modules
+import datetime as dt
+
+# Third-party modules
+import pytest
+
+# Application specific modules
+from nexus_challenge.commands import refresh_statistics
+from nexus_challenge.competition.models import Vote
+from nexus_challenge.competition.stats import compute_stats, get_stats
+from nexus_challenge.competition.voting import save_ballot
+from nexus_challenge.extensions import cache
+
+from .factories import CompetitionEntryFactory, UserFactory, VoteFactory
+from .helpers import log_in
+
+
+DAY1 = dt.datetime(2019, 10, 20, 12, 0, 0)
+DAY2 = dt.datetime(2019, 10, 21, 12, 0, 0)
+
+
+@pytest.fixture
+def competition(db):
+    """Users, entries in all states and votes."""
+    UserFactory(is_confirmed=False)
+    voter = UserFactory()
+    entries = CompetitionEntryFactory.create_batch(2)
+    CompetitionEntryFactory(is_published=False, is_approved=False)
+    CompetitionEntryFactory(is_approved=False)
+    VoteFactory(user=voter, entry=entries[0], points=5, created_on=DAY1)
+    VoteFactory(user=voter, entry=entries[1], points=4, created_on=DAY2)
+    VoteFactory(user=entries[0].user, entry=entries[1], points=5, created_on=DAY2)
+    db.session.commit()
+
+
+@pytest.mark.usefixtures('competition')
+class TestStats:
+    """Competition statistics."""
+
+    def test_compute_stats(self, db, assert_max_queries):
+        """Statistics are computed by four queries."""
+        with assert_max_queries(4) as queries:
+            stats = compute_stats()
+
+        assert queries.count == 4
+        assert (stats.registered, stats.confirmed, stats.voters) == (6, 5, 2)
+        assert (stats.drafts, stats.published, stats.approved) == (1, 1, 2)
+        assert (stats.entrants, stats.entrants_voted) == (2, 1)
+        assert [tuple(row) for row in stats.votes_per_day] == [
+            (DAY1.date(), 1, 1), (DAY2.date(), 2, 2)]
+        assert [step.count for step in stats.funnel] == [6, 5, 2]
+
+    def test_changed_vote_counted_on_change_day(self, db):
+        """Votes per day count a changed vote on the day of the change only."""
+        vote = Vote.query.filter_by(created_on=DAY1).one()
+        entry = CompetitionEntryFactory()
+        db.session.commit()
+        save_ballot(vote.user_id, {5: entry.id}, now=DAY2)
+
+        assert [tuple(row) for row in compute_stats().votes_per_day] == [(DAY2.date(), 3, 2)]
+
+    def test_stats_cached(self, app, db, assert_max_queries, tmp_path):
+        """Statistics are cached and refreshed by a command."""
+        result = app.test_cli_runner().invoke(refresh_statistics)
+        assert result.exit_code != 0
+        assert 'local to this process' in result.output
+
+        cache.init_app(app, config={'CACHE_TYPE': 'filesystem', 'CACHE_DIR': str(tmp_path)})
+        assert get_stats().voters == 2
+
+        VoteFactory(points=5)
+        db.session.commit()
+
+        with assert_max_queries(0):
+            assert get_stats().voters == 2
+
+        result = app.test_cli_runner().invoke(refresh_statistics)
+        assert result.exit_code == 0, result.output
+        assert '3 voted' in result.output
+        assert get_stats().voters == 3
+
+    def test_stats_pages(self, db, testapp):
+        """Details are only shown on the admin dashboard."""
+        res = testapp.get('/stats/')
+        assert 'Users who voted' in res
+        assert 'Draft entries' not in res
+
+        admin = UserFactory(password='myprecious', is_admin=True)
+        db.session.commit()
+        log_in(testapp, admin)
+        res = testapp.get('/stats/admin')
+        assert 'Draft entries' in res
+        assert 'Turnout' in res
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""Voting trend tests."""
+
+# Standard library modules
+import datetime as dt
+
+# Third-party modules
+import pytest
+
+# Application specific modules
+from nexus_challenge.competition import trend
+from nexus_challenge.competition.models import StandingsSnapshot, VoteEvent
+from nexus_challenge.competition.trend import get_trend, update_snapshots
+from nexus_challenge.competition.voting import save_ballot
+
+from .factories import CompetitionEntryFactory, UserFactory
+from .helpers import log_in
+
+
+START = dt.datetime(2019, 10, 20, 0, 0, 0)
+HOUR = dt.timedelta(hours=1)
+
+
+@pytest.fixture
+def entries(db):
+    entries = CompetitionEntryFactory.create_batch(3)
+    db.session.commit()
+    return entries
+
+
+def events():
+    return [(event.entry_id, event.points, event.delta)
+            for event in VoteEvent.query.order_by(VoteEvent.id)]
+
+
+@pytest.mark.usefixtures('db')
+class TestTrend:
+    """Vote event log and trend replay."""
+
+    def test_ballot_events(self, db, user, entries):
+        """Each ballot change appends events."""
+        a, b, c = [entry.id for entry in entries]
+        save_ballot(user.id, {5: a, 4: b})
+        save_ballot(user.id, {5: c, 4: b})
+        assert events() == [(a, 5, 1), (b, 4, 1), (a, 5, -1), (c, 5, 1)]
+
+    def test_trend(self, db, entries, monkeypatch):
+        """Standings are replayed per bucket and snapshots are created incrementally."""
+        a, b, c = [entry.id for entry in entries]
+        user1, user2 = UserFactory(), UserFactory()
+        db.session.commit()
+
+        save_ballot(user1.id, {5: a, 4: b}, now=START + dt.timedelta(minutes=10))
+        save_ballot(user2.id, {5: b, 4: c}, now=START + dt.timedelta(minutes=70))
+        save_ballot(user1.id, {5: c, 4: b}, now=START + dt.timedelta(minutes=190))
+
+        now = START + dt.timedelta(minutes=200)
+        data = get_trend(3600, now)
+        assert data['times'] == [(START + HOUR * i).isoformat() + 'Z' for i in range(4)] + [
+            now.isoformat() + 'Z']
+        points = {entry['id']: entry['points'] for entry in data['entries']}
+        assert points == {a: [0, 5, 5, 5, 0], b: [0, 4, 9, 9, 9], c: [0, 0, 4, 4, 9]}
+        assert StandingsSnapshot.query.count() == 3
+
+        # later calls only replay the events since the last snapshot
+        replayed = []
+        event_rows = trend.event_rows
+
+        def recording_event_rows(start=None, end=None):
+            replayed.extend(event_rows(start, end))
+            return event_rows(start, end)
+
+        monkeypatch.setattr(trend, 'event_rows', recording_event_rows)
+        assert update_snapshots(3600, START + dt.timedelta(minutes=250)) == 1
+        assert len(replayed) == 2
+        latest = StandingsSnapshot.query.order_by(StandingsSnapshot.bucket_end.desc()).first()
+        assert latest.totals == {a: 0, b: 9, c: 9}
+        assert update_snapshots(3600, START + dt.timedelta(minutes=250)) == 0
+
+    def test_trend_ends_with_voting_period(self, app, db, entries):
+        """No snapshots are created after the voting period."""
+        app.config['VOTING_PERIOD_END'] = START + dt.timedelta(minutes=150)
+        user = UserFactory()
+        db.session.commit()
+        save_ballot(user.id, {5: entries[0].id}, now=START + dt.timedelta(minutes=10))
+
+        data = get_trend(3600, START + dt.timedelta(days=3))
+        assert data['times'][-1] == '2019-10-20T02:30:00Z'
+        assert len(data['times']) == 4
+        assert StandingsSnapshot.query.count() == 3
+
+
+@pytest.mark.usefixtures('voting_period')
+class TestTrendViews:
+    """Voting trend endpoint and chart."""
+
+    def test_trend_only_for_admins(self, db, testapp, entries):
+        """The trend is not published during the voting period."""
+        res = testapp.get('/results/trend.json', status=403)
+        assert 'error' in res.json
+
+        admin = UserFactory(password='myprecious', is_admin=True)
+        db.session.commit()
+        save_ballot(admin.id, {5: entries[0].id})
+        log_in(testapp, admin)
+
+        res = testapp.get('/results/trend.json')
+        assert [entry['points'][-1] for entry in res.json['entries']] == [5, 0, 0]
+        assert 'voting-trend' in testapp.get('/results/trend')
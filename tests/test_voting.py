@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""Ballot tests."""
+
+# Third-party modules
+import pytest
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+# Application specific modules
+from nexus_challenge.commands import reconcile_counters
+from nexus_challenge.competition.counters import VOTERS, get_counter, reconcile
+from nexus_challenge.competition.models import EntryScore, Vote, VoteEvent
+from nexus_challenge.competition.scoreboard import get_scoreboard, get_standings
+from nexus_challenge.competition.voting import get_vote_choices, load_ballot, save_ballot
+
+from .factories import CompetitionEntryFactory, UserFactory, VoteFactory
+from .helpers import log_in
+
+
+@pytest.fixture
+def entries(db):
+    """Approved competition entries to vote on."""
+    entries = CompetitionEntryFactory.create_batch(7)
+    db.session.commit()
+    return entries
+
+
+def ballot_entries(user):
+    return {vote.points: vote.entry_id for vote in Vote.query.filter_by(user_id=user.id)}
+
+
+def replayed_ballot(user):
+    """Return ballot of user as replayed from the vote events."""
+    totals = (
+        VoteEvent.query.with_entities(VoteEvent.points, VoteEvent.entry_id,
+                                      func.sum(VoteEvent.delta))
+        .filter_by(user_id=user.id)
+        .group_by(VoteEvent.points, VoteEvent.entry_id)
+    )
+    return {points: entry_id for points, entry_id, total in totals if total}
+
+
+class TestBallot:
+    """Ballot reading and writing."""
+
+    def test_create_ballot(self, db, user, entries, assert_max_queries):
+        """A new ballot is written in one transaction."""
+        choices = {points: entry.id for points, entry in zip((5, 4, 3, 2, 1), entries)}
+        user_id = user.id
+
+        with assert_max_queries(None) as queries:
+            assert save_ballot(user_id, choices, ballot={}) == 5
+
+        vote_queries = [sql for sql, duration in queries.statements if 'competition_votes' in sql]
+        assert len(vote_queries) == 5
+        assert all(sql.startswith('INSERT') for sql in vote_queries)
+        assert ballot_entries(user) == choices
+
+    def test_update_ballot(self, db, user, entries, assert_max_queries):
+        """Only changed votes are written, and entries can switch places."""
+        choices = {points: entry.id for points, entry in zip((5, 4, 3, 2, 1), entries)}
+        save_ballot(user.id, choices)
+        vote_ids = {points: vote.id for points, vote in load_ballot(user.id).items()}
+
+        choices.update({5: entries[1].id, 4: entries[0].id, 1: entries[6].id})
+        user_id = user.id
+        ballot = load_ballot(user_id)
+
+        with assert_max_queries(None) as queries:
+            assert save_ballot(user_id, choices, ballot) == 3
+
+        # only the changed votes are written, no further lookups
+        vote_queries = [sql for sql, duration in queries.statements if 'competition_votes' in sql]
+        assert vote_queries and all(sql.startswith('UPDATE') for sql in vote_queries)
+        assert ballot_entries(user) == choices
+        assert {points: vote.id for points, vote in load_ballot(user.id).items()} == vote_ids
+
+    def test_concurrent_ballot(self, db, user, entries):
+        """A ballot created concurrently is reloaded and updated."""
+        VoteFactory(user=user, entry=entries[3], points=5)
+        db.session.commit()
+
+        # stale ballot, e.g. from a request started before the other one committed
+        assert save_ballot(user.id, {5: entries[0].id, 4: entries[1].id}, ballot={}) == 2
+        assert ballot_entries(user) == {5: entries[0].id, 4: entries[1].id}
+
+    def test_double_submit(self, db, user, entries):
+        """Saving the same changes twice from a stale ballot changes the counters once."""
+        save_ballot(user.id, {5: entries[0].id, 4: entries[1].id})
+        user_id = user.id
+        ballot = load_ballot(user_id)
+        # keep the loaded votes unchanged by later commits, as in another request's session
+        for vote in ballot.values():
+            db.session.expunge(vote)
+
+        choices = {5: entries[1].id, 4: entries[0].id}
+        assert save_ballot(user_id, choices, ballot) == 2
+        assert save_ballot(user_id, choices, ballot) == 0
+        assert ballot_entries(user) == choices
+        assert reconcile() == []
+        assert replayed_ballot(user) == choices
+
+    def test_concurrent_update(self, db, user, entries):
+        """Concurrent updates of a ballot are both applied, the last one wins."""
+        save_ballot(user.id, {5: entries[0].id, 4: entries[1].id})
+        user_id = user.id
+        # both requests loaded the same ballot
+        ballot = load_ballot(user_id)
+
+        for vote in ballot.values():
+            db.session.expunge(vote)
+
+        assert save_ballot(user_id, {5: entries[1].id, 4: entries[0].id}, ballot) == 2
+        assert save_ballot(user_id, {5: entries[2].id, 4: entries[1].id}, ballot) == 2
+        assert ballot_entries(user) == {5: entries[2].id, 4: entries[1].id}
+        assert reconcile() == []
+        assert replayed_ballot(user) == {5: entries[2].id, 4: entries[1].id}
+
+    def test_unique_points(self, db, user, entries):
+        """A user can't have two votes with the same points."""
+        VoteFactory(user=user, entry=entries[0], points=5)
+        VoteFactory(user=user, entry=entries[1], points=5)
+
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+
+    def test_vote_choices(self, db, entries, assert_max_queries):
+        """Vote choices are sorted by label and cached."""
+        CompetitionEntryFactory(is_approved=False)
+        db.session.commit()
+
+        choices = get_vote_choices()
+        assert len(choices) == 7
+        assert [choice[1] for choice in choices] == sorted(choice[1] for choice in choices)
+        assert choices[0][1] == '“{}” by {}'.format(entries[0].title, entries[0].artist)
+
+        with assert_max_queries(0):
+            assert get_vote_choices() == choices
+
+
+def scores():
+    return {score.entry_id: (score.total_points, score.count_5, score.count_4, score.count_3,
+                             score.count_2, score.count_1)
+            for score in EntryScore.query}
+
+
+class TestCounters:
+    """Denormalized vote counters."""
+
+    def test_counters_follow_ballots(self, db, entries):
+        """Counters are updated with each ballot change."""
+        a, b, c = entries[:3]
+        user1, user2 = UserFactory(), UserFactory()
+        db.session.commit()
+
+        save_ballot(user1.id, {5: a.id, 4: b.id})
+        save_ballot(user2.id, {5: b.id, 4: c.id})
+        assert scores() == {a.id: (5, 1, 0, 0, 0, 0), b.id: (9, 1, 1, 0, 0, 0),
+                            c.id: (4, 0, 1, 0, 0, 0)}
+        assert get_counter(VOTERS) == 2
+
+        # user 1 swaps entries
+        save_ballot(user1.id, {5: b.id, 4: a.id})
+        assert scores() == {a.id: (4, 0, 1, 0, 0, 0), b.id: (10, 2, 0, 0, 0, 0),
+                            c.id: (4, 0, 1, 0, 0, 0)}
+        assert get_counter(VOTERS) == 2
+
+        standings = get_standings()
+        assert [(row.entry_id, row.points) for row in standings[:3]] == [
+            (b.id, 10), (a.id, 4), (c.id, 4)]
+        assert standings[:3] == get_scoreboard()[:3]
+
+    def test_reconcile(self, app, db, entries):
+        """Counters are checked against a recount and repaired."""
+        a, b = entries[:2]
+        user = UserFactory()
+        db.session.commit()
+        b_id = b.id
+        save_ballot(user.id, {5: a.id, 4: b.id})
+        assert reconcile() == []
+
+        # votes changed behind the counters' back
+        VoteFactory(entry=b, points=5)
+        EntryScore.query.filter_by(entry_id=a.id).update({'total_points': 7})
+        db.session.commit()
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(reconcile_counters, ['--dry-run'])
+        assert '3 problems found.' in result.output
+        assert len(reconcile()) == 3
+
+        result = runner.invoke(reconcile_counters)
+        assert '3 problems found and repaired.' in result.output
+        assert reconcile() == []
+        assert scores()[b_id] == (9, 1, 1, 0, 0, 0)
+        assert get_counter(VOTERS) == 2
+
+
+@pytest.mark.usefixtures('voting_period')
+class TestSubmitVote:
+    """Vote submission form."""
+
+    def test_submit_vote(self, db, testapp, entries):
+        """A user can submit and update a vote."""
+        user = UserFactory(password='myprecious')
+        db.session.commit()
+        log_in(testapp, user)
+
+        form = testapp.get('/submit_vote').forms['submitVoteForm']
+        for field, entry in zip(('first', 'second', 'third', 'fourth', 'fifth'), entries):
+            form[field] = entry.id
+        res = form.submit().follow()
+        assert 'Your vote was registered successfully' in res
+        assert ballot_entries(user) == {points: entry.id for points, entry
+                                        in zip((5, 4, 3, 2, 1), entries)}
+
+        form = testapp.get('/submit_vote').forms['submitVoteForm']
+        form['first'] = entries[6].id
+        res = form.submit().follow()
+        assert 'Your vote was successfully updated' in res
+        assert ballot_entries(user)[5] == entries[6].id